@@ -3,7 +3,7 @@ import random
 from datetime import datetime
 from core.base_agent import BaseAgent
 from core.data_models import MarketData, TechnicalIndicators
-from core.enums import DecisionType
+from core.enums import DecisionType, LLMPriority
 
 class FundamentalAnalyst(BaseAgent):
     def __init__(self, llm, db):
@@ -37,7 +37,9 @@ class FundamentalAnalyst(BaseAgent):
         4. Confiança na análise (0-100%)
         """
         
-        analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        analysis = await self.ask_llm(
+            prompt, self.system_prompt, priority=LLMPriority.ANALYSIS, call_type="analysis"
+        )
         confidence = random.uniform(60, 90)
         recommendation = random.choice([DecisionType.BUY, DecisionType.HOLD, DecisionType.SELL])
         result = {
@@ -47,7 +49,7 @@ class FundamentalAnalyst(BaseAgent):
             'recommendation': recommendation,
             'timestamp': datetime.now()
         }
-        self.analysis_history.append(result)
+        self.record_analysis(result, market_data.symbol)
         return result
 
 class SentimentAnalyst(BaseAgent):
@@ -79,7 +81,9 @@ class SentimentAnalyst(BaseAgent):
         3. Impacto provável no preço
         4. Recomendação baseada em sentimento
         """
-        analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        analysis = await self.ask_llm(
+            prompt, self.system_prompt, priority=LLMPriority.ANALYSIS, call_type="analysis"
+        )
         confidence = random.uniform(70, 95)
         recommendation = DecisionType.BUY if sentiment_score > 0.3 else DecisionType.SELL if sentiment_score < -0.3 else DecisionType.HOLD
         result = {
@@ -90,7 +94,7 @@ class SentimentAnalyst(BaseAgent):
             'recommendation': recommendation,
             'timestamp': datetime.now()
         }
-        self.analysis_history.append(result)
+        self.record_analysis(result, market_data.symbol)
         return result
 
 class NewsAnalyst(BaseAgent):
@@ -121,7 +125,9 @@ class NewsAnalyst(BaseAgent):
         3. Tendências setoriais
         4. Recomendação baseada em notícias
         """
-        analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        analysis = await self.ask_llm(
+            prompt, self.system_prompt, priority=LLMPriority.ANALYSIS, call_type="analysis"
+        )
         confidence = random.uniform(65, 85)
         recommendation = DecisionType.BUY if news_impact > 0.2 else DecisionType.SELL if news_impact < -0.2 else DecisionType.HOLD
         result = {
@@ -132,7 +138,7 @@ class NewsAnalyst(BaseAgent):
             'recommendation': recommendation,
             'timestamp': datetime.now()
         }
-        self.analysis_history.append(result)
+        self.record_analysis(result, market_data.symbol)
         return result
 
 class TechnicalAnalyst(BaseAgent):
@@ -169,7 +175,9 @@ class TechnicalAnalyst(BaseAgent):
         3. Níveis de suporte e resistência
         4. Recomendação técnica
         """
-        analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        analysis = await self.ask_llm(
+            prompt, self.system_prompt, priority=LLMPriority.ANALYSIS, call_type="analysis"
+        )
         if technical_data.rsi < 30:
             recommendation = DecisionType.BUY
         elif technical_data.rsi > 70:
@@ -189,5 +197,5 @@ class TechnicalAnalyst(BaseAgent):
             'recommendation': recommendation,
             'timestamp': datetime.now()
         }
-        self.analysis_history.append(result)
+        self.record_analysis(result, market_data.symbol)
         return result 
\ No newline at end of file
@@ -1,6 +1,7 @@
 # agents/portfolio_manager.py 
 from core.base_agent import BaseAgent
 from core.data_models import TradingDecision, RiskAssessment
+from core.enums import LLMPriority
 
 class PortfolioManager(BaseAgent):
     def __init__(self, llm, db):
@@ -13,7 +14,7 @@ class PortfolioManager(BaseAgent):
         - Objetivos de retorno vs risco
         """
     
-    async def approve_trade(self, decision: TradingDecision, risk_assessment: RiskAssessment):
+    async def approve_trade(self, decision: TradingDecision, risk_assessment: RiskAssessment, use_llm: bool = True):
         prompt = f"""
         Avalie para aprovação a seguinte decisão de trading:
         
@@ -29,7 +30,12 @@ class PortfolioManager(BaseAgent):
         Decisão: APROVAR ou REJEITAR
         Justificativa: [sua justificativa]
         """
-        approval_analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        if use_llm:
+            approval_analysis = await self.ask_llm(
+                prompt, self.system_prompt, priority=LLMPriority.CRITICAL, call_type="approval"
+            )
+        else:
+            approval_analysis = "Aprovação por regras (sem LLM): limites de risco, confiança e liquidez"
         approve = (risk_assessment.risk_score < 70 and 
                   decision.confidence > 60 and 
                   risk_assessment.liquidity_score > 0.3)
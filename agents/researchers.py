@@ -2,7 +2,9 @@
 import random
 from datetime import datetime
 from core.base_agent import BaseAgent
-from core.enums import DecisionType
+from core.enums import DecisionType, LLMPriority
+from config.settings import settings
+from llm.context_builder import ContextBuilder, analysis_fields
 
 class Researcher(BaseAgent):
     def __init__(self, name: str, bias: str, llm, db):
@@ -15,9 +17,14 @@ class Researcher(BaseAgent):
         """
     
     async def research_analysis(self, analyses):
-        analysis_summary = "\n".join([
-            f"{a['agent']}: {a.get('analysis', 'N/A')}" for a in analyses
-        ])
+        # Campos estruturados de todas as análises primeiro; o texto livre é
+        # compactado para caber no orçamento de contexto
+        builder = ContextBuilder(settings.llm.research_context_tokens)
+        for a in analyses:
+            builder.add_fields(a['agent'], analysis_fields(a))
+        for a in analyses:
+            builder.add_text(a['agent'], a.get('analysis'))
+        analysis_summary = builder.build()
         prompt = f"""
         Avalie criticamente as seguintes análises com uma perspectiva {self.bias}:
         
@@ -29,7 +36,9 @@ class Researcher(BaseAgent):
         3. Questionamentos sobre premissas
         4. Sua recomendação final
         """
-        research = await self.llm.generate_response(prompt, self.system_prompt)
+        research = await self.ask_llm(
+            prompt, self.system_prompt, priority=LLMPriority.ANALYSIS, call_type="research"
+        )
         confidence = random.uniform(60, 85)
         if self.bias == 'bullish':
             recommendation = DecisionType.BUY if random.random() > 0.3 else DecisionType.HOLD
@@ -3,6 +3,7 @@ import random
 from datetime import datetime
 from core.base_agent import BaseAgent
 from core.data_models import TradingDecision, MarketData, RiskAssessment
+from core.enums import LLMPriority
 
 class RiskManager(BaseAgent):
     def __init__(self, llm, db):
@@ -15,7 +16,8 @@ class RiskManager(BaseAgent):
         - Risco de mercado e crédito
         """
     
-    async def assess_risk(self, symbol: str, decision: TradingDecision, market_data: MarketData) -> RiskAssessment:
+    async def assess_risk(self, symbol: str, decision: TradingDecision, market_data: MarketData,
+                          use_llm: bool = True) -> RiskAssessment:
         prompt = f"""
         Avalie o risco da seguinte decisão de trading:
         
@@ -35,7 +37,12 @@ class RiskManager(BaseAgent):
         3. Recomendações de mitigação
         4. Aprovação/rejeição da operação
         """
-        risk_analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        if use_llm:
+            risk_analysis = await self.ask_llm(
+                prompt, self.system_prompt, priority=LLMPriority.CRITICAL, call_type="risk"
+            )
+        else:
+            risk_analysis = "Avaliação por regras (sem LLM): volatilidade e liquidez"
         volatility = abs(market_data.change_percent) / 100
         liquidity_score = min(market_data.volume / 1000000, 10) / 10
         risk_score = (volatility * 50 + (1 - liquidity_score) * 30 + random.uniform(0, 20))
@@ -2,7 +2,7 @@
 import random
 from datetime import datetime
 from core.base_agent import BaseAgent
-from core.enums import DecisionType, RiskLevel
+from core.enums import DecisionType, RiskLevel, LLMPriority
 from core.data_models import TradingDecision
 
 class TradingAgent(BaseAgent):
@@ -17,7 +17,7 @@ class TradingAgent(BaseAgent):
         - Execução de ordens
         """
     
-    async def make_trading_decision(self, symbol: str, all_analyses, market_data=None):
+    async def make_trading_decision(self, symbol: str, all_analyses, market_data=None, use_llm: bool = True):
         analysis_summary = "\n".join([
             f"{a['agent']}: Recomendação {a.get('recommendation', 'N/A').value if hasattr(a.get('recommendation'), 'value') else a.get('recommendation', 'N/A')}, "
             f"Confiança: {a.get('confidence', 0):.1f}%"
@@ -35,7 +35,12 @@ class TradingAgent(BaseAgent):
         4. Justificativa da decisão
         5. Nível de confiança
         """
-        decision_analysis = await self.llm.generate_response(prompt, self.system_prompt)
+        if use_llm:
+            decision_analysis = await self.ask_llm(
+                prompt, self.system_prompt, priority=LLMPriority.CRITICAL, call_type="decision"
+            )
+        else:
+            decision_analysis = "Decisão por regras (sem LLM): recomendações ponderadas pela confiança"
         buy_weight = sum(a.get('confidence', 0) for a in all_analyses 
                         if a.get('recommendation') == DecisionType.BUY)
         sell_weight = sum(a.get('confidence', 0) for a in all_analyses 
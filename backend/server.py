@@ -14,7 +14,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from services.orchestrator import TradingAgentsSystem
 from data.database import AsyncDatabaseManager
-from utils.helpers import batcher
+from utils.tracing import configure_tracing, tracer
+from config.settings import settings
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -66,9 +67,21 @@ trading_system = None
 @app.on_event("startup")
 async def startup_event():
     global trading_system
+    configure_tracing(settings.tracing)
     trading_system = TradingAgentsSystem(model_name="llama3.2")
+    # Tokens e mensagens da discussão são transmitidos assim que os agentes os produzem
+    trading_system.add_event_listener(manager.broadcast)
+    # Símbolos da watchlist ficam sempre no cache, sem esperar a primeira análise
+    trading_system.market_data_provider.start_watchlist_refresh(settings.cache.watchlist)
     logger.info("Sistema TradingAgents inicializado")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if trading_system is not None:
+        trading_system.market_data_provider.stop_watchlist_refresh()
+    # O formato Chrome só é gravado ao fechar o tracer
+    tracer.close()
+
 @app.get("/api/health")
 async def health():
     return {"status": "healthy", "timestamp": datetime.now()}
@@ -81,8 +94,8 @@ async def get_agents():
         agent_data = {
             "name": agent.name,
             "type": agent.__class__.__name__,
-            "total_analyses": len(getattr(agent, 'analysis_history', [])),
-            "last_analysis": getattr(agent, 'analysis_history', [{}])[-1].get('timestamp') if hasattr(agent, 'analysis_history') and agent.analysis_history else None
+            "total_analyses": len(agent.analysis_history),
+            "last_analysis": agent.analysis_history.last_timestamp
         }
         agents_info.append(agent_data)
     
@@ -127,28 +140,11 @@ async def run_analysis_with_updates(symbols: List[str]):
                 "timestamp": datetime.now().isoformat()
             })
 
-            # Executar análise do símbolo
+            # Executar análise do símbolo; trechos de texto ("agent_token", só o que é
+            # novo), o texto final de cada resposta ("agent_stream_end") e as mensagens
+            # da discussão ("agent_message") são enviados em tempo real pelo listener
             result = await trading_system.analyze_symbol(symbol)
             
-            # Enviar discussões em tempo real
-            for i, message in enumerate(result.get('discussion_messages', [])):
-                parts = message.split(': ', 1)
-                agent_name = parts[0] if len(parts) > 1 else "Sistema"
-                agent_message = parts[1] if len(parts) > 1 else message
-                
-                await manager.broadcast({
-                    "type": "agent_message",
-                    "session_id": session_id,
-                    "symbol": symbol,
-                    "agent_name": agent_name,
-                    "message": agent_message,
-                    "timestamp": datetime.now().isoformat(),
-                    "message_index": i
-                })
-                
-                # Pequeno delay para simular conversa em tempo real
-                await asyncio.sleep(0.5)
-            
             # Enviar resultado final da análise
             await manager.broadcast({
                 "type": "symbol_analysis_completed",
@@ -160,6 +156,7 @@ async def run_analysis_with_updates(symbols: List[str]):
                     "approval": result.get('approval'),
                     "approval_reasoning": result.get('approval_reasoning'),
                     "executed_trade": result.get('executed_trade'),
+                    "pending_order": result.get('pending_order'),
                     "analyses_count": len(result.get('analyses', [])),
                     "market_data": result.get('market_data')
                 },
@@ -192,6 +189,29 @@ async def get_agents_performance():
     """Retorna performance dos agentes"""
     return trading_system.get_agent_performance()
 
+@app.get("/api/llm/metrics")
+async def get_llm_metrics():
+    """Retorna latências, tokens e filas do LLM por agente e tipo de chamada"""
+    llm = trading_system.llm
+    return {
+        "metrics": llm.get_metrics(),
+        "scheduler": llm.get_scheduler_stats(),
+        "cache": llm.get_cache_stats(),
+        "coalescing": llm.get_coalescing_stats()
+    }
+
+@app.get("/api/pipeline/metrics")
+async def get_pipeline_metrics():
+    """Retorna profundidade das filas, workers ocupados e latências por etapa do pipeline"""
+    return {
+        "stages": trading_system.get_pipeline_stats(),
+        "incremental": trading_system.get_incremental_stats(),
+        "market_data": {
+            "cache": trading_system.market_data_provider.get_cache_stats(),
+            "coalescing": trading_system.market_data_provider.get_coalescing_stats()
+        }
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -2,7 +2,7 @@
 # config/settings.py
 from dataclasses import dataclass, field
 from datetime import timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 @dataclass
 class CacheConfig:
@@ -11,13 +11,28 @@ class CacheConfig:
     technical_indicators_ttl: timedelta = timedelta(minutes=10)
     max_cache_size: int = 1000
     cleanup_interval: timedelta = timedelta(minutes=30)
+    # Stale-while-revalidate: depois do TTL o valor velho é servido e atualizado
+    # em segundo plano; só depois do hard TTL a chamada espera uma nova busca
+    stale_while_revalidate: bool = True
+    market_data_hard_ttl: timedelta = timedelta(minutes=30)
+    technical_indicators_hard_ttl: timedelta = timedelta(hours=1)
+    refresh_workers: int = 2
+    # Símbolos mantidos sempre atualizados por MarketDataProvider.start_watchlist_refresh()
+    watchlist: List[str] = field(default_factory=list)
+    watchlist_refresh_interval: timedelta = timedelta(minutes=1)
 
 @dataclass
 class MarketDataConfig:
     """Configurações para obtenção de dados de mercado"""
     yfinance_timeout: int = 10
     max_retries: int = 3
-    retry_delay: float = 1.0
+    retry_delay: float = 1.0  # espera base do backoff exponencial entre tentativas
+    max_retry_delay: float = 10.0
+    max_workers: int = 8  # threads dedicadas ao I/O do yfinance
+    bulk_prefetch: bool = True  # indicadores da sessão inteira em um único download no início
+    # Histórico OHLCV local: depois da primeira carga só as barras novas são baixadas
+    ohlcv_store_enabled: bool = True
+    ohlcv_store_path: str = "ohlcv_store"
     historical_period: str = "6mo"
     historical_interval: str = "1d"
 
@@ -34,12 +49,127 @@ class TechnicalIndicatorsConfig:
     bollinger_std: float = 2.0
     volume_sma_period: int = 20
 
+@dataclass
+class LLMConfig:
+    """Configurações da interface com o LLM"""
+    cache_enabled: bool = True
+    cache_ttl: timedelta = timedelta(hours=24)
+    cache_memory_size: int = 512
+    cache_disk_path: Optional[str] = "llm_cache.db"
+    cache_max_disk_entries: int = 10000
+    backend: str = "ollama"  # 'ollama' ou 'fake' (llm.fake_ollama, sem modelo)
+    host: Optional[str] = None  # usa OLLAMA_HOST ou o padrão do cliente
+    use_async_client: bool = True
+    max_in_flight: int = 4  # alinhar com OLLAMA_NUM_PARALLEL do servidor
+    request_timeout: float = 120.0
+    connect_timeout: float = 5.0
+    # Máximo de chamadas simultâneas por classe de prioridade (dentro de max_in_flight)
+    priority_quotas: Dict[str, int] = field(default_factory=lambda: {
+        'critical': 4,
+        'analysis': 3,
+        'discussion': 2
+    })
+    aging_interval: float = 5.0  # segundos de espera para subir um nível de prioridade
+    # Orçamentos de tokens do contexto (num_ctx 1024 menos instruções e num_predict)
+    research_context_tokens: int = 600
+    discussion_context_tokens: int = 500
+
+@dataclass
+class DiscussionConfig:
+    """Configurações da discussão em equipe"""
+    # 'sequential': cada agente vê as mensagens anteriores da mesma rodada;
+    # 'parallel': todos os agentes de uma rodada respondem ao mesmo tempo,
+    # vendo apenas a transcrição da rodada anterior
+    mode: str = "sequential"
+    rounds: int = 2
+    fan_out: int = 4  # gerações simultâneas por rodada no modo paralelo
+
+@dataclass
+class PipelineConfig:
+    """Configurações do pipeline de etapas da análise por símbolo"""
+    enabled: bool = True  # False executa as etapas em sequência dentro de cada símbolo
+    # Workers por etapa; as chamadas ao LLM continuam limitadas pelo escalonador
+    stage_workers: Dict[str, int] = field(default_factory=lambda: {
+        'fetch': 4,
+        'analysts': 2,  # cada análise já dispara quatro chamadas ao LLM
+        'research': 2,
+        'discussion': 4,  # fora do caminho da decisão, mas longa (agentes x rodadas)
+        'decision': 4,
+        'risk': 4,
+        'approval': 4,
+        'execution': 4  # execuções concorrentes viram um lote na bolsa
+    })
+
+@dataclass
+class SessionConfig:
+    """Configurações das sessões de trading"""
+    concurrency: int = 4  # símbolos em andamento ao mesmo tempo (padrão antigo de max_parallel)
+    symbol_timeout: Optional[float] = None  # prazo por símbolo em segundos (None = sem prazo)
+    shards: int = 1  # >1 divide os símbolos entre processos (um TradingAgentsSystem por processo)
+    # Degradação quando o prazo aperta: abaixo de cada limite (segundos restantes)
+    # a etapa é pulada ou, nas decisões, feita por regras sem o LLM
+    discussion_min_budget: float = 300.0
+    research_min_budget: float = 120.0
+    llm_decision_min_budget: float = 30.0
+    deadline_grace: float = 5.0  # tempo extra para concluir pelo caminho degradado antes do cancelamento
+
+@dataclass
+class IncrementalConfig:
+    """Reaproveitamento de etapas quando as entradas de um símbolo quase não mudaram"""
+    enabled: bool = True
+    max_age: timedelta = timedelta(minutes=30)  # saídas mais antigas sempre são recalculadas
+    max_symbols: int = 500
+    price_change_pct: float = 0.5  # variação relativa de preço, médias e bandas (%)
+    volume_change_pct: float = 25.0
+    change_percent_delta: float = 0.5  # pontos percentuais da variação diária
+    rsi_delta: float = 2.0
+    macd_delta: float = 0.05
+
+@dataclass
+class CheckpointConfig:
+    """Checkpoints por símbolo e etapa para retomar sessões interrompidas"""
+    enabled: bool = True
+    path: str = "session_checkpoints.db"
+    keep_completed: bool = False  # mantém os checkpoints de sessões concluídas
+
+@dataclass
+class TracingConfig:
+    """Rastreamento de etapas e chamadas de agentes (utils.tracing)"""
+    enabled: bool = False
+    exporter: Optional[str] = "chrome"  # 'chrome' (chrome://tracing, Perfetto) ou 'jsonl'
+    path: str = "trace.json"
+
+@dataclass
+class LedgerConfig:
+    """Carteira simulada (services.ledger)"""
+    initial_cash: float = 100000.0
+    recent_trades: int = 5  # execuções mantidas para o resumo do portfólio
+
+@dataclass
+class ExchangeConfig:
+    """Modelo de execução da bolsa simulada (services.order_book)"""
+    slippage_bps: float = 0.0  # custo fixo de cada execução, em pontos-base
+    impact_bps: float = 0.0    # pontos-base adicionais por unidade executada
+    latency: float = 0.0       # segundos até a ordem chegar ao livro
+
 @dataclass
 class AppSettings:
     """Configurações gerais da aplicação"""
     cache: CacheConfig = field(default_factory=CacheConfig)
     market_data: MarketDataConfig = field(default_factory=MarketDataConfig)
     technical: TechnicalIndicatorsConfig = field(default_factory=TechnicalIndicatorsConfig)
+    llm: LLMConfig = field(default_factory=LLMConfig)
+    discussion: DiscussionConfig = field(default_factory=DiscussionConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+    session: SessionConfig = field(default_factory=SessionConfig)
+    incremental: IncrementalConfig = field(default_factory=IncrementalConfig)
+    checkpoint: CheckpointConfig = field(default_factory=CheckpointConfig)
+    tracing: TracingConfig = field(default_factory=TracingConfig)
+    ledger: LedgerConfig = field(default_factory=LedgerConfig)
+    exchange: ExchangeConfig = field(default_factory=ExchangeConfig)
+    # Análises mantidas em memória por agente (com o texto, até serem gravadas no banco)
+    agent_history_size: int = 1000
+    analysis_flush_size: int = 32  # análises pendentes que disparam uma gravação em lote
     enable_fallback: bool = True
     enable_logging: bool = True
 
@@ -0,0 +1,102 @@
+# core/agent_history.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+from core.enums import DecisionType
+
+# Código int8 de cada recomendação no buffer (0 = sem recomendação)
+_RECOMMENDATIONS = (None, DecisionType.BUY, DecisionType.SELL, DecisionType.HOLD)
+_CODES = {recommendation: code for code, recommendation in enumerate(_RECOMMENDATIONS)}
+
+class AgentHistory:
+    """Histórico das análises de um agente em buffers circulares de tamanho fixo.
+
+    Confiança, recomendação e instante ficam em arrays numpy; o símbolo e o
+    texto das mesmas `capacity` análises ficam em listas circulares, então
+    as recentes continuam disponíveis mesmo antes (ou sem) a gravação na
+    tabela agent_analyses. Os agregados de desempenho são atualizados a cada
+    append() e cobrem todas as análises, então summary() é O(1).
+    """
+
+    def __init__(self, capacity: int = 1000):
+        if capacity <= 0:
+            raise ValueError("capacity deve ser positiva")
+        self.capacity = capacity
+        self._confidence = np.zeros(capacity, dtype=np.float64)
+        self._recommendation = np.zeros(capacity, dtype=np.int8)
+        self._timestamp = np.zeros(capacity, dtype=np.float64)
+        self._symbol: List[Optional[str]] = [None] * capacity
+        self._text: List[Optional[str]] = [None] * capacity
+        self._next = 0
+        self._size = 0
+        self.total = 0
+        self._confidence_sum = 0.0
+        self._recommendation_counts = [0] * len(_RECOMMENDATIONS)
+        self.last_timestamp: Optional[datetime] = None
+
+    def append(self, analysis: Dict[str, Any], symbol: Optional[str] = None) -> None:
+        confidence = float(analysis.get('confidence') or 0.0)
+        code = _CODES.get(analysis.get('recommendation'), 0)
+        timestamp = analysis.get('timestamp') or datetime.now()
+        i = self._next
+        self._confidence[i] = confidence
+        self._recommendation[i] = code
+        self._timestamp[i] = timestamp.timestamp()
+        self._symbol[i] = symbol
+        self._text[i] = analysis.get('analysis')
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+        self._confidence_sum += confidence
+        self._recommendation_counts[code] += 1
+        self.last_timestamp = timestamp
+
+    def __len__(self) -> int:
+        """Total de análises registradas, inclusive as que já saíram do buffer"""
+        return self.total
+
+    def __bool__(self) -> bool:
+        return self.total > 0
+
+    def _order(self) -> np.ndarray:
+        """Índices do buffer da análise mais antiga para a mais recente"""
+        start = (self._next - self._size) % self.capacity
+        return (start + np.arange(self._size)) % self.capacity
+
+    def recent(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Últimas n análises ainda no buffer, em ordem cronológica"""
+        order = self._order()
+        if n is not None:
+            order = order[len(order) - min(n, len(order)):]
+        return [
+            {
+                'symbol': self._symbol[i],
+                'analysis': self._text[i],
+                'confidence': float(self._confidence[i]),
+                'recommendation': _RECOMMENDATIONS[self._recommendation[i]],
+                'timestamp': datetime.fromtimestamp(self._timestamp[i])
+            }
+            for i in order
+        ]
+
+    def confidences(self) -> np.ndarray:
+        """Confianças das análises no buffer, em ordem cronológica"""
+        return self._confidence[self._order()]
+
+    def last(self) -> Optional[Dict[str, Any]]:
+        recent = self.recent(1)
+        return recent[0] if recent else None
+
+    def summary(self) -> Dict[str, Any]:
+        """Estatísticas no formato de get_agent_performance()"""
+        counts = self._recommendation_counts
+        return {
+            'total_analyses': self.total,
+            'average_confidence': self._confidence_sum / self.total if self.total else 0.0,
+            'recommendations': {
+                'buy': counts[_CODES[DecisionType.BUY]],
+                'sell': counts[_CODES[DecisionType.SELL]],
+                'hold': counts[_CODES[DecisionType.HOLD]]
+            },
+            'last_analysis': self.last_timestamp.isoformat() if self.last_timestamp else None
+        }
@@ -1,19 +1,44 @@
 # core/base_agent.py 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from config.settings import settings
+from core.agent_history import AgentHistory
+from core.enums import LLMPriority
 from data.llm_interface import LLMInterface
 from data.database import DatabaseManager
 
+
 class BaseAgent:
     def __init__(self, name: str, llm: LLMInterface, db: DatabaseManager):
         self.name = name
         self.llm = llm
         self.db = db
-        self.analysis_history = []
+        self.analysis_history = AgentHistory(settings.agent_history_size)
+        # Análises ainda não gravadas; o orquestrador as grava em lote (flush_analyses).
+        # Sem limite: sem conexão com o banco elas esperam aqui, em vez de serem descartadas
+        self.unsaved_analyses: List[Tuple[Optional[str], Dict[str, Any]]] = []
     
     async def analyze(self, data: Dict[str, Any]) -> Dict[str, Any]:
         raise NotImplementedError
+
+    def record_analysis(self, result: Dict[str, Any], symbol: Optional[str] = None) -> None:
+        """Registra a análise no histórico em memória e a deixa pendente de gravação no banco"""
+        self.analysis_history.append(result, symbol)
+        self.unsaved_analyses.append((symbol, result))
+
+    async def ask_llm(self, prompt: str, system_prompt: str = "",
+                      priority: LLMPriority = LLMPriority.ANALYSIS, call_type: str = None) -> str:
+        """Consulta o LLM em nome deste agente"""
+        return await self.llm.generate_response(
+            prompt, system_prompt, priority=priority, agent_name=self.name, call_type=call_type
+        )
     
     async def participate_in_discussion(self, session_id: str, topic: str, context: str) -> str:
+        response = await self.discussion_reply(topic, context)
+        await self.db.save_discussion(session_id, self.name, response)
+        return response
+
+    async def discussion_reply(self, topic: str, context: str) -> str:
+        """Gera a contribuição do agente para a discussão, sem persisti-la"""
         prompt = f"""
         Você é {self.name}. Participe da discussão sobre: {topic}
         
@@ -23,6 +48,4 @@ class BaseAgent:
         Seja conciso mas informativo.
         """
         
-        response = await self.llm.generate_response(prompt)
-        await self.db.save_discussion(session_id, self.name, response)
-        return response 
\ No newline at end of file
+        return await self.ask_llm(prompt, priority=LLMPriority.DISCUSSION, call_type="discussion") 
\ No newline at end of file
@@ -11,4 +11,23 @@ class RiskLevel(Enum):
     """Níveis de risco para decisões de trading."""
     LOW = "low"
     MEDIUM = "medium"
-    HIGH = "high" 
\ No newline at end of file
+    HIGH = "high" 
+
+class LLMPriority(Enum):
+    """Classes de prioridade das chamadas ao LLM (da mais para a menos urgente)."""
+    CRITICAL = "critical"
+    ANALYSIS = "analysis"
+    DISCUSSION = "discussion"
+
+class OrderType(Enum):
+    """Tipos de ordem aceitos pela bolsa simulada."""
+    MARKET = "market"
+    LIMIT = "limit"
+    STOP = "stop"
+
+class OrderStatus(Enum):
+    """Estados de uma ordem no livro."""
+    NEW = "new"
+    PARTIALLY_FILLED = "partially_filled"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
\ No newline at end of file
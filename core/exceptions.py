@@ -1 +1,13 @@
-# core/exceptions.py 
\ No newline at end of file
+# core/exceptions.py
+class TradingAgentsError(Exception):
+    """Erro base do sistema de trading"""
+
+class DeadlineExceeded(TradingAgentsError):
+    """O prazo da sessão ou do símbolo terminou antes de a operação concluir"""
+
+class LLMStreamInterrupted(TradingAgentsError):
+    """A geração em streaming falhou depois de já ter produzido parte do texto"""
+
+    def __init__(self, message: str, partial_text: str = ""):
+        super().__init__(message)
+        self.partial_text = partial_text
@@ -4,6 +4,20 @@ from datetime import datetime
 from core.data_models import TradingDecision, RiskAssessment
 import aiosqlite
 
+def _trade_row(trade):
+    return (
+        trade['order_id'], trade['symbol'], trade['action'], trade.get('order_type', 'market'),
+        trade['quantity'], trade.get('requested_price'), trade['executed_price'],
+        trade['status'], trade['timestamp']
+    )
+
+def _analysis_row(agent_name, symbol, analysis):
+    recommendation = analysis.get('recommendation')
+    return (
+        agent_name, symbol, recommendation.value if recommendation else None,
+        analysis.get('confidence'), analysis.get('analysis'), analysis.get('timestamp', datetime.now())
+    )
+
 class DatabaseManager:
     def __init__(self, db_path: str = "trading_agents.db"):
         self.db_path = db_path
@@ -54,6 +68,35 @@ class DatabaseManager:
             )
         ''')
         
+        # Execuções da bolsa simulada
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trades (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id TEXT,
+                symbol TEXT,
+                action TEXT,
+                order_type TEXT,
+                quantity REAL,
+                requested_price REAL,
+                executed_price REAL,
+                status TEXT,
+                timestamp DATETIME
+            )
+        ''')
+        
+        # Texto das análises dos agentes (em memória ficam só os números)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_analyses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                agent_name TEXT,
+                symbol TEXT,
+                recommendation TEXT,
+                confidence REAL,
+                analysis TEXT,
+                timestamp DATETIME
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
@@ -102,6 +145,34 @@ class DatabaseManager:
         
         conn.commit()
         conn.close()
+    
+    def save_trades(self, trades: list):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO trades (order_id, symbol, action, order_type, quantity, requested_price, executed_price, status, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [_trade_row(trade) for trade in trades])
+        
+        conn.commit()
+        conn.close()
+    
+    def save_agent_analysis(self, agent_name: str, symbol: str, analysis: dict):
+        self.save_agent_analyses([(agent_name, symbol, analysis)])
+    
+    def save_agent_analyses(self, analyses: list):
+        """Grava um lote de (agente, símbolo, análise) em uma única transação"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO agent_analyses (agent_name, symbol, recommendation, confidence, analysis, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [_analysis_row(*row) for row in analyses])
+        
+        conn.commit()
+        conn.close()
 
 class AsyncDatabaseManager:
     def __init__(self, db_path: str = "trading_agents.db"):
@@ -115,6 +186,7 @@ class AsyncDatabaseManager:
     async def close(self):
         if self.conn:
             await self.conn.close()
+            self.conn = None
 
     async def init_database(self):
         async with self.conn.cursor() as cursor:
@@ -153,6 +225,31 @@ class AsyncDatabaseManager:
                     timestamp DATETIME
                 )
             ''')
+            await cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trades (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id TEXT,
+                    symbol TEXT,
+                    action TEXT,
+                    order_type TEXT,
+                    quantity REAL,
+                    requested_price REAL,
+                    executed_price REAL,
+                    status TEXT,
+                    timestamp DATETIME
+                )
+            ''')
+            await cursor.execute('''
+                CREATE TABLE IF NOT EXISTS agent_analyses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    agent_name TEXT,
+                    symbol TEXT,
+                    recommendation TEXT,
+                    confidence REAL,
+                    analysis TEXT,
+                    timestamp DATETIME
+                )
+            ''')
         await self.conn.commit()
 
     async def save_decision(self, decision, agent_type):
@@ -190,4 +287,45 @@ class AsyncDatabaseManager:
                 VALUES (?, ?, ?, ?)''',
                 (session_id, agent_name, message, datetime.now())
             )
-        await self.conn.commit() 
\ No newline at end of file
+        await self.conn.commit() 
+
+    async def save_agent_analysis(self, agent_name, symbol, analysis):
+        await self.save_agent_analyses([(agent_name, symbol, analysis)])
+
+    async def save_agent_analyses(self, analyses):
+        """Grava um lote de (agente, símbolo, análise) em uma única transação"""
+        if not analyses:
+            return
+        async with self.conn.cursor() as cursor:
+            await cursor.executemany(
+                '''INSERT INTO agent_analyses (agent_name, symbol, recommendation, confidence, analysis, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)''',
+                [_analysis_row(*row) for row in analyses]
+            )
+        await self.conn.commit()
+
+    async def save_trades(self, trades):
+        """Grava um lote de execuções em uma única transação"""
+        if not trades:
+            return
+        async with self.conn.cursor() as cursor:
+            await cursor.executemany(
+                '''INSERT INTO trades (order_id, symbol, action, order_type, quantity, requested_price, executed_price, status, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                [_trade_row(trade) for trade in trades]
+            )
+        await self.conn.commit()
+
+    async def get_agent_analyses(self, agent_name, limit=50):
+        """Últimas análises completas de um agente, da mais recente para a mais antiga"""
+        async with self.conn.execute(
+            '''SELECT symbol, recommendation, confidence, analysis, timestamp FROM agent_analyses
+            WHERE agent_name = ? ORDER BY id DESC LIMIT ?''',
+            (agent_name, limit)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            {'symbol': symbol, 'recommendation': recommendation, 'confidence': confidence,
+             'analysis': analysis, 'timestamp': timestamp}
+            for symbol, recommendation, confidence, analysis, timestamp in rows
+        ]
\ No newline at end of file
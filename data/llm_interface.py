@@ -1,49 +1,285 @@
-# data/llm_interface.py 
+# data/llm_interface.py
 import asyncio
-import ollama
 import logging
 import time
-# Removi: from utils.cache import make_cache_key, get_cache, set_cache
+import uuid
+from typing import AsyncIterator, Optional
+from config.settings import settings
+from core.enums import LLMPriority
+from core.exceptions import DeadlineExceeded, LLMStreamInterrupted
+from llm.backends import LLMBackend, create_backend
+from llm.metrics import LLMMetrics
+from llm.response_cache import LLMResponseCache
+from llm.scheduler import LLMScheduler
+from llm.streaming import TokenSink, get_token_sink
+from utils.deadline import check_deadline, remaining
+from utils.single_flight import SingleFlight
+from utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 class LLMInterface:
-    def __init__(self, model_name: str = "llama3.2"):
+    def __init__(self, model_name: str = "llama3.2", backend: Optional[LLMBackend] = None):
         self.model_name = model_name
-        self.client = ollama.Client()
-        self.response_times = []
+        # Backend plugável: Ollama (assíncrono ou em threads) ou o substituto local de llm.fake_ollama
+        self.backend = backend or create_backend()
+        # Limita requisições simultâneas ao paralelismo do servidor Ollama, priorizando
+        # as chamadas que decidem a execução sobre a conversa da discussão
+        self.scheduler = LLMScheduler(
+            settings.llm.max_in_flight,
+            {LLMPriority(name): quota for name, quota in settings.llm.priority_quotas.items()},
+            settings.llm.aging_interval
+        )
+        self._single_flight = SingleFlight()
+        self.metrics = LLMMetrics()
+        self.options = {
+            "temperature": 0.7,
+            "num_predict": 150,
+            "num_ctx": 1024,
+            "num_gpu_layers": 20,
+            "num_thread": 4
+        }
+        self.cache = None
+        if settings.llm.cache_enabled:
+            self.cache = LLMResponseCache(
+                settings.llm.cache_ttl,
+                settings.llm.cache_memory_size,
+                settings.llm.cache_disk_path,
+                settings.llm.cache_max_disk_entries
+            )
         # Tenta detectar se há suporte a GPU (Ollama)
         try:
-            info = self.client.show(self.model_name)
+            info = self.backend.show(self.model_name)
             self.gpu_enabled = info.get('details', {}).get('gpu', False)
             logger.info(f"Ollama GPU enabled: {self.gpu_enabled}")
         except Exception as e:
             self.gpu_enabled = False
             logger.warning(f"Não foi possível detectar GPU no Ollama: {e}")
-        
-    async def generate_response(self, prompt: str, system_prompt: str = "") -> str:
-        # Removi toda a lógica de cache
-        start = time.perf_counter()
+
+    async def generate_response(self, prompt: str, system_prompt: str = "", use_cache: bool = True,
+                                priority: LLMPriority = LLMPriority.ANALYSIS,
+                                agent_name: Optional[str] = None, call_type: Optional[str] = None) -> str:
+        labels = (agent_name or "desconhecido", call_type or priority.value)
+        with tracer.span("llm.generate", agent=labels[0], call_type=labels[1], priority=priority.value) as span:
+            return await self._respond(prompt, system_prompt, use_cache, priority, agent_name, labels, span)
+
+    async def _respond(self, prompt: str, system_prompt: str, use_cache: bool, priority: LLMPriority,
+                       agent_name: Optional[str], labels, span) -> str:
+        request_key = LLMResponseCache.make_key(self.model_name, system_prompt, prompt, self.options)
+        use_cache = use_cache and self.cache is not None
+        cache_key = request_key if use_cache else None
+        sink = get_token_sink()
+        if use_cache:
+            cached = await self.cache.get_async(request_key)
+            if cached is not None:
+                logger.debug("Resposta do LLM obtida do cache")
+                self.metrics.record_cache_hit(*labels)
+                span.set_attribute('cache_hit', True)
+                if sink is not None:
+                    await self._publish_whole(sink, agent_name, cached)
+                return cached
+
+        # Requisições idênticas em andamento compartilham uma única geração. Com um
+        # destino de tokens ativo, a chamada líder gera em streaming; quem aguardou
+        # a mesma geração recebe o texto completo de uma vez
+        led = False
+
+        async def lead():
+            nonlocal led
+            led = True
+            if sink is None:
+                return await self._generate_uncached(prompt, system_prompt, cache_key, priority, labels)
+            return await self._stream_to_sink(sink, agent_name, prompt, system_prompt, cache_key, priority, labels)
+
+        # O prazo da sessão/símbolo limita a espera na fila e a geração
+        check_deadline(f"consultar o LLM ({labels[0]})")
+        time_left = remaining()
+        if time_left is None:
+            response = await self._single_flight.do_async(request_key, lead)
+        else:
+            try:
+                response = await asyncio.wait_for(self._single_flight.do_async(request_key, lead), time_left)
+            except asyncio.TimeoutError:
+                self.metrics.record_error(*labels)
+                raise DeadlineExceeded(f"Prazo esgotado durante a consulta ao LLM ({labels[0]})")
+        span.set_attribute('cache_hit', False)
+        span.set_attribute('coalesced', not led)
+        if not led:
+            self.metrics.record_coalesced(*labels)
+            if sink is not None:
+                await self._publish_whole(sink, agent_name, response)
+        return response
+
+    async def generate_stream(self, prompt: str, system_prompt: str = "", use_cache: bool = True,
+                              priority: LLMPriority = LLMPriority.ANALYSIS,
+                              agent_name: Optional[str] = None, call_type: Optional[str] = None) -> AsyncIterator[str]:
+        """Gera a resposta em streaming, produzindo cada token assim que chega do servidor.
+
+        Se a geração falhar depois dos primeiros tokens, levanta LLMStreamInterrupted
+        em vez de terminar normalmente com um texto cortado.
+        """
+        labels = (agent_name or "desconhecido", call_type or priority.value)
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = LLMResponseCache.make_key(self.model_name, system_prompt, prompt, self.options)
+            cached = await self.cache.get_async(cache_key)
+            if cached is not None:
+                self.metrics.record_cache_hit(*labels)
+                yield cached
+                return
+        check_deadline(f"consultar o LLM ({labels[0]})")
+        async for token in self._stream_uncached(prompt, system_prompt, cache_key, priority, labels):
+            yield token
+
+    async def _generate_uncached(self, prompt: str, system_prompt: str, cache_key,
+                                 priority: LLMPriority, labels) -> str:
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.client.generate(
-                    model=self.model_name,
-                    prompt=prompt,
-                    system=system_prompt,
-                    options={
-                        "temperature": 0.7, 
-                        "num_predict": 150,
-                        "num_ctx": 1024,
-                        "num_gpu_layers": 20,
-                        "num_thread": 4
-                    }
+            async with self.scheduler.slot(priority) as queue_wait:
+                start = time.perf_counter()
+                response = await asyncio.wait_for(
+                    self._generate(prompt, system_prompt),
+                    timeout=settings.llm.request_timeout
                 )
-            )
             elapsed = time.perf_counter() - start
-            self.response_times.append(elapsed)
+            self.metrics.record_call(*labels, elapsed, queue_wait, response)
+            tracer.current_span().set_attribute('queue_wait', queue_wait)
             logger.info(f"Tempo de resposta do LLM para o prompt: {elapsed:.2f} segundos")
+            if cache_key is not None:
+                await self.cache.set_async(cache_key, response['response'])
             return response['response']
+        except asyncio.TimeoutError:
+            self.metrics.record_error(*labels)
+            logger.error(f"Timeout de {settings.llm.request_timeout:.0f}s ao gerar resposta LLM")
+            return "Erro na análise"
         except Exception as e:
+            self.metrics.record_error(*labels)
             logger.error(f"Erro ao gerar resposta LLM: {e}")
-            return "Erro na análise" 
\ No newline at end of file
+            return "Erro na análise"
+
+    async def _stream_uncached(self, prompt: str, system_prompt: str, cache_key,
+                               priority: LLMPriority, labels) -> AsyncIterator[str]:
+        chunks = []
+        final_chunk = None
+        try:
+            async with self.scheduler.slot(priority) as queue_wait:
+                start = time.perf_counter()
+                async for chunk in self._stream_chunks(prompt, system_prompt):
+                    if chunk.get('done'):
+                        final_chunk = chunk
+                    token = chunk.get('response', '')
+                    if token:
+                        chunks.append(token)
+                        yield token
+            elapsed = time.perf_counter() - start
+            self.metrics.record_call(*labels, elapsed, queue_wait, final_chunk)
+            tracer.current_span().set_attribute('queue_wait', queue_wait)
+            logger.info(f"Tempo de resposta do LLM (streaming) para o prompt: {elapsed:.2f} segundos")
+        except asyncio.TimeoutError:
+            self.metrics.record_error(*labels)
+            logger.error(f"Timeout de {settings.llm.request_timeout:.0f}s aguardando tokens do LLM")
+            if chunks:
+                raise LLMStreamInterrupted(
+                    f"Timeout de {settings.llm.request_timeout:.0f}s aguardando tokens do LLM", ''.join(chunks)
+                )
+            yield "Erro na análise"
+            return
+        except Exception as e:
+            self.metrics.record_error(*labels)
+            logger.error(f"Erro ao gerar resposta LLM em streaming: {e}")
+            if chunks:
+                # O texto parcial não é uma resposta: quem consome precisa saber que foi cortado
+                raise LLMStreamInterrupted(f"Erro ao gerar resposta LLM em streaming: {e}", ''.join(chunks)) from e
+            yield "Erro na análise"
+            return
+        if cache_key is not None and chunks:
+            await self.cache.set_async(cache_key, ''.join(chunks))
+
+    async def _stream_to_sink(self, sink: TokenSink, agent_name: Optional[str], prompt: str,
+                              system_prompt: str, cache_key, priority: LLMPriority, labels) -> str:
+        """Consome o streaming repassando cada token ao destino e retorna o texto completo.
+
+        Os eventos 'agent_token' levam só o trecho novo (o tráfego cresce com o
+        texto, não com o seu quadrado); 'agent_stream_end' leva o texto inteiro.
+        """
+        stream_id = uuid.uuid4().hex[:12]
+        chunks = []
+        try:
+            async for token in self._stream_uncached(prompt, system_prompt, cache_key, priority, labels):
+                chunks.append(token)
+                await self._publish(sink, {
+                    'type': 'agent_token',
+                    'stream_id': stream_id,
+                    'agent_name': agent_name,
+                    'token': token
+                })
+        except LLMStreamInterrupted as e:
+            # Os ouvintes descartam o texto parcial; o agente recebe a resposta de erro
+            await self._publish(sink, {
+                'type': 'agent_stream_end',
+                'stream_id': stream_id,
+                'agent_name': agent_name,
+                'text': e.partial_text,
+                'error': str(e)
+            })
+            return "Erro na análise"
+        text = ''.join(chunks)
+        await self._publish(sink, {
+            'type': 'agent_stream_end',
+            'stream_id': stream_id,
+            'agent_name': agent_name,
+            'text': text
+        })
+        return text
+
+    async def _publish_whole(self, sink: TokenSink, agent_name: Optional[str], text: str) -> None:
+        """Publica uma resposta já pronta (cache ou geração compartilhada) como um único token"""
+        stream_id = uuid.uuid4().hex[:12]
+        await self._publish(sink, {
+            'type': 'agent_token', 'stream_id': stream_id, 'agent_name': agent_name, 'token': text
+        })
+        await self._publish(sink, {
+            'type': 'agent_stream_end', 'stream_id': stream_id, 'agent_name': agent_name, 'text': text
+        })
+
+    @staticmethod
+    async def _publish(sink: TokenSink, event: dict) -> None:
+        try:
+            await sink(event)
+        except Exception as e:
+            logger.warning(f"Falha ao publicar token do LLM: {e}")
+
+    async def _stream_chunks(self, prompt: str, system_prompt: str) -> AsyncIterator[dict]:
+        """Itera sobre os fragmentos da geração, com timeout entre fragmentos consecutivos"""
+        iterator = self.backend.stream(self.model_name, prompt, system_prompt, self.options).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout=settings.llm.request_timeout)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            await iterator.aclose()
+
+    async def _generate(self, prompt: str, system_prompt: str):
+        return await self.backend.generate(self.model_name, prompt, system_prompt, self.options)
+
+    async def close(self) -> None:
+        """Fecha os recursos do backend (pool de conexões)"""
+        await self.backend.close()
+
+    def get_metrics(self) -> dict:
+        """Retorna latências, filas, tokens e erros por agente e tipo de chamada"""
+        return self.metrics.snapshot()
+
+    def get_cache_stats(self) -> dict:
+        """Retorna estatísticas do cache de respostas"""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def get_scheduler_stats(self) -> dict:
+        """Retorna ocupação e tempos de fila por classe de prioridade"""
+        return self.scheduler.stats()
+
+    def get_coalescing_stats(self) -> dict:
+        """Retorna quantas gerações foram executadas e quantas foram economizadas por deduplicação"""
+        return self._single_flight.stats()
@@ -1,48 +1,144 @@
 # data/market_data.py
+import asyncio
+import contextvars
+import functools
 import logging
-import time
-from datetime import datetime
-from typing import Optional
+import random
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 import yfinance as yf
 import pandas as pd
 
 from core.data_models import MarketData, TechnicalIndicators
 from config.settings import settings
+from data.ohlcv_store import OHLCVStore
 from utils.cache_manager import cache_manager
 from utils.technical_indicators import TechnicalIndicatorCalculator
 from utils.data_fallback import fallback_generator
+from utils.single_flight import SingleFlight
+from utils.tracing import tracer
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _backoff_delay(attempt: int) -> float:
+    """Espera antes da próxima tentativa: exponencial com teto, metade fixa e metade aleatória"""
+    delay = min(settings.market_data.retry_delay * 2 ** attempt, settings.market_data.max_retry_delay)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _ticker_history(df: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    """Histórico de um símbolo dentro do DataFrame largo de um download com group_by='ticker'"""
+    if isinstance(df.columns, pd.MultiIndex):
+        # Seleção por nível: reaproveita os blocos do DataFrame largo, sem copiar os dados
+        df = df[symbol]
+    closes = df['Close']
+    # Ativos com calendários diferentes (cripto, câmbio, ações) deixam linhas vazias no frame largo
+    if closes.isna().any():
+        df = df[closes.notna()]
+    return df
+
+def _period_start(period: str) -> Optional[pd.Timestamp]:
+    """Início da janela de um período no formato do yfinance ('5d', '6mo', '1y', 'ytd', 'max')"""
+    now = pd.Timestamp.now(tz='UTC')
+    if period == 'ytd':
+        return now.normalize().replace(month=1, day=1)
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        return None
+    amount, unit = int(match.group(1)), match.group(2)
+    offsets = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+    return now - pd.DateOffset(**{offsets[unit]: amount})
+
+def _run_sync(coro):
+    """Executa uma corrotina do provedor a partir de código síncrono (threads, scripts).
+
+    As versões síncronas não podem ser usadas de dentro de um loop de eventos:
+    bloqueariam o loop até o fim do I/O. Código assíncrono usa os métodos *_async.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError(
+        "API síncrona do MarketDataProvider chamada de dentro de um loop de eventos; "
+        "use a versão *_async (ou chame-a com asyncio.to_thread)"
+    )
+
 class MarketDataProvider:
     """Provedor otimizado de dados de mercado com cache avançado"""
     
     def __init__(self):
-        # Inicializa caches especializados
+        # Inicializa caches especializados (com hard TTL, entradas velhas ainda são servidas)
+        swr = settings.cache.stale_while_revalidate
         self._market_cache = cache_manager.get_cache(
             'market_data', 
             settings.cache.market_data_ttl,
-            settings.cache.max_cache_size
+            settings.cache.max_cache_size,
+            settings.cache.market_data_hard_ttl if swr else None
         )
         self._technical_cache = cache_manager.get_cache(
             'technical_indicators', 
             settings.cache.technical_indicators_ttl,
-            settings.cache.max_cache_size
+            settings.cache.max_cache_size,
+            settings.cache.technical_indicators_hard_ttl if swr else None
         )
         self._calculator = TechnicalIndicatorCalculator()
+        # Uma busca por símbolo serve todas as chamadas concorrentes (de qualquer thread ou loop)
+        self._market_flight = SingleFlight()
+        self._technical_flight = SingleFlight()
+        self._ohlcv_store = (
+            OHLCVStore(settings.market_data.ohlcv_store_path) if settings.market_data.ohlcv_store_enabled else None
+        )
+        # Executor limitado só para o I/O do yfinance, separado do executor padrão do loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.market_data.max_workers,
+            thread_name_prefix="market-data"
+        )
+        # Atualizações de entradas velhas, fora do caminho de quem pediu os dados
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=settings.cache.refresh_workers,
+            thread_name_prefix="market-data-refresh"
+        )
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._watchlist_stop = threading.Event()
+        self._watchlist_thread: Optional[threading.Thread] = None
     
     def get_market_data(self, symbol: str) -> MarketData:
-        """Obtém dados de mercado com cache otimizado"""
-        # Verifica cache primeiro
-        cached_data = self._market_cache.get(symbol)
-        if cached_data:
-            logger.debug(f"Cache hit for market data: {symbol}")
+        """Versão síncrona de get_market_data_async"""
+        return _run_sync(self.get_market_data_async(symbol))
+
+    async def get_market_data_async(self, symbol: str) -> MarketData:
+        """Obtém dados de mercado com cache otimizado, sem bloquear o loop de eventos"""
+        with tracer.span("market_data.fetch", symbol=symbol) as span:
+            # Verifica cache primeiro
+            cached_data, stale = self._market_cache.lookup(symbol)
+            span.set_attribute('cache_hit', bool(cached_data))
+            if cached_data:
+                span.set_attribute('stale', stale)
+                if stale:
+                    self._refresh_in_background('market_data', [symbol], self._refresh_market_data)
+                logger.debug(f"Cache hit for market data: {symbol}")
+                return cached_data
+            return await self._market_flight.do_async(symbol, lambda: self._load_market_data(symbol))
+
+    async def _load_market_data(self, symbol: str) -> MarketData:
+        # Outra busca pode ter preenchido o cache entre a consulta e a entrada no single-flight
+        cached_data, stale = self._market_cache.lookup(symbol)
+        if cached_data and not stale:
             return cached_data
         
         # Busca dados reais
-        market_data = self._fetch_real_market_data(symbol)
+        market_data = await self._with_retries(self._fetch_real_market_data, symbol, "market data")
+        
+        # Falha ao atualizar uma entrada velha: mantém o dado real em vez do fallback
+        if not market_data and cached_data:
+            return cached_data
         
         # Fallback se necessário
         if not market_data and settings.enable_fallback:
@@ -57,15 +153,35 @@ class MarketDataProvider:
         return market_data
     
     def get_technical_indicators(self, symbol: str) -> TechnicalIndicators:
-        """Obtém indicadores técnicos com cache otimizado"""
-        # Verifica cache primeiro
-        cached_data = self._technical_cache.get(symbol)
-        if cached_data:
-            logger.debug(f"Cache hit for technical indicators: {symbol}")
+        """Versão síncrona de get_technical_indicators_async"""
+        return _run_sync(self.get_technical_indicators_async(symbol))
+
+    async def get_technical_indicators_async(self, symbol: str) -> TechnicalIndicators:
+        """Obtém indicadores técnicos com cache otimizado, sem bloquear o loop de eventos"""
+        with tracer.span("indicators.fetch", symbol=symbol) as span:
+            # Verifica cache primeiro
+            cached_data, stale = self._technical_cache.lookup(symbol)
+            span.set_attribute('cache_hit', bool(cached_data))
+            if cached_data:
+                span.set_attribute('stale', stale)
+                if stale:
+                    self._refresh_in_background('technical_indicators', [symbol], self._refresh_technical)
+                logger.debug(f"Cache hit for technical indicators: {symbol}")
+                return cached_data
+            return await self._technical_flight.do_async(symbol, lambda: self._load_technical_indicators(symbol))
+
+    async def _load_technical_indicators(self, symbol: str) -> TechnicalIndicators:
+        cached_data, stale = self._technical_cache.lookup(symbol)
+        if cached_data and not stale:
             return cached_data
         
         # Calcula indicadores reais
-        technical_data = self._calculate_real_technical_indicators(symbol)
+        technical_data = await self._with_retries(
+            self._calculate_real_technical_indicators, symbol, "technical indicators"
+        )
+        
+        if not technical_data and cached_data:
+            return cached_data
         
         # Fallback se necessário
         if not technical_data and settings.enable_fallback:
@@ -78,120 +194,436 @@ class MarketDataProvider:
             logger.debug(f"Cached technical indicators for: {symbol}")
         
         return technical_data
-    
-    def _fetch_real_market_data(self, symbol: str) -> Optional[MarketData]:
-        """Busca dados reais de mercado com retry e timeout"""
-        for attempt in range(settings.market_data.max_retries):
+
+    async def _with_retries(self, fetch, symbol: str, what: str):
+        """Executa fetch no executor dedicado, com backoff exponencial e jitter entre as tentativas"""
+        loop = asyncio.get_running_loop()
+        max_retries = settings.market_data.max_retries
+        for attempt in range(max_retries):
+            # copy_context mantém o span atual como pai dos spans abertos na thread
+            call = functools.partial(contextvars.copy_context().run, fetch, symbol, attempt)
             try:
-                logger.info(f"Fetching market data for {symbol} (attempt {attempt + 1})")
-                
-                # Cria ticker com timeout
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
-                
-                # Extrai dados principais
-                price = info.get('regularMarketPrice') or info.get('currentPrice')
-                volume = info.get('volume') or info.get('regularMarketVolume')
-                previous_close = info.get('regularMarketPreviousClose') or info.get('previousClose')
-                
-                # Validação básica
-                if not price or not isinstance(price, (int, float)):
-                    raise ValueError(f"Invalid price data for {symbol}")
-                
-                # Calcula mudança percentual
-                change_percent = 0.0
-                if previous_close and previous_close > 0:
-                    change_percent = ((price - previous_close) / previous_close * 100)
-                
-                # Dados adicionais
-                market_cap = info.get('marketCap', 0.0)
-                pe_ratio = info.get('trailingPE', 0.0)
-                
-                market_data = MarketData(
-                    symbol=symbol,
-                    price=float(price),
-                    volume=int(volume or 0),
-                    change_percent=float(change_percent),
-                    market_cap=float(market_cap or 0.0),
-                    pe_ratio=float(pe_ratio or 0.0),
-                    timestamp=datetime.now()
-                )
-                
-                logger.info(f"Successfully fetched market data for {symbol}")
-                return market_data
-                
+                return await loop.run_in_executor(self._executor, call)
             except Exception as e:
-                logger.warning(f"Attempt {attempt + 1} failed for {symbol}: {str(e)}")
-                if attempt < settings.market_data.max_retries - 1:
-                    time.sleep(settings.market_data.retry_delay)
-                continue
+                logger.warning(f"Attempt {attempt + 1} failed for {what} {symbol}: {str(e)}")
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(_backoff_delay(attempt))
         
-        logger.error(f"Failed to fetch market data for {symbol} after {settings.market_data.max_retries} attempts")
+        logger.error(f"Failed to fetch {what} for {symbol} after {max_retries} attempts")
         return None
     
-    def _calculate_real_technical_indicators(self, symbol: str) -> Optional[TechnicalIndicators]:
-        """Calcula indicadores técnicos reais com dados históricos"""
-        for attempt in range(settings.market_data.max_retries):
+    def _fetch_real_market_data(self, symbol: str, attempt: int = 0) -> MarketData:
+        """Uma tentativa de busca dos dados reais de mercado (bloqueante; levanta exceção em caso de falha)"""
+        logger.info(f"Fetching market data for {symbol} (attempt {attempt + 1})")
+        
+        # Cria ticker com timeout
+        ticker = yf.Ticker(symbol)
+        info = ticker.info
+        
+        # Extrai dados principais
+        price = info.get('regularMarketPrice') or info.get('currentPrice')
+        volume = info.get('volume') or info.get('regularMarketVolume')
+        previous_close = info.get('regularMarketPreviousClose') or info.get('previousClose')
+        
+        # Validação básica
+        if not price or not isinstance(price, (int, float)):
+            raise ValueError(f"Invalid price data for {symbol}")
+        
+        # Calcula mudança percentual
+        change_percent = 0.0
+        if previous_close and previous_close > 0:
+            change_percent = ((price - previous_close) / previous_close * 100)
+        
+        # Dados adicionais
+        market_cap = info.get('marketCap', 0.0)
+        pe_ratio = info.get('trailingPE', 0.0)
+        
+        market_data = MarketData(
+            symbol=symbol,
+            price=float(price),
+            volume=int(volume or 0),
+            change_percent=float(change_percent),
+            market_cap=float(market_cap or 0.0),
+            pe_ratio=float(pe_ratio or 0.0),
+            timestamp=datetime.now()
+        )
+        
+        logger.info(f"Successfully fetched market data for {symbol}")
+        return market_data
+    
+    def _calculate_real_technical_indicators(self, symbol: str, attempt: int = 0) -> TechnicalIndicators:
+        """Uma tentativa de cálculo dos indicadores com dados históricos (bloqueante; levanta exceção em caso de falha)"""
+        logger.info(f"Calculating technical indicators for {symbol} (attempt {attempt + 1})")
+        if self._ohlcv_store is not None:
+            # Com um só símbolo, _refresh_store já levanta se o download falhar
+            self._refresh_store([symbol], attempt)
+            return self._indicators_from_store(symbol)
+        
+        # Baixa dados históricos
+        with tracer.span("indicators.download", symbol=symbol, attempt=attempt + 1):
+            df = yf.download(
+                symbol,
+                period=settings.market_data.historical_period,
+                interval=settings.market_data.historical_interval,
+                progress=False,
+                timeout=settings.market_data.yfinance_timeout
+            )
+        # LOG DETALHADO PARA DIAGNÓSTICO
+        #logger.info(f"[DEBUG] DataFrame columns for {symbol}: {df.columns}")
+        #logger.info(f"[DEBUG] DataFrame shape for {symbol}: {df.shape}")
+        #logger.info(f"[DEBUG] DataFrame head for {symbol}:\n{df.head()}\n")
+        # NOVO: Se as colunas forem MultiIndex, achata para o primeiro nível
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        
+        return self._indicators_from_history(symbol, df)
+
+    def _calculate_bulk_technical_indicators(
+        self, symbols: List[str], attempt: int = 0
+    ) -> Tuple[Dict[str, TechnicalIndicators], Set[str]]:
+        """Uma tentativa de cálculo dos indicadores de vários símbolos com um único download multi-ticker.
+
+        Retorna os indicadores e os símbolos cujo histórico não pôde ser
+        atualizado (calculados só com o que já estava gravado, portanto velhos).
+        """
+        logger.info(f"Calculating technical indicators for {len(symbols)} symbols in bulk (attempt {attempt + 1})")
+        if self._ohlcv_store is not None:
+            failed = self._refresh_store(symbols, attempt)
+            results = {}
+            for symbol in symbols:
+                try:
+                    results[symbol] = self._indicators_from_store(symbol)
+                except ValueError as e:
+                    logger.warning(f"Bulk technical indicators unavailable for {symbol}: {e}")
+            if not results:
+                raise ValueError(f"Failed to calculate indicators for any of {len(symbols)} symbols")
+            return results, failed & results.keys()
+        
+        with tracer.span("indicators.download", symbols=len(symbols), attempt=attempt + 1):
+            df = yf.download(
+                symbols,
+                period=settings.market_data.historical_period,
+                interval=settings.market_data.historical_interval,
+                group_by='ticker',
+                progress=False,
+                timeout=settings.market_data.yfinance_timeout
+            )
+        if df is None or df.empty:
+            raise ValueError(f"No historical data available for {len(symbols)} symbols")
+        
+        results = {}
+        for symbol in symbols:
             try:
-                logger.info(f"Calculating technical indicators for {symbol} (attempt {attempt + 1})")
-                
-                # Baixa dados históricos
-                df = yf.download(
-                    symbol,
-                    period=settings.market_data.historical_period,
-                    interval=settings.market_data.historical_interval,
-                    progress=False,
-                    timeout=settings.market_data.yfinance_timeout
-                )
-                # LOG DETALHADO PARA DIAGNÓSTICO
-                #logger.info(f"[DEBUG] DataFrame columns for {symbol}: {df.columns}")
-                #logger.info(f"[DEBUG] DataFrame shape for {symbol}: {df.shape}")
-                #logger.info(f"[DEBUG] DataFrame head for {symbol}:\n{df.head()}\n")
-                # NOVO: Se as colunas forem MultiIndex, achata para o primeiro nível
-                if isinstance(df.columns, pd.MultiIndex):
-                    df.columns = df.columns.get_level_values(0)
-                
-                if df.empty:
-                    raise ValueError(f"No historical data available for {symbol}")
-                
-                # NOVO: Checa se as colunas necessárias existem
-                if 'Close' not in df.columns or 'Volume' not in df.columns:
-                    raise ValueError(f"DataFrame missing required columns for {symbol}: {df.columns}")
-                
-                # Valida dados mínimos
-                if len(df) < settings.technical.ma_long_period:
-                    logger.warning(f"Insufficient data for full technical analysis: {symbol}")
-                
-                # Calcula indicadores usando o calculador otimizado
-                indicators = self._calculator.calculate_all_indicators(df)
-                
-                if not indicators:
-                    raise ValueError(f"Failed to calculate indicators for {symbol}")
-                
-                technical_data = TechnicalIndicators(
-                    symbol=symbol,
-                    rsi=indicators['rsi'],
-                    macd=indicators['macd'],
-                    moving_avg_20=indicators['moving_avg_20'],
-                    moving_avg_50=indicators['moving_avg_50'],
-                    bollinger_upper=indicators['bollinger_upper'],
-                    bollinger_lower=indicators['bollinger_lower'],
-                    volume_sma=indicators['volume_sma'],
-                    timestamp=datetime.now()
-                )
-                
-                logger.info(f"Successfully calculated technical indicators for {symbol}")
-                return technical_data
-                
+                results[symbol] = self._indicators_from_history(symbol, _ticker_history(df, symbol))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Bulk technical indicators unavailable for {symbol}: {e}")
+        if not results:
+            raise ValueError(f"Failed to calculate indicators for any of {len(symbols)} symbols")
+        return results, set()
+
+    def _refresh_store(self, symbols: List[str], attempt: int = 0) -> Set[str]:
+        """Atualiza o histórico local: carga completa para séries novas, só a cauda para as existentes.
+
+        As séries existentes são agrupadas pela data da última barra gravada,
+        com um download por data: uma série parada há muito tempo não alarga a
+        janela das demais, e séries atualizadas juntas continuam num só pedido.
+
+        Retorna os símbolos que não receberam nenhuma barra (download com erro
+        ou sem dados para eles); o chamador decide se o que já está gravado
+        serve. Se nenhum símbolo foi atualizado, levanta ValueError.
+        """
+        interval = settings.market_data.historical_interval
+        last_bars = {symbol: self._ohlcv_store.last_timestamp(symbol, interval) for symbol in symbols}
+        requests = []
+        new = [symbol for symbol, last in last_bars.items() if last is None]
+        if new:
+            requests.append((new, {'period': settings.market_data.historical_period}))
+        tails: Dict[str, List[str]] = {}
+        for symbol, last in last_bars.items():
+            if last is not None:
+                # A partir da última barra gravada, que pode ter fechado depois da última carga
+                tails.setdefault(last.strftime('%Y-%m-%d'), []).append(symbol)
+        requests.extend((group, {'start': start}) for start, group in sorted(tails.items()))
+        failed = set()
+        for group, window in requests:
+            try:
+                with tracer.span("indicators.download", symbols=len(group), attempt=attempt + 1,
+                                 tail='start' in window):
+                    df = yf.download(
+                        group,
+                        interval=interval,
+                        group_by='ticker',
+                        progress=False,
+                        timeout=settings.market_data.yfinance_timeout,
+                        **window
+                    )
             except Exception as e:
-                logger.warning(f"Attempt {attempt + 1} failed for technical indicators {symbol}: {str(e)}")
-                if attempt < settings.market_data.max_retries - 1:
-                    time.sleep(settings.market_data.retry_delay)
+                logger.warning(f"History download failed for {len(group)} symbols: {e}")
+                failed.update(group)
+                continue
+            if df is None or df.empty:
+                logger.warning(f"No history returned for {len(group)} symbols")
+                failed.update(group)
                 continue
+            for symbol in group:
+                try:
+                    written = self._ohlcv_store.append(symbol, interval, _ticker_history(df, symbol))
+                except KeyError:
+                    written = 0
+                if not written:
+                    logger.warning(f"No history returned for {symbol}")
+                    failed.add(symbol)
+        if failed and len(failed) == len(symbols):
+            raise ValueError(f"History refresh failed for all {len(symbols)} symbols")
+        return failed
+
+    def _indicators_from_store(self, symbol: str) -> TechnicalIndicators:
+        """Indicadores calculados sobre views (memmap) do histórico local no período configurado"""
+        columns = self._ohlcv_store.arrays(
+            symbol, settings.market_data.historical_interval, _period_start(settings.market_data.historical_period)
+        )
+        if columns is None or not len(columns['close']):
+            raise ValueError(f"No historical data available for {symbol}")
+        return self._indicators_from_arrays(symbol, columns['close'], columns['volume'])
+
+    def _indicators_from_history(self, symbol: str, df: pd.DataFrame) -> TechnicalIndicators:
+        """Valida o histórico OHLCV de um símbolo e calcula os seus indicadores"""
+        if df.empty:
+            raise ValueError(f"No historical data available for {symbol}")
         
-        logger.error(f"Failed to calculate technical indicators for {symbol} after {settings.market_data.max_retries} attempts")
-        return None
+        # NOVO: Checa se as colunas necessárias existem
+        if 'Close' not in df.columns or 'Volume' not in df.columns:
+            raise ValueError(f"DataFrame missing required columns for {symbol}: {df.columns}")
+        
+        return self._indicators_from_arrays(symbol, df['Close'].to_numpy(), df['Volume'].to_numpy())
+
+    def _indicators_from_arrays(self, symbol: str, closes, volumes) -> TechnicalIndicators:
+        # Valida dados mínimos
+        if len(closes) < settings.technical.ma_long_period:
+            logger.warning(f"Insufficient data for full technical analysis: {symbol}")
+        
+        # Calcula indicadores usando o calculador otimizado
+        with tracer.span("indicators.calculate", symbol=symbol, rows=len(closes)):
+            indicators = self._calculator.calculate_from_arrays(closes, volumes)
+        
+        if not indicators:
+            raise ValueError(f"Failed to calculate indicators for {symbol}")
+        
+        technical_data = TechnicalIndicators(
+            symbol=symbol,
+            rsi=indicators['rsi'],
+            macd=indicators['macd'],
+            moving_avg_20=indicators['moving_avg_20'],
+            moving_avg_50=indicators['moving_avg_50'],
+            bollinger_upper=indicators['bollinger_upper'],
+            bollinger_lower=indicators['bollinger_lower'],
+            volume_sma=indicators['volume_sma'],
+            timestamp=datetime.now()
+        )
+        
+        logger.info(f"Successfully calculated technical indicators for {symbol}")
+        return technical_data
     
+    def get_technical_indicators_bulk(self, symbols) -> Dict[str, TechnicalIndicators]:
+        """Versão síncrona de get_technical_indicators_bulk_async"""
+        return _run_sync(self.get_technical_indicators_bulk_async(symbols))
+
+    async def get_technical_indicators_bulk_async(self, symbols) -> Dict[str, TechnicalIndicators]:
+        """Indicadores de vários símbolos; os que não estão em cache vêm de um único download multi-ticker"""
+        symbols = list(dict.fromkeys(symbols))
+        results = {}
+        missing = []
+        stale_symbols = []
+        for symbol in symbols:
+            cached_data, stale = self._technical_cache.lookup(symbol)
+            if cached_data:
+                results[symbol] = cached_data
+                if stale:
+                    stale_symbols.append(symbol)
+            else:
+                missing.append(symbol)
+        if stale_symbols:
+            self._refresh_in_background('technical_indicators', stale_symbols, self._refresh_technical)
+        if missing:
+            # Registrado no single-flight por símbolo: buscas individuais concorrentes aguardam
+            # este download, e símbolos já em busca não entram nele
+            cache_hits = len(results)
+            loaded = await self._technical_flight.do_many_async(
+                missing, lambda pending: self._load_technical_bulk(pending, cache_hits=cache_hits)
+            )
+            results.update((symbol, data) for symbol, data in loaded.items() if data)
+        return results
+
+    async def _load_technical_bulk(self, symbols: List[str], cache_hits: int = 0) -> Dict[str, TechnicalIndicators]:
+        with tracer.span("indicators.bulk_fetch", symbols=len(symbols), cache_hits=cache_hits):
+            computed, stale = await self._with_retries(
+                self._calculate_bulk_technical_indicators, symbols, "bulk technical indicators"
+            ) or ({}, set())
+        
+        results = {}
+        for symbol in symbols:
+            technical_data = computed.get(symbol)
+            if not technical_data:
+                # Entrada velha que não pôde ser atualizada continua valendo até o hard TTL
+                technical_data = self._technical_cache.lookup(symbol)[0]
+                if technical_data:
+                    results[symbol] = technical_data
+                    continue
+            if not technical_data and settings.enable_fallback:
+                logger.warning(f"Using fallback data for technical indicators: {symbol}")
+                technical_data = fallback_generator.generate_technical_indicators(symbol)
+            if technical_data:
+                if symbol in stale:
+                    # Calculado sobre histórico desatualizado: entra já vencido, para ser revalidado
+                    self._technical_cache.set(symbol, technical_data, ttl=timedelta.resolution)
+                else:
+                    self._technical_cache.set(symbol, technical_data)
+                results[symbol] = technical_data
+        return results
+
+    def get_latest_prices(self, symbols) -> Dict[str, float]:
+        """Preços atuais de vários símbolos: cache primeiro, depois um único download em lote"""
+        symbols = list(dict.fromkeys(symbols))
+        # Preços usados para execução: entradas velhas são baixadas de novo
+        prices = self.get_cached_prices(symbols, allow_stale=False)
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if missing:
+            with tracer.span("market_data.bulk_prices", symbols=len(missing)):
+                prices.update(self._fetch_latest_prices(missing))
+        # O que o download não resolveu segue o caminho individual (com fallback)
+        for symbol in missing:
+            if symbol not in prices:
+                market_data = self.get_market_data(symbol)
+                if market_data:
+                    prices[symbol] = market_data.price
+        return prices
+
+    def _fetch_latest_prices(self, symbols) -> Dict[str, float]:
+        """Último fechamento de cada símbolo em uma só chamada ao yfinance"""
+        try:
+            df = yf.download(
+                symbols,
+                period="5d",
+                interval="1d",
+                group_by='ticker',
+                progress=False,
+                threads=False,
+                timeout=settings.market_data.yfinance_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Bulk price download failed for {symbols}: {e}")
+            return {}
+        prices = {}
+        if df is None or df.empty:
+            return prices
+        for symbol in symbols:
+            try:
+                closes = df[symbol]['Close'] if isinstance(df.columns, pd.MultiIndex) else df['Close']
+                closes = closes.dropna()
+            except KeyError:
+                continue
+            if not closes.empty:
+                prices[symbol] = float(closes.iloc[-1])
+        return prices
+
+    async def _refresh_market_data(self, symbols: List[str]) -> None:
+        await asyncio.gather(*(
+            self._market_flight.do_async(symbol, functools.partial(self._load_market_data, symbol))
+            for symbol in symbols
+        ))
+
+    async def _refresh_technical(self, symbols: List[str]) -> None:
+        if len(symbols) == 1:
+            symbol = symbols[0]
+            await self._technical_flight.do_async(symbol, lambda: self._load_technical_indicators(symbol))
+        elif symbols:
+            await self._technical_flight.do_many_async(symbols, self._load_technical_bulk)
+
+    def _refresh_in_background(self, kind: str, symbols: List[str], refresh) -> None:
+        """Agenda a atualização de entradas velhas sem esperar por ela (uma por símbolo de cada vez)"""
+        with self._refresh_lock:
+            pending = [symbol for symbol in symbols if (kind, symbol) not in self._refreshing]
+            self._refreshing.update((kind, symbol) for symbol in pending)
+        if not pending:
+            return
+        
+        def run():
+            try:
+                with tracer.span("market_data.refresh", kind=kind, symbols=len(pending)):
+                    asyncio.run(refresh(pending))
+            except Exception as e:
+                logger.warning(f"Background refresh of {kind} failed for {pending}: {str(e)}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.difference_update((kind, symbol) for symbol in pending)
+        
+        try:
+            self._refresh_executor.submit(run)
+        except RuntimeError:
+            # Provedor encerrado: o valor velho continua sendo servido até o hard TTL
+            with self._refresh_lock:
+                self._refreshing.difference_update((kind, symbol) for symbol in pending)
+
+    async def refresh(self, symbols, margin: timedelta = timedelta(0)) -> None:
+        """Atualiza dados e indicadores ausentes, velhos ou que ficam velhos dentro de margin"""
+        symbols = list(dict.fromkeys(symbols))
+        
+        def due(cache, symbol):
+            remaining = cache.time_to_stale(symbol)
+            return remaining is None or remaining <= margin
+        
+        market = [symbol for symbol in symbols if due(self._market_cache, symbol)]
+        technical = [symbol for symbol in symbols if due(self._technical_cache, symbol)]
+        await asyncio.gather(self._refresh_market_data(market), self._refresh_technical(technical))
+
+    def start_watchlist_refresh(self, symbols=None, interval: Optional[timedelta] = None) -> None:
+        """Mantém os símbolos da watchlist no cache, atualizando-os antes de ficarem velhos"""
+        symbols = list(symbols if symbols is not None else settings.cache.watchlist)
+        if not symbols or (self._watchlist_thread and self._watchlist_thread.is_alive()):
+            return
+        interval = interval or settings.cache.watchlist_refresh_interval
+        self._watchlist_stop.clear()
+        
+        def loop():
+            while not self._watchlist_stop.is_set():
+                try:
+                    # Atualiza o que ficaria velho antes da próxima rodada
+                    asyncio.run(self.refresh(symbols, margin=interval))
+                except Exception as e:
+                    logger.warning(f"Watchlist refresh failed: {str(e)}")
+                self._watchlist_stop.wait(interval.total_seconds())
+        
+        self._watchlist_thread = threading.Thread(target=loop, name="market-data-watchlist", daemon=True)
+        self._watchlist_thread.start()
+        logger.info(f"Watchlist refresh started for {len(symbols)} symbols every {interval}")
+
+    def stop_watchlist_refresh(self, timeout: Optional[float] = 5.0) -> None:
+        self._watchlist_stop.set()
+        thread, self._watchlist_thread = self._watchlist_thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def get_cached_prices(self, symbols, allow_stale: bool = True) -> Dict[str, float]:
+        """Preços dos símbolos presentes no cache, sem acessar a rede.
+
+        Entradas velhas são atualizadas em segundo plano e só entram no
+        resultado com allow_stale (ex.: marcação a mercado).
+        """
+        prices = {}
+        stale_symbols = []
+        for symbol in symbols:
+            cached_data, stale = self._market_cache.lookup(symbol)
+            if not cached_data:
+                continue
+            if stale:
+                stale_symbols.append(symbol)
+                if not allow_stale:
+                    continue
+            prices[symbol] = cached_data.price
+        if stale_symbols:
+            self._refresh_in_background('market_data', stale_symbols, self._refresh_market_data)
+        return prices
+
     def invalidate_cache(self, symbol: str) -> None:
         """Invalida cache para um símbolo específico"""
         self._market_cache.invalidate(symbol)
@@ -204,6 +636,19 @@ class MarketDataProvider:
         self._technical_cache.clear()
         logger.info("All cache cleared")
     
+    def shutdown(self) -> None:
+        """Encerra a atualização da watchlist e os executores de I/O"""
+        self.stop_watchlist_refresh()
+        self._refresh_executor.shutdown(wait=False)
+        self._executor.shutdown(wait=False)
+    
+    def get_coalescing_stats(self) -> dict:
+        """Buscas executadas e chamadas atendidas por uma busca já em andamento"""
+        return {
+            'market_data': self._market_flight.stats(),
+            'technical_indicators': self._technical_flight.stats()
+        }
+    
     def get_cache_stats(self) -> dict:
         """Retorna estatísticas do cache"""
         return {
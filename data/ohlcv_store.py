@@ -0,0 +1,194 @@
+# data/ohlcv_store.py
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Dict, Optional, Set
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Colunas gravadas por (símbolo, intervalo), cada uma em um arquivo binário próprio
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+_DTYPES = {'timestamp': np.int64, 'open': np.float64, 'high': np.float64,
+           'low': np.float64, 'close': np.float64, 'volume': np.float64}
+_SOURCE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+class OHLCVStore:
+    """Histórico OHLCV local em arquivos colunares, lido por memmap.
+
+    Cada série (símbolo, intervalo) é um diretório com gerações numeradas, e
+    cada geração tem um arquivo por coluna (timestamps em ns UTC e valores
+    float64). index.json aponta a geração atual, o número de linhas e o
+    último timestamp de cada série, e só é trocado depois que as colunas
+    foram gravadas, então uma escrita interrompida nunca expõe linhas parciais.
+
+    Barras novas são acrescentadas ao fim dos arquivos da geração atual: as
+    linhas que os memmaps entregues por arrays() enxergam nunca mudam. Só
+    quando uma barra já gravada volta diferente (a última barra, ainda
+    incompleta, na carga anterior) a série é regravada em uma geração nova e
+    a antiga é removida; se a remoção falhar (memmaps ainda abertos, no
+    Windows), ela é tentada de novo nas gravações seguintes e ao reabrir.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        self._index: Dict[str, Dict[str, int]] = {}
+        # Gerações (e arquivos do layout antigo) que ainda não puderam ser removidas
+        self._obsolete: Set[str] = set()
+        index_path = os.path.join(root, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                # Entradas do layout antigo (sem geração) são baixadas de novo
+                self._index = {key: entry for key, entry in json.load(f).items() if 'generation' in entry}
+            for key, entry in self._index.items():
+                directory = os.path.join(root, key)
+                self._obsolete.update(
+                    os.path.join(directory, name) for name in os.listdir(directory)
+                    if name != str(entry['generation'])
+                )
+            self._remove_obsolete()
+
+    @staticmethod
+    def _key(symbol: str, interval: str) -> str:
+        return f"{re.sub(r'[^A-Za-z0-9._-]', '_', symbol)}__{interval}"
+
+    def _path(self, key: str, generation: int, column: str) -> str:
+        return os.path.join(self.root, key, str(generation), f"{column}.bin")
+
+    def rows(self, symbol: str, interval: str) -> int:
+        with self._lock:
+            return self._index.get(self._key(symbol, interval), {}).get('rows', 0)
+
+    def last_timestamp(self, symbol: str, interval: str) -> Optional[pd.Timestamp]:
+        with self._lock:
+            entry = self._index.get(self._key(symbol, interval))
+        if not entry or not entry['rows']:
+            return None
+        return pd.Timestamp(entry['last_timestamp'], tz='UTC')
+
+    def append(self, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        """Acrescenta as barras de df (índice de datas, colunas Open/High/Low/Close/Volume).
+
+        Barras a partir do primeiro timestamp de df substituem as já gravadas.
+        Retorna o número de barras recebidas (novas ou conferidas com as gravadas).
+        """
+        df = df[df['Close'].notna()]
+        if df.empty:
+            return 0
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        timestamps = index.tz_convert('UTC').as_unit('ns').asi8
+        values = {
+            column: timestamps if column == 'timestamp' else
+            df[_SOURCE_COLUMNS[column]].to_numpy(dtype=np.float64, na_value=np.nan)
+            for column in COLUMNS
+        }
+        key = self._key(symbol, interval)
+        with self._lock:
+            self._remove_obsolete()
+            entry = self._index.get(key, {})
+            rows = entry.get('rows', 0)
+            generation = entry.get('generation')
+            keep = 0
+            if rows:
+                stored = self._column(key, generation, 'timestamp', rows)
+                keep = int(np.searchsorted(stored, timestamps[0], side='left'))
+                del stored
+            overlap = rows - keep
+            if overlap and len(timestamps) >= overlap and self._unchanged(key, generation, keep, rows, values):
+                # Barras já gravadas voltaram iguais: só as seguintes são acrescentadas
+                values = {column: column_values[overlap:] for column, column_values in values.items()}
+                keep = rows
+            if rows and keep == rows:
+                self._append_in_place(key, generation, rows, values)
+            else:
+                generation = self._rewrite(key, generation, keep, values)
+            self._index[key] = {'rows': keep + len(values['timestamp']), 'last_timestamp': int(timestamps[-1]),
+                                'generation': generation}
+            self._save_index()
+            self._remove_obsolete()
+        return len(timestamps)
+
+    def arrays(self, symbol: str, interval: str, since: Optional[pd.Timestamp] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Colunas da série como memmaps somente leitura (opcionalmente a partir de since), sem cópia"""
+        key = self._key(symbol, interval)
+        with self._lock:
+            entry = self._index.get(key, {})
+            rows = entry.get('rows', 0)
+            if not rows:
+                return None
+            columns = {column: self._column(key, entry['generation'], column, rows) for column in COLUMNS}
+        if since is not None:
+            since = pd.Timestamp(since)
+            since = since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+            start = int(np.searchsorted(columns['timestamp'], since.value, side='left'))
+            columns = {column: values[start:] for column, values in columns.items()}
+        return columns
+
+    def series(self):
+        """Chaves (símbolo__intervalo) das séries gravadas"""
+        with self._lock:
+            return list(self._index)
+
+    def _column(self, key: str, generation: int, column: str, rows: int) -> np.ndarray:
+        return np.memmap(self._path(key, generation, column), dtype=_DTYPES[column], mode='r', shape=(rows,))
+
+    def _unchanged(self, key: str, generation: int, keep: int, rows: int, values: Dict[str, np.ndarray]) -> bool:
+        """As linhas [keep, rows) gravadas são iguais ao início de values?"""
+        overlap = rows - keep
+        for column in COLUMNS:
+            stored = self._column(key, generation, column, rows)[keep:]
+            if not np.array_equal(stored, values[column][:overlap], equal_nan=column != 'timestamp'):
+                return False
+        return True
+
+    def _append_in_place(self, key: str, generation: int, rows: int, values: Dict[str, np.ndarray]) -> None:
+        """Grava values depois das rows linhas válidas da geração atual"""
+        for column in COLUMNS:
+            with open(self._path(key, generation, column), 'r+b') as f:
+                f.seek(rows * np.dtype(_DTYPES[column]).itemsize)
+                f.write(np.ascontiguousarray(values[column], dtype=_DTYPES[column]).tobytes())
+                # Sobra de uma gravação interrompida (além de rows, nenhum leitor a mapeia)
+                f.truncate()
+
+    def _rewrite(self, key: str, previous: Optional[int], keep: int, values: Dict[str, np.ndarray]) -> int:
+        """Grava as keep primeiras linhas da geração atual seguidas de values em uma geração nova"""
+        generation = 0 if previous is None else previous + 1
+        directory = os.path.join(self.root, key, str(generation))
+        # Sobra de uma gravação interrompida com o mesmo número de geração
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        for column in COLUMNS:
+            with open(self._path(key, generation, column), 'wb') as f:
+                if keep:
+                    f.write(self._column(key, previous, column, keep).tobytes())
+                f.write(np.ascontiguousarray(values[column], dtype=_DTYPES[column]).tobytes())
+        if previous is not None:
+            # Só é removida depois que o índice aponta a geração nova
+            self._obsolete.add(os.path.join(self.root, key, str(previous)))
+        return generation
+
+    def _remove_obsolete(self) -> None:
+        for path in list(self._obsolete):
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Falha ao remover {path} do histórico local (nova tentativa depois): {e}")
+                continue
+            self._obsolete.discard(path)
+
+    def _save_index(self) -> None:
+        path = os.path.join(self.root, 'index.json')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, path)
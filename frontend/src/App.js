@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Users, Activity, TrendingUp, Bot, MessageSquare, BarChart3, AlertCircle } from 'lucide-react';
 import AgentMeeting from './components/AgentMeeting';
 import ControlPanel from './components/ControlPanel';
@@ -16,34 +16,75 @@ function App() {
 
   const { agents, loading: agentsLoading } = useAgents();
   const { connectionStatus, messages } = useWebSocket();
+  const processedCount = useRef(0);
 
   // Processar mensagens do WebSocket
   useEffect(() => {
-    if (messages.length > 0) {
-      const lastMessage = messages[messages.length - 1];
-      
-      switch (lastMessage.type) {
+    const handleMessage = (message) => {
+      switch (message.type) {
         case 'analysis_started':
           setIsAnalysisRunning(true);
-          setCurrentSession(lastMessage.session_id);
+          setCurrentSession(message.session_id);
           setAgentMessages([]);
           setAnalysisResults({});
           break;
+
+        case 'agent_token':
+          // Cada evento traz só o trecho novo, acrescentado à mensagem em andamento
+          setAgentMessages(prev => {
+            const id = `stream-${message.stream_id}`;
+            if (!prev.some(m => m.id === id)) {
+              return [...prev, {
+                id,
+                agentName: message.agent_name,
+                message: message.token,
+                timestamp: message.timestamp,
+                symbol: message.symbol,
+                streamed: true,
+                streaming: true
+              }];
+            }
+            return prev.map(m => (m.id === id ? { ...m, message: m.message + message.token } : m));
+          });
+          break;
+
+        case 'agent_stream_end':
+          // A mensagem fica na conversa, com o texto final enviado pelo servidor
+          setAgentMessages(prev => prev.map(m => (
+            m.id === `stream-${message.stream_id}`
+              ? {
+                  ...m,
+                  message: message.error ? `${message.text} [interrompido]` : message.text,
+                  streaming: false
+                }
+              : m
+          )));
+          break;
           
         case 'agent_message':
-          setAgentMessages(prev => [...prev, {
-            id: `${lastMessage.session_id}-${lastMessage.message_index}`,
-            agentName: lastMessage.agent_name,
-            message: lastMessage.message,
-            timestamp: lastMessage.timestamp,
-            symbol: lastMessage.symbol
-          }]);
+          setAgentMessages(prev => {
+            // Respostas da discussão já chegaram em streaming: não repete a mensagem
+            const duplicate = prev.some(m => (
+              m.streamed && !m.streaming && m.agentName === message.agent_name &&
+              m.symbol === message.symbol && m.message === message.message
+            ));
+            if (duplicate) {
+              return prev;
+            }
+            return [...prev, {
+              id: `${message.session_id}-${message.message_index}`,
+              agentName: message.agent_name,
+              message: message.message,
+              timestamp: message.timestamp,
+              symbol: message.symbol
+            }];
+          });
           break;
           
         case 'symbol_analysis_completed':
           setAnalysisResults(prev => ({
             ...prev,
-            [lastMessage.symbol]: lastMessage.result
+            [message.symbol]: message.result
           }));
           break;
           
@@ -53,10 +94,15 @@ function App() {
           
         case 'analysis_error':
           setIsAnalysisRunning(false);
-          console.error('Analysis error:', lastMessage.error);
+          console.error('Analysis error:', message.error);
           break;
       }
-    }
+    };
+
+    // Todas as mensagens novas, em ordem: os tokens são deltas e nenhum pode ser pulado
+    const pending = messages.slice(processedCount.current);
+    processedCount.current = messages.length;
+    pending.forEach(handleMessage);
   }, [messages]);
 
   const handleStartAnalysis = async (symbols) => {
@@ -0,0 +1,134 @@
+# llm/backends.py
+import asyncio
+import threading
+import httpx
+import ollama
+from typing import Any, AsyncIterator, Dict, Optional
+from config.settings import settings
+
+class LLMBackend:
+    """Interface dos backends de geração usados pelo LLMInterface.
+
+    As respostas seguem o formato do Ollama: um dicionário (ou objeto
+    subscritível) com 'response' e, quando disponíveis, os metadados de
+    avaliação ('prompt_eval_count', 'eval_count', 'eval_duration', ...).
+    """
+
+    async def generate(self, model: str, prompt: str, system: str, options: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def stream(self, model: str, prompt: str, system: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    def show(self, model: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class OllamaBackend(LLMBackend):
+    """Cliente síncrono do Ollama executado no pool de threads padrão"""
+
+    def __init__(self, host: Optional[str] = None):
+        self.client = ollama.Client(host=host)
+
+    async def generate(self, model, prompt, system, options):
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: self.client.generate(model=model, prompt=prompt, system=system, options=options)
+        )
+
+    async def stream(self, model, prompt, system, options):
+        # A iteração roda em uma thread e alimenta uma fila do event loop. Se o consumidor
+        # desiste (timeout ou cancelamento), stop faz a thread fechar a resposta e parar
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Loop encerrado: ninguém mais lê a fila
+                stop.set()
+
+        def produce():
+            response = None
+            try:
+                response = self.client.generate(
+                    model=model, prompt=prompt, system=system, options=options, stream=True
+                )
+                for chunk in response:
+                    if stop.is_set():
+                        break
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                if hasattr(response, 'close'):
+                    response.close()
+                put(done)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+        await producer
+
+    def show(self, model):
+        return self.client.show(model)
+
+class AsyncOllamaBackend(OllamaBackend):
+    """Cliente assíncrono nativo: pool de conexões keep-alive do httpx, sem thread por requisição"""
+
+    def __init__(self, host: Optional[str] = None, max_connections: int = 4,
+                 request_timeout: float = 120.0, connect_timeout: float = 5.0):
+        super().__init__(host)
+        self.async_client = ollama.AsyncClient(
+            host=host,
+            timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+    async def generate(self, model, prompt, system, options):
+        return await self.async_client.generate(model=model, prompt=prompt, system=system, options=options)
+
+    async def stream(self, model, prompt, system, options):
+        iterator = await self.async_client.generate(
+            model=model, prompt=prompt, system=system, options=options, stream=True
+        )
+        async for chunk in iterator:
+            yield chunk
+
+    async def close(self):
+        if hasattr(self.async_client, 'close'):
+            await self.async_client.close()
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """Cria o backend configurado em settings.llm.backend"""
+    name = name or settings.llm.backend
+    if name == "fake":
+        from llm.fake_ollama import FakeOllamaBackend
+        return FakeOllamaBackend()
+    if name != "ollama":
+        raise ValueError(f"Backend de LLM desconhecido: {name}")
+    if settings.llm.use_async_client:
+        return AsyncOllamaBackend(
+            settings.llm.host,
+            settings.llm.max_in_flight,
+            settings.llm.request_timeout,
+            settings.llm.connect_timeout
+        )
+    return OllamaBackend(settings.llm.host)
@@ -0,0 +1,141 @@
+# llm/context_builder.py
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Heurística sem tokenizer: ~4 caracteres por token para texto em português/inglês
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+# Frases com números ou termos de decisão carregam mais informação por token
+_KEY_TERMS = re.compile(
+    r'\d|recomend|compr|vend|mant|risco|suporte|resist|alvo|confian|buy|sell|hold',
+    re.IGNORECASE
+)
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa de tokens de um texto"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Corta o texto para caber em max_tokens, preferindo terminar em fim de palavra"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 1:
+        return ""
+    cut = text[:max_chars - 1]
+    space = cut.rfind(' ')
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+def extract_key_sentences(text: str, max_tokens: int) -> str:
+    """Seleciona as frases mais informativas que cabem no orçamento, mantendo a ordem original"""
+    text = text.strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+    # Frases com termos-chave primeiro, depois as demais na ordem em que aparecem
+    ranked = sorted(range(len(sentences)), key=lambda i: (not _KEY_TERMS.search(sentences[i]), i))
+    chosen, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(sentences[i]) + 1
+        if used + cost <= max_tokens:
+            chosen.append(i)
+            used += cost
+    if not chosen:
+        return truncate_to_tokens(sentences[ranked[0]], max_tokens)
+    return ' '.join(sentences[i] for i in sorted(chosen))
+
+def analysis_fields(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Extrai os campos estruturados (recomendação, confiança, números-chave) de uma análise"""
+    fields = {}
+    recommendation = analysis.get('recommendation')
+    if recommendation is not None:
+        fields['recomendação'] = getattr(recommendation, 'value', recommendation)
+    if analysis.get('confidence') is not None:
+        fields['confiança'] = f"{analysis['confidence']:.0f}%"
+    for key in ('sentiment_score', 'news_impact'):
+        if analysis.get(key) is not None:
+            fields[key] = f"{analysis[key]:+.2f}"
+    if analysis.get('bias'):
+        fields['viés'] = analysis['bias']
+    for key, value in (analysis.get('technical_signals') or {}).items():
+        fields[key] = value
+    return fields
+
+class ContextBuilder:
+    """Monta o contexto de um prompt dentro de um orçamento fixo de tokens.
+
+    Campos estruturados entram primeiro, em uma linha compacta por item; o
+    orçamento restante é dividido entre os textos livres, dos quais são
+    extraídas as frases mais informativas. Itens que precisam de menos que a
+    sua cota devolvem a sobra para os demais.
+    """
+
+    def __init__(self, budget_tokens: int):
+        self.budget_tokens = budget_tokens
+        # (rótulo, conteúdo, é_texto_livre)
+        self._items: List[Tuple[Optional[str], Any, bool]] = []
+
+    def add_fields(self, label: Optional[str], fields: Dict[str, Any]) -> "ContextBuilder":
+        self._items.append((label, fields, False))
+        return self
+
+    def add_line(self, line: str) -> "ContextBuilder":
+        """Adiciona uma linha fixa (tratada como campo estruturado)"""
+        self._items.append((None, line, False))
+        return self
+
+    def add_text(self, label: Optional[str], text: Optional[str]) -> "ContextBuilder":
+        if text:
+            self._items.append((label, text, True))
+        return self
+
+    def build(self) -> str:
+        lines: List[Optional[str]] = [None] * len(self._items)
+        remaining = self.budget_tokens
+
+        for i, (label, content, is_text) in enumerate(self._items):
+            if is_text:
+                continue
+            line = content if isinstance(content, str) else self._format_fields(label, content)
+            line = truncate_to_tokens(line, max(remaining, 0))
+            lines[i] = line
+            remaining -= estimate_tokens(line) + 1
+
+        # Divide o restante entre os textos livres, redistribuindo as sobras
+        pending = [i for i, item in enumerate(self._items) if item[2]]
+        while pending and remaining > 0:
+            share = remaining // len(pending)
+            if share <= 0:
+                break
+            still_pending = []
+            for i in pending:
+                label, text, _ = self._items[i]
+                prefix = f"{label}: " if label else ""
+                needed = estimate_tokens(prefix + text) + 1
+                if needed <= share:
+                    lines[i] = prefix + text
+                    remaining -= needed
+                else:
+                    still_pending.append(i)
+            if len(still_pending) == len(pending):
+                # Nenhum coube inteiro: cada um recebe a sua cota compactada
+                for i in still_pending:
+                    label, text, _ = self._items[i]
+                    prefix = f"{label}: " if label else ""
+                    body = extract_key_sentences(text, max(share - estimate_tokens(prefix) - 1, 0))
+                    if body:
+                        lines[i] = prefix + body
+                        remaining -= estimate_tokens(lines[i]) + 1
+                break
+            pending = still_pending
+
+        return "\n".join(line for line in lines if line)
+
+    @staticmethod
+    def _format_fields(label: Optional[str], fields: Dict[str, Any]) -> str:
+        body = ", ".join(f"{key}={value}" for key, value in fields.items())
+        return f"{label}: {body}" if label else body
@@ -0,0 +1,378 @@
+# llm/fake_ollama.py
+"""Substituto determinístico do Ollama para benchmarks e testes de carga sem modelo.
+
+Pode ser usado em processo (FakeOllamaBackend) ou como servidor HTTP que fala
+o protocolo /api/generate e /api/show do Ollama (FakeOllamaServer):
+
+    python -m llm.fake_ollama --port 11435 --latency-mean 0.3 --tokens-per-second 80
+    OLLAMA_HOST=http://127.0.0.1:11435 python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import ollama
+from llm.backends import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+_VOCABULARY = [
+    "o", "ativo", "mostra", "tendência", "de", "alta", "baixa", "com", "volume", "acima",
+    "da", "média", "suporte", "resistência", "risco", "moderado", "momentum", "positivo",
+    "negativo", "fundamentos", "sólidos", "margem", "crescimento", "volatilidade", "setor",
+    "cenário", "macroeconômico", "juros", "liquidez", "preço", "alvo", "confiança", "sinal",
+    "RSI", "MACD", "rompimento", "consolidação", "correção", "recomendação", "posição",
+]
+_RECOMMENDATIONS = ["COMPRAR", "VENDER", "MANTER"]
+
+@dataclass
+class FakeModelProfile:
+    """Perfil de desempenho e falhas do modelo simulado"""
+    latency_distribution: str = "lognormal"  # 'fixed', 'uniform' ou 'lognormal'
+    latency_mean: float = 0.3  # segundos até o primeiro token (prefill)
+    latency_stddev: float = 0.1
+    tokens_per_second: float = 60.0
+    default_num_predict: int = 150
+    failure_rate: float = 0.0
+    seed: int = 42
+
+@dataclass
+class _Plan:
+    """Roteiro pré-calculado de uma geração"""
+    first_token_delay: float
+    tokens: List[str]
+    fail: bool
+    prompt_eval_count: int
+
+class FakeOllamaModel:
+    """Gera respostas, latências e falhas reproduzíveis a partir do conteúdo da requisição.
+
+    Cada requisição é semeada pelo hash de (seed, modelo, system, prompt, options)
+    e pelo número de vezes que ela já foi feita, de modo que o resultado não
+    depende da intercalação entre chamadas concorrentes.
+    """
+
+    def __init__(self, profile: Optional[FakeModelProfile] = None):
+        self.profile = profile or FakeModelProfile()
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def plan(self, model: str, prompt: str, system: str, options: Optional[Dict[str, Any]]) -> _Plan:
+        options = options or {}
+        key = hashlib.sha256(
+            json.dumps([self.profile.seed, model, system, prompt, options], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.requests += 1
+        rng = random.Random(f"{key}:{attempt}")
+        # O texto depende apenas do conteúdo; latência e falhas também da tentativa
+        text_rng = random.Random(key)
+
+        num_predict = int(options.get('num_predict') or self.profile.default_num_predict)
+        words = [text_rng.choice(_VOCABULARY) for _ in range(max(num_predict - 2, 1))]
+        words += ["Recomendação:", text_rng.choice(_RECOMMENDATIONS)]
+        tokens = [words[0]] + [" " + w for w in words[1:num_predict]]
+
+        fail = rng.random() < self.profile.failure_rate
+        if fail:
+            with self._lock:
+                self.failures += 1
+        return _Plan(
+            first_token_delay=self._sample_latency(rng),
+            tokens=tokens,
+            fail=fail,
+            prompt_eval_count=max(1, (len(prompt) + len(system or "")) // 4)
+        )
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        profile = self.profile
+        if profile.latency_distribution == "fixed":
+            return profile.latency_mean
+        if profile.latency_distribution == "uniform":
+            return max(0.0, rng.uniform(profile.latency_mean - profile.latency_stddev,
+                                        profile.latency_mean + profile.latency_stddev))
+        if profile.latency_mean <= 0:
+            return 0.0
+        # Lognormal com média e desvio informados
+        variance = profile.latency_stddev ** 2
+        sigma2 = math.log(1 + variance / profile.latency_mean ** 2)
+        mu = math.log(profile.latency_mean) - sigma2 / 2
+        return rng.lognormvariate(mu, sigma2 ** 0.5)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.profile.tokens_per_second if self.profile.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def chunk(model: str, token: str = "", done: bool = False, plan: Optional[_Plan] = None,
+              elapsed: float = 0.0, eval_time: float = 0.0) -> Dict[str, Any]:
+        """Monta um fragmento no formato de resposta do Ollama"""
+        chunk = {
+            'model': model,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'response': token,
+            'done': done
+        }
+        if done and plan is not None:
+            chunk.update({
+                'done_reason': 'stop',
+                'total_duration': int(elapsed * 1e9),
+                'load_duration': 0,
+                'prompt_eval_count': plan.prompt_eval_count,
+                'prompt_eval_duration': int(plan.first_token_delay * 1e9),
+                'eval_count': len(plan.tokens),
+                'eval_duration': int(eval_time * 1e9)
+            })
+        return chunk
+
+    async def stream(self, model: str, prompt: str, system: str,
+                     options: Optional[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        start = time.perf_counter()
+        plan = self.plan(model, prompt, system, options)
+        await asyncio.sleep(plan.first_token_delay)
+        if plan.fail:
+            raise ollama.ResponseError("falha simulada pelo FakeOllama", 500)
+        eval_start = time.perf_counter()
+        delay = self.token_delay()
+        for token in plan.tokens:
+            if delay:
+                await asyncio.sleep(delay)
+            yield self.chunk(model, token)
+        now = time.perf_counter()
+        yield self.chunk(model, done=True, plan=plan, elapsed=now - start, eval_time=now - eval_start)
+
+    async def generate(self, model: str, prompt: str, system: str,
+                       options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        plan = self.plan(model, prompt, system, options)
+        await asyncio.sleep(plan.first_token_delay)
+        if plan.fail:
+            raise ollama.ResponseError("falha simulada pelo FakeOllama", 500)
+        eval_time = len(plan.tokens) * self.token_delay()
+        await asyncio.sleep(eval_time)
+        response = self.chunk(model, done=True, plan=plan, elapsed=time.perf_counter() - start, eval_time=eval_time)
+        response['response'] = ''.join(plan.tokens)
+        return response
+
+    @staticmethod
+    def show(model: str) -> Dict[str, Any]:
+        return {
+            'modelfile': f'FROM {model}',
+            'parameters': '',
+            'template': '{{ .Prompt }}',
+            'details': {
+                'format': 'fake',
+                'family': 'fake',
+                'parameter_size': '0B',
+                'quantization_level': 'none',
+                'gpu': False
+            },
+            'model_info': {}
+        }
+
+class FakeOllamaBackend(LLMBackend):
+    """Backend em processo que simula o Ollama sem acesso à rede"""
+
+    def __init__(self, profile: Optional[FakeModelProfile] = None):
+        self.model = FakeOllamaModel(profile)
+
+    async def generate(self, model, prompt, system, options):
+        return await self.model.generate(model, prompt, system, options)
+
+    async def stream(self, model, prompt, system, options):
+        async for chunk in self.model.stream(model, prompt, system, options):
+            yield chunk
+
+    def show(self, model):
+        return self.model.show(model)
+
+class FakeOllamaServer:
+    """Servidor HTTP mínimo (asyncio puro) compatível com /api/generate e /api/show do Ollama"""
+
+    def __init__(self, profile: Optional[FakeModelProfile] = None, host: str = "127.0.0.1", port: int = 11435):
+        self.model = FakeOllamaModel(profile)
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._connections = {}
+        self._thread_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Porta 0 escolhe uma porta livre
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"FakeOllama escutando em {self.url}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Encerra conexões keep-alive ociosas e aguarda os handlers terminarem
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections.keys(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self) -> None:
+        """Inicia o servidor em uma thread com event loop próprio (útil quando o cliente faz chamadas síncronas)"""
+        started = threading.Event()
+
+        def run():
+            self._thread_loop = asyncio.new_event_loop()
+            self._thread_loop.run_until_complete(self.start())
+            started.set()
+            self._thread_loop.run_forever()
+            self._thread_loop.run_until_complete(self.stop())
+            self._thread_loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-ollama", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self) -> None:
+        """Para o servidor iniciado por start_in_thread"""
+        if self._thread is not None:
+            self._thread_loop.call_soon_threadsafe(self._thread_loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections[asyncio.current_task()] = writer
+        try:
+            # Conexões keep-alive: atende requisições até o cliente fechar
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                await self._route(method, path, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Erro no FakeOllama: {e}")
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        return method, path.split('?', 1)[0], body
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        payload = json.loads(body) if body else {}
+        if method == 'GET' and path == '/':
+            await self._send(writer, 200, b'Ollama is running', 'text/plain')
+        elif method == 'GET' and path == '/api/version':
+            await self._send_json(writer, 200, {'version': '0.0.0-fake'})
+        elif method == 'POST' and path == '/api/show':
+            await self._send_json(writer, 200, self.model.show(payload.get('model') or payload.get('name', '')))
+        elif method == 'POST' and path == '/api/generate':
+            await self._generate(payload, writer)
+        else:
+            await self._send_json(writer, 404, {'error': f'rota não encontrada: {method} {path}'})
+
+    async def _generate(self, payload: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        args = (payload.get('model', ''), payload.get('prompt', ''), payload.get('system') or '', payload.get('options'))
+        # Como no Ollama, /api/generate usa streaming por padrão
+        if not payload.get('stream', True):
+            try:
+                response = await self.model.generate(*args)
+            except ollama.ResponseError as e:
+                await self._send_json(writer, 500, {'error': e.error})
+                return
+            await self._send_json(writer, 200, response)
+            return
+
+        stream = self.model.stream(*args)
+        try:
+            first = await stream.__anext__()
+        except ollama.ResponseError as e:
+            await self._send_json(writer, 500, {'error': e.error})
+            return
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+            b'Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n'
+        )
+        self._write_chunk(writer, first)
+        async for chunk in stream:
+            self._write_chunk(writer, chunk)
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, chunk: Dict[str, Any]) -> None:
+        data = json.dumps(chunk).encode('utf-8') + b'\n'
+        writer.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+        await self._send(writer, status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str) -> None:
+        reason = {200: 'OK', 404: 'Not Found', 500: 'Internal Server Error'}.get(status, 'OK')
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor Ollama simulado para benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency-distribution', default='lognormal', choices=['fixed', 'uniform', 'lognormal'])
+    parser.add_argument('--latency-mean', type=float, default=0.3)
+    parser.add_argument('--latency-stddev', type=float, default=0.1)
+    parser.add_argument('--tokens-per-second', type=float, default=60.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    profile = FakeModelProfile(
+        latency_distribution=args.latency_distribution,
+        latency_mean=args.latency_mean,
+        latency_stddev=args.latency_stddev,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        seed=args.seed
+    )
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(FakeOllamaServer(profile, args.host, args.port).serve_forever())
+
+if __name__ == "__main__":
+    main()
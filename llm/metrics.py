@@ -0,0 +1,115 @@
+# llm/metrics.py
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from utils.histogram import LatencyHistogram
+
+@dataclass
+class CallStats:
+    """Estatísticas acumuladas de um par (agente, tipo de chamada)"""
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    queue_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    calls: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    coalesced: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_eval_seconds: float = 0.0
+    eval_seconds: float = 0.0
+
+    def merge(self, other: "CallStats") -> "CallStats":
+        self.latency.merge(other.latency)
+        self.queue_wait.merge(other.queue_wait)
+        self.calls += other.calls
+        self.errors += other.errors
+        self.cache_hits += other.cache_hits
+        self.coalesced += other.coalesced
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.prompt_eval_seconds += other.prompt_eval_seconds
+        self.eval_seconds += other.eval_seconds
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'cache_hits': self.cache_hits,
+            'coalesced': self.coalesced,
+            'latency': self.latency.to_dict(),
+            'queue_wait': self.queue_wait.to_dict(),
+            'total_seconds': self.latency.total,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'prompt_tokens_per_second': (self.prompt_tokens / self.prompt_eval_seconds
+                                         if self.prompt_eval_seconds > 0 else 0.0),
+            'tokens_per_second': (self.completion_tokens / self.eval_seconds
+                                  if self.eval_seconds > 0 else 0.0)
+        }
+
+class LLMMetrics:
+    """Instrumentação das chamadas ao LLM por agente e tipo de chamada, com memória limitada"""
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], CallStats] = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, agent: str, call_type: str, latency: float, queue_wait: float,
+                    response: Optional[Any] = None) -> None:
+        """Registra uma geração concluída, extraindo os metadados de avaliação do Ollama"""
+        prompt_tokens = completion_tokens = 0
+        prompt_eval_seconds = eval_seconds = 0.0
+        if response is not None:
+            prompt_tokens = int(response.get('prompt_eval_count') or 0)
+            completion_tokens = int(response.get('eval_count') or 0)
+            # Durações do Ollama vêm em nanossegundos
+            prompt_eval_seconds = (response.get('prompt_eval_duration') or 0) / 1e9
+            eval_seconds = (response.get('eval_duration') or 0) / 1e9
+        with self._lock:
+            stats = self._get(agent, call_type)
+            stats.calls += 1
+            stats.latency.record(latency)
+            stats.queue_wait.record(queue_wait)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.prompt_eval_seconds += prompt_eval_seconds
+            stats.eval_seconds += eval_seconds
+
+    def record_error(self, agent: str, call_type: str) -> None:
+        with self._lock:
+            self._get(agent, call_type).errors += 1
+
+    def record_cache_hit(self, agent: str, call_type: str) -> None:
+        with self._lock:
+            self._get(agent, call_type).cache_hits += 1
+
+    def record_coalesced(self, agent: str, call_type: str) -> None:
+        with self._lock:
+            self._get(agent, call_type).coalesced += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Retorna as estatísticas por (agente, tipo), por agente e totais"""
+        with self._lock:
+            items = [(key, CallStats().merge(stats)) for key, stats in self._stats.items()]
+        by_agent: Dict[str, CallStats] = {}
+        overall = CallStats()
+        for (agent, _), stats in items:
+            by_agent.setdefault(agent, CallStats()).merge(stats)
+            overall.merge(stats)
+        return {
+            'by_call': {f"{agent}/{call_type}": stats.to_dict() for (agent, call_type), stats in items},
+            'by_agent': {agent: stats.to_dict() for agent, stats in by_agent.items()},
+            'overall': overall.to_dict()
+        }
+
+    def _get(self, agent: str, call_type: str) -> CallStats:
+        key = (agent, call_type)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = CallStats()
+        return stats
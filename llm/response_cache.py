@@ -0,0 +1,219 @@
+# llm/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """Cache de respostas do LLM em dois níveis: LRU em memória na frente de um SQLite em disco.
+
+    get_async()/set_async() consultam a memória no próprio loop e levam o
+    acesso ao SQLite para uma thread, sem bloquear o loop de eventos.
+    """
+
+    def __init__(self, ttl: timedelta, memory_size: int = 512,
+                 disk_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self._ttl = ttl.total_seconds()
+        self._memory_size = memory_size
+        self._max_disk_entries = max_disk_entries
+        # chave -> (expira_em, resposta)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # O disco tem lock próprio: uma consulta lenta não segura o LRU em memória
+        self._disk_lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_count = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path:
+            try:
+                # Processos das sessões particionadas abrem o mesmo arquivo: WAL permite
+                # ler durante a escrita de outro processo e o timeout espera pelo lock
+                self._conn = sqlite3.connect(disk_path, timeout=5, check_same_thread=False)
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_responses (
+                        key TEXT PRIMARY KEY,
+                        response TEXT,
+                        created_at REAL,
+                        expires_at REAL,
+                        last_access REAL
+                    )
+                ''')
+                self._conn.commit()
+                self._disk_count = self._conn.execute('SELECT COUNT(*) FROM llm_responses').fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Cache em disco do LLM indisponível ({disk_path}): {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, prompt: str, options: Dict[str, Any]) -> str:
+        """Gera chave de conteúdo a partir da requisição completa"""
+        payload = json.dumps(
+            {'model': model, 'system': system_prompt, 'prompt': prompt, 'options': options},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Obtém resposta do cache (memória primeiro, depois disco)"""
+        response = self._get_memory(key)
+        if response is None:
+            response = self._get_disk(key)
+        return response
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """Como get(), com a consulta ao disco fora do loop de eventos"""
+        response = self._get_memory(key)
+        if response is None:
+            if self._conn is None:
+                return self._get_disk(key)
+            response = await asyncio.to_thread(self._get_disk, key)
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """Armazena resposta nos dois níveis do cache"""
+        now = time.time()
+        self._store_in_memory(key, now + self._ttl, response)
+        self._set_disk(key, response, now)
+
+    async def set_async(self, key: str, response: str) -> None:
+        """Como set(), com a gravação em disco (e o commit) fora do loop de eventos"""
+        now = time.time()
+        self._store_in_memory(key, now + self._ttl, response)
+        if self._conn is not None:
+            await asyncio.to_thread(self._set_disk, key, response, now)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._disk_lock:
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        'SELECT response, expires_at FROM llm_responses WHERE key = ?', (key,)
+                    ).fetchone()
+                    if row is not None:
+                        response, expires_at = row
+                        if expires_at > now:
+                            self._conn.execute(
+                                'UPDATE llm_responses SET last_access = ? WHERE key = ?', (now, key)
+                            )
+                            self._conn.commit()
+                            self._store_in_memory(key, expires_at, response)
+                            with self._lock:
+                                self.disk_hits += 1
+                            return response
+                        self._conn.execute('DELETE FROM llm_responses WHERE key = ?', (key,))
+                        self._conn.commit()
+                        self._disk_count -= 1
+                except sqlite3.Error as e:
+                    # Ex.: banco travado por outro processo; a chamada segue para o LLM
+                    logger.warning(f"Falha ao ler cache do LLM em disco: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _set_disk(self, key: str, response: str, now: float) -> None:
+        expires_at = now + self._ttl
+        with self._disk_lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO llm_responses (key, response, created_at, expires_at, last_access) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, response, now, expires_at, now)
+                )
+                self._conn.commit()
+                # Contagem aproximada (substituições também somam); a poda recalcula o valor exato
+                self._disk_count += 1
+                if self._disk_count > self._max_disk_entries:
+                    self._prune_disk(now)
+            except sqlite3.Error as e:
+                logger.warning(f"Falha ao gravar cache do LLM em disco: {e}")
+
+    def clear(self) -> None:
+        """Limpa os dois níveis do cache"""
+        with self._lock:
+            self._memory.clear()
+        with self._disk_lock:
+            if self._conn is not None:
+                self._conn.execute('DELETE FROM llm_responses')
+                self._conn.commit()
+                self._disk_count = 0
+
+    def close(self) -> None:
+        """Fecha a conexão com o armazenamento em disco"""
+        with self._disk_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna contadores de acerto/erro do cache"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'hits': hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total > 0 else 0.0,
+                'evictions': self.evictions,
+                'memory_size': len(self._memory),
+                'disk_size': self._disk_count
+            }
+
+    def _store_in_memory(self, key: str, expires_at: float, response: str) -> None:
+        """Insere no LRU em memória, removendo o item menos usado se necessário"""
+        with self._lock:
+            self._memory[key] = (expires_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+    def _prune_disk(self, now: float) -> None:
+        """Remove entradas expiradas e, se preciso, as menos acessadas do disco"""
+        self._conn.execute('DELETE FROM llm_responses WHERE expires_at <= ?', (now,))
+        # Mantém uma folga de 10% para não podar a cada inserção
+        target = int(self._max_disk_entries * 0.9)
+        self._conn.execute('''
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM llm_responses ORDER BY last_access ASC
+                LIMIT MAX((SELECT COUNT(*) FROM llm_responses) - ?, 0)
+            )
+        ''', (target,))
+        self._conn.commit()
+        previous = self._disk_count
+        self._disk_count = self._conn.execute('SELECT COUNT(*) FROM llm_responses').fetchone()[0]
+        with self._lock:
+            self.evictions += max(previous - self._disk_count, 0)
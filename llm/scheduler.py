@@ -0,0 +1,111 @@
+# llm/scheduler.py
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List
+from core.enums import LLMPriority
+
+# Ordem de urgência: índice menor é atendido primeiro
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(LLMPriority)}
+
+@dataclass
+class _Waiter:
+    """Requisição aguardando uma vaga no scheduler"""
+    priority: LLMPriority
+    enqueued_at: float
+    seq: int
+    future: asyncio.Future = field(repr=False)
+
+class LLMScheduler:
+    """Scheduler de chamadas ao LLM com classes de prioridade, cotas por classe e envelhecimento.
+
+    A capacidade total limita as chamadas simultâneas ao servidor; cada classe
+    tem uma cota própria para que a conversa da discussão nunca ocupe todas as
+    vagas. A cada aging_interval segundos de espera uma requisição sobe um nível,
+    evitando inanição das classes menos urgentes.
+    """
+
+    def __init__(self, capacity: int, quotas: Dict[LLMPriority, int], aging_interval: float = 5.0):
+        self._capacity = capacity
+        self._quotas = {p: min(quotas.get(p, capacity), capacity) for p in LLMPriority}
+        self._aging_interval = aging_interval
+        self._waiting: List[_Waiter] = []
+        self._running = {p: 0 for p in LLMPriority}
+        self._total_running = 0
+        self._seq = itertools.count()
+        self._dispatched = {p: 0 for p in LLMPriority}
+        self._total_wait = {p: 0.0 for p in LLMPriority}
+        self._max_wait = {p: 0.0 for p in LLMPriority}
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority):
+        """Reserva uma vaga para a prioridade informada; retorna o tempo de espera na fila"""
+        wait_time = await self.acquire(priority)
+        try:
+            yield wait_time
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: LLMPriority) -> float:
+        """Aguarda uma vaga e retorna quantos segundos a requisição ficou na fila"""
+        waiter = _Waiter(priority, time.monotonic(), next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # A vaga foi concedida junto com o cancelamento: devolve
+                self.release(priority)
+            elif waiter in self._waiting:
+                self._waiting.remove(waiter)
+            raise
+        wait_time = time.monotonic() - waiter.enqueued_at
+        self._total_wait[priority] += wait_time
+        self._max_wait[priority] = max(self._max_wait[priority], wait_time)
+        return wait_time
+
+    def release(self, priority: LLMPriority) -> None:
+        """Libera a vaga e despacha as próximas requisições"""
+        self._running[priority] -= 1
+        self._total_running -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Retorna ocupação, fila e tempos de espera por classe"""
+        return {
+            priority.value: {
+                'running': self._running[priority],
+                'waiting': sum(1 for w in self._waiting if w.priority == priority),
+                'quota': self._quotas[priority],
+                'dispatched': self._dispatched[priority],
+                'avg_wait': (self._total_wait[priority] / self._dispatched[priority]
+                             if self._dispatched[priority] else 0.0),
+                'max_wait': self._max_wait[priority]
+            }
+            for priority in LLMPriority
+        }
+
+    def _effective_rank(self, waiter: _Waiter, now: float):
+        """Prioridade efetiva: nível da classe menos os níveis ganhos por espera"""
+        aged_levels = int((now - waiter.enqueued_at) / self._aging_interval) if self._aging_interval > 0 else 0
+        return PRIORITY_RANK[waiter.priority] - aged_levels, waiter.seq
+
+    def _dispatch(self) -> None:
+        """Concede vagas livres às requisições elegíveis de maior prioridade efetiva"""
+        while self._total_running < self._capacity and self._waiting:
+            now = time.monotonic()
+            eligible = [
+                w for w in self._waiting
+                if not w.future.done() and self._running[w.priority] < self._quotas[w.priority]
+            ]
+            if not eligible:
+                break
+            best = min(eligible, key=lambda w: self._effective_rank(w, now))
+            self._waiting.remove(best)
+            self._running[best.priority] += 1
+            self._total_running += 1
+            self._dispatched[best.priority] += 1
+            best.future.set_result(None)
@@ -0,0 +1,22 @@
+# llm/streaming.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Recebe eventos parciais ('agent_token' / 'agent_stream_end') produzidos durante a geração
+TokenSink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_token_sink: ContextVar[Optional[TokenSink]] = ContextVar('llm_token_sink', default=None)
+
+def get_token_sink() -> Optional[TokenSink]:
+    """Retorna o destino de tokens ativo no contexto atual, se houver"""
+    return _token_sink.get()
+
+@contextmanager
+def token_sink(sink: Optional[TokenSink]):
+    """Direciona os tokens das chamadas ao LLM feitas neste contexto para sink"""
+    token = _token_sink.set(sink)
+    try:
+        yield
+    finally:
+        _token_sink.reset(token)
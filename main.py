@@ -1,7 +1,10 @@
 # Entry point for the TradingAgents system
 
 import asyncio
+import sys
+from config.settings import settings
 from services.orchestrator import TradingAgentsSystem
+from utils.tracing import configure_tracing, tracer
 
 def print_session_results(session_results):
     print("=== RESULTADOS DA SESSÃO ===")
@@ -11,6 +14,8 @@ def print_session_results(session_results):
     print(f"Trades aprovados: {session_results['summary']['approved_trades']}")
     print(f"Trades executados: {session_results['summary']['executed_trades']}")
     print(f"Taxa de aprovação: {session_results['summary']['approval_rate']:.2%}")
+    for symbol, steps in session_results['summary'].get('degraded_symbols', {}).items():
+        print(f"⚠️ {symbol} executado em modo degradado: {', '.join(steps)}")
     print()
     for symbol, result in session_results['results'].items():
         if 'error' in result:
@@ -25,14 +30,19 @@ def print_session_results(session_results):
         print(f"  Aprovado: {'✅' if result['approval'] else '❌'}")
         if result['executed_trade']:
             print(f"  Executado: ${result['executed_trade']['executed_price']:.2f}")
+        elif result.get('pending_order'):
+            print(f"  Ordem pendente: {result['pending_order']['order_id']}")
         print()
 
 def print_portfolio_performance(system):
     portfolio_perf = system.get_portfolio_performance()
     print("=== PERFORMANCE DO PORTFÓLIO ===")
     for key, value in portfolio_perf.items():
-        if key != 'recent_trades':
+        if key not in ('recent_trades', 'positions'):
             print(f"{key}: {value}")
+    for position in portfolio_perf.get('positions', []):
+        print(f"  {position['symbol']}: {position['quantity']:g} @ ${position['average_cost']:.2f} "
+              f"(P&L não realizado ${position['unrealized_pnl']:.2f}, realizado ${position['realized_pnl']:.2f})")
     print()
 
 def print_agent_performance(system):
@@ -73,7 +83,34 @@ def print_agent_analyses(session_results):
             resumo = pesquisa.get('research', '').strip().replace('\n', ' ')
             print(f"  [Pesquisa Crítica] {agent}: {resumo}")
 
+def print_llm_metrics(system):
+    metrics = system.llm.get_metrics()
+    overall = metrics['overall']
+    if not overall['calls']:
+        return
+    print("=== MÉTRICAS DO LLM ===")
+    print(f"Tempo médio de resposta do LLM: {overall['latency']['mean']:.2f} segundos "
+          f"(p90 {overall['latency']['p90']:.2f}s, {overall['tokens_per_second']:.1f} tokens/s)")
+    # Agentes ordenados pelo tempo total consumido no LLM
+    by_agent = sorted(metrics['by_agent'].items(), key=lambda item: item[1]['total_seconds'], reverse=True)
+    for agent_name, stats in by_agent:
+        print(f"  {agent_name}: {stats['calls']} chamadas, {stats['total_seconds']:.1f}s total, "
+              f"p50 {stats['latency']['p50']:.2f}s, fila média {stats['queue_wait']['mean']:.2f}s, "
+              f"{stats['completion_tokens']} tokens gerados, {stats['errors']} erros")
+    print()
+
+def print_pipeline_metrics(system):
+    stages = system.get_pipeline_stats()
+    if not any(stats['processed'] for stats in stages.values()):
+        return
+    print("=== ETAPAS DO PIPELINE ===")
+    for name, stats in stages.items():
+        print(f"  {name}: {stats['processed']} execuções, p50 {stats['latency']['p50']:.2f}s, "
+              f"fila média {stats['queue_wait']['mean']:.2f}s, fila máxima {stats['max_queue_depth']}")
+    print()
+
 async def main():
+    configure_tracing(settings.tracing)
     system = TradingAgentsSystem(model_name="llama3.2")
     symbols = ['EURUSD=X', 'GPBUSD=X', 'ADA-USD', 'SOL-USD', 'MATIC-USD']
     print("=== SISTEMA DE TRADING MULTIAGENTE ===")
@@ -82,17 +119,23 @@ async def main():
     print(f"Ollama GPU enabled: {getattr(system.llm, 'gpu_enabled', 'Indisponível')}")
     print()
     try:
-        session_results = await system.run_trading_session(symbols[:2])
+        if "--resume" in sys.argv:
+            # Retoma a última sessão interrompida a partir dos checkpoints
+            session_results = await system.resume_trading_session()
+        else:
+            session_results = await system.run_trading_session(symbols[:2])
         print_session_results(session_results)
         print_portfolio_performance(system)
         print_agent_performance(system)
         print_agent_analyses(session_results)
         print_discussion_messages(session_results)
-        if hasattr(system.llm, 'response_times') and system.llm.response_times:
-            avg_time = sum(system.llm.response_times) / len(system.llm.response_times)
-            print(f"Tempo médio de resposta do LLM: {avg_time:.2f} segundos")
+        print_llm_metrics(system)
+        print_pipeline_metrics(system)
     except Exception as e:
         print(f"Erro: {e}")
+    finally:
+        await system.llm.close()
+        tracer.close()
 
 if __name__ == "__main__":
     print("Iniciando TradingAgents System...")
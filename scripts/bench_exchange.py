@@ -0,0 +1,75 @@
+# scripts/bench_exchange.py
+"""Mede a vazão da bolsa simulada reproduzindo um fluxo denso de ordens e preços.
+
+Uso: python scripts/bench_exchange.py [--orders 200000] [--symbols 20] [--cancel-rate 0.2]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.enums import DecisionType, OrderType
+from services.exchange import SimulatedExchange
+from services.order_book import ExecutionModel
+
+def run(orders: int, symbols: int, cancel_rate: float, ticks_per_order: float, seed: int) -> None:
+    rng = random.Random(seed)
+    exchange = SimulatedExchange(ExecutionModel(slippage_bps=1.0, impact_bps=0.01))
+    names = [f"SYM{i:03d}" for i in range(symbols)]
+    prices = {name: 100.0 for name in names}
+    now = 0.0
+    for name in names:
+        exchange.on_price(name, prices[name], timestamp=now)
+
+    open_ids = []
+    ticks = 0
+    start = time.perf_counter()
+    for _ in range(orders):
+        now += 0.001
+        symbol = rng.choice(names)
+        price = prices[symbol]
+        side = DecisionType.BUY if rng.random() < 0.5 else DecisionType.SELL
+        kind = rng.random()
+        if kind < 0.2:
+            order = exchange.place_order(symbol, side, rng.randint(1, 100), timestamp=now)
+        elif kind < 0.9:
+            offset = rng.uniform(-0.02, 0.02) * price
+            order = exchange.place_order(symbol, side, rng.randint(1, 100), OrderType.LIMIT,
+                                         limit_price=price + offset, timestamp=now)
+        else:
+            offset = rng.uniform(0.005, 0.03) * price
+            stop = price + offset if side is DecisionType.BUY else price - offset
+            order = exchange.place_order(symbol, side, rng.randint(1, 100), OrderType.STOP,
+                                         stop_price=stop, timestamp=now)
+        if order.is_active:
+            open_ids.append(order.order_id)
+        if open_ids and rng.random() < cancel_rate:
+            exchange.cancel_order(open_ids.pop(rng.randrange(len(open_ids))))
+        # Passeio aleatório de preços com volume limitado (gera execuções parciais)
+        while rng.random() < ticks_per_order:
+            tick_symbol = rng.choice(names)
+            prices[tick_symbol] *= 1 + rng.gauss(0, 0.002)
+            exchange.on_price(tick_symbol, prices[tick_symbol], volume=rng.randint(50, 500), timestamp=now)
+            ticks += 1
+    elapsed = time.perf_counter() - start
+
+    open_orders = sum(len(book) for book in exchange.books.values())
+    print(f"Ordens: {orders} em {elapsed:.2f}s ({orders / elapsed:,.0f} ordens/s)")
+    print(f"Ticks de preço: {ticks} ({ticks / elapsed:,.0f} ticks/s)")
+    print(f"Execuções: {len(exchange.executed_trades)} ({len(exchange.executed_trades) / elapsed:,.0f} execuções/s)")
+    print(f"Ordens em aberto no fim: {open_orders}")
+    print(f"Ledger: {exchange.ledger.summary()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--cancel-rate', type=float, default=0.2)
+    parser.add_argument('--ticks-per-order', type=float, default=0.5,
+                        help="probabilidade de cada novo tick de preço após uma ordem (encadeada)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    run(args.orders, args.symbols, args.cancel_rate, args.ticks_per_order, args.seed)
@@ -0,0 +1,165 @@
+# services/checkpoint.py
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+class SessionCheckpointStore:
+    """Checkpoints por (sessão, símbolo, etapa) em SQLite para retomar sessões interrompidas.
+
+    As saídas das etapas são serializadas com pickle; o arquivo é local e só
+    é lido por este processo e pelos processos das sessões particionadas.
+    Os métodos são bloqueantes (podem esperar pelo lock de outro processo):
+    em código assíncrono, chame-os com asyncio.to_thread.
+    Etapas degradadas são registradas sem saída: contam para concluir o
+    símbolo, mas são refeitas se a sessão for retomada.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Processos das sessões particionadas gravam no mesmo arquivo
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS checkpoint_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    symbols TEXT,
+                    options TEXT,
+                    status TEXT,
+                    started_at REAL,
+                    completed_at REAL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS stage_checkpoints (
+                    session_id TEXT,
+                    symbol TEXT,
+                    stage TEXT,
+                    output BLOB,
+                    created_at REAL,
+                    degraded INTEGER DEFAULT 0,
+                    PRIMARY KEY (session_id, symbol, stage)
+                )
+            ''')
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(stage_checkpoints)')}
+            if 'degraded' not in columns:
+                # Arquivo criado antes da coluna existir
+                self._conn.execute('ALTER TABLE stage_checkpoints ADD COLUMN degraded INTEGER DEFAULT 0')
+            self._conn.commit()
+        return self._conn
+
+    def begin_session(self, session_id: str, symbols: List[str], options: Dict[str, Any]) -> None:
+        """Registra a sessão; uma sessão já registrada (retomada ou shard) mantém os dados originais"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR IGNORE INTO checkpoint_sessions (session_id, symbols, options, status, started_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (session_id, json.dumps(symbols), json.dumps(options), 'running', time.time())
+            )
+            conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT symbols, options, status, started_at FROM checkpoint_sessions WHERE session_id = ?',
+                (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        symbols, options, status, started_at = row
+        return {
+            'session_id': session_id,
+            'symbols': json.loads(symbols),
+            'options': json.loads(options),
+            'status': status,
+            'started_at': started_at
+        }
+
+    def incomplete_sessions(self) -> List[str]:
+        """Sessões iniciadas e não concluídas, da mais recente para a mais antiga"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT session_id FROM checkpoint_sessions WHERE status = 'running' ORDER BY started_at DESC"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_symbol(self, session_id: str, symbol: str) -> Dict[str, Any]:
+        """Saídas já gravadas das etapas de um símbolo"""
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT stage, output FROM stage_checkpoints WHERE session_id = ? AND symbol = ? AND degraded = 0',
+                (session_id, symbol)
+            ).fetchall()
+        outputs = {}
+        for stage, blob in rows:
+            try:
+                outputs[stage] = pickle.loads(blob)
+            except Exception as e:
+                logger.warning(f"Checkpoint ilegível de {symbol}/{stage} na sessão {session_id}: {e}")
+        return outputs
+
+    def save(self, session_id: str, symbol: str, stage: str, output: Any, degraded: bool = False) -> None:
+        """Grava a saída da etapa; degraded registra apenas que a etapa rodou em modo degradado"""
+        blob = None
+        if not degraded:
+            try:
+                blob = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                logger.warning(f"Saída da etapa {stage} de {symbol} não serializável: {e}")
+                return
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.execute(
+                    'INSERT OR REPLACE INTO stage_checkpoints (session_id, symbol, stage, output, created_at, degraded) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (session_id, symbol, stage, blob, time.time(), int(degraded))
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Falha ao gravar checkpoint de {symbol}/{stage}: {e}")
+
+    def complete_if_done(self, session_id: str, stages: Sequence[str], keep_checkpoints: bool = False) -> bool:
+        """Marca a sessão como concluída quando todos os símbolos têm todas as etapas gravadas (ou degradadas)"""
+        session = self.get_session(session_id)
+        if session is None:
+            return False
+        if session['status'] == 'completed':
+            # Já concluída por um shard da mesma sessão, que pode ter apagado os checkpoints
+            return True
+        stages = set(stages)
+        with self._lock:
+            conn = self._connection()
+            recorded: Dict[str, set] = {}
+            for symbol, stage in conn.execute(
+                'SELECT symbol, stage FROM stage_checkpoints WHERE session_id = ?', (session_id,)
+            ):
+                recorded.setdefault(symbol, set()).add(stage)
+            done = {symbol for symbol, seen in recorded.items() if stages <= seen}
+            if not set(session['symbols']) <= done:
+                return False
+            conn.execute(
+                "UPDATE checkpoint_sessions SET status = 'completed', completed_at = ? WHERE session_id = ?",
+                (time.time(), session_id)
+            )
+            if not keep_checkpoints:
+                conn.execute('DELETE FROM stage_checkpoints WHERE session_id = ?', (session_id,))
+            conn.commit()
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,31 +1,236 @@
 # services/exchange.py 
+import asyncio
 from datetime import datetime
+import itertools
 import random
 import logging
+import threading
+import time
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Tuple
+from config.settings import settings
+from core.enums import DecisionType, OrderType
 from data.market_data import market_data_provider
+from services.ledger import PositionLedger
+from services.order_book import ExecutionModel, Fill, Order, OrderBook
 
 logger = logging.getLogger(__name__)
 
 class SimulatedExchange:
-    def __init__(self):
-        self.orders = []
+    def __init__(self, execution_model: Optional[ExecutionModel] = None, db=None):
+        # Ordens em aberto por id; as concluídas ficam só em executed_trades
+        self.orders: Dict[str, Order] = {}
         self.executed_trades = []
+        self.ledger = PositionLedger(settings.ledger.initial_cash, recent_trades=settings.ledger.recent_trades)
+        self.execution_model = execution_model or ExecutionModel(
+            settings.exchange.slippage_bps, settings.exchange.impact_bps, settings.exchange.latency
+        )
+        self.books: Dict[str, OrderBook] = {}
+        self._order_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        # Execuções ainda não gravadas no banco (só com db configurado)
+        self.db = db
+        self._unsaved: List[Dict[str, Any]] = []
+        self._batch: List[Tuple[Any, asyncio.Future]] = []
+        self._batch_task: Optional[asyncio.Task] = None
     
     def submit_order(self, decision):
-        order_id = f"ORD_{len(self.orders) + 1:06d}"
+        """Executa uma decisão como ordem a mercado ao preço atual do ativo (bloqueante)"""
         # Busca preço real de mercado no momento da execução
         market_data = market_data_provider.get_market_data(decision.symbol)
         execution_price = market_data.price if market_data else decision.price
-        executed_trade = {
-            'order_id': order_id,
+        return self._execute_decision(decision, execution_price)
+
+    async def submit_orders(self, decisions) -> List[Optional[Dict[str, Any]]]:
+        """Executa um lote de decisões com uma consulta de preços e uma gravação no banco.
+
+        A consulta de preços e o casamento das ordens rodam em uma thread, fora
+        do loop de eventos em que correm as análises dos outros símbolos.
+        """
+        decisions = list(decisions)
+        if not decisions:
+            return []
+        results = await asyncio.to_thread(self._submit_batch, decisions)
+        await self.flush_trades()
+        return results
+
+    async def submit_order_async(self, decision) -> Optional[Dict[str, Any]]:
+        """Envia uma decisão no mesmo lote das enviadas concorrentemente no mesmo ciclo do loop"""
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((decision, future))
+        if self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._run_batch())
+        return await future
+
+    async def _run_batch(self) -> None:
+        # Cede uma vez para que as outras tarefas prontas entrem no lote
+        await asyncio.sleep(0)
+        batch, self._batch = self._batch, []
+        self._batch_task = None
+        # Quem desistiu antes do envio (prazo do símbolo, cancelamento) não gera ordem
+        batch = [(decision, future) for decision, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            results = await self.submit_orders(decision for decision, _ in batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _submit_batch(self, decisions) -> List[Optional[Dict[str, Any]]]:
+        prices = market_data_provider.get_latest_prices(dict.fromkeys(decision.symbol for decision in decisions))
+        with self._lock:
+            return [self._execute_decision(decision, prices.get(decision.symbol, decision.price))
+                    for decision in decisions]
+
+    async def flush_trades(self) -> None:
+        """Grava no banco, em uma única transação, as execuções ainda não persistidas"""
+        if self.db is None or self.db.conn is None:
+            # Sem conexão: as execuções continuam pendentes até a próxima
+            return
+        with self._lock:
+            trades = list(self._unsaved)
+        if not trades:
+            return
+        try:
+            await self.db.save_trades(trades)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar {len(trades)} execuções: {e}")
+            return
+        with self._lock:
+            # Execuções registradas durante a gravação ficam para a próxima
+            del self._unsaved[:len(trades)]
+
+    def _execute_decision(self, decision, execution_price: float) -> Optional[Dict[str, Any]]:
+        if decision.action not in (DecisionType.BUY, DecisionType.SELL):
+            executed_trade = {
+                'order_id': f"ORD_{next(self._order_ids):06d}",
+                'symbol': decision.symbol,
+                'action': decision.action.value,
+                'quantity': decision.quantity,
+                'requested_price': decision.price,
+                'executed_price': execution_price,
+                'timestamp': datetime.now(),
+                'status': 'EXECUTED'
+            }
+            with self._lock:
+                self._record([executed_trade])
+            return executed_trade
+        with self._lock:
+            now = time.time()
+            self.on_price(decision.symbol, execution_price, timestamp=now)
+            order = self.place_order(decision.symbol, decision.action, decision.quantity,
+                                     requested_price=decision.price, timestamp=now)
+        if not order.filled_quantity:
+            # Com latência configurada, a ordem só é executada por um preço posterior
+            logger.info(f"Ordem pendente: {order.order_id} - {decision.action.value} {decision.quantity} {decision.symbol}")
+            return {
+                'order_id': order.order_id,
+                'symbol': decision.symbol,
+                'action': decision.action.value,
+                'quantity': 0,
+                'requested_quantity': decision.quantity,
+                'requested_price': decision.price,
+                'executed_price': None,
+                'timestamp': datetime.now(),
+                'status': 'PENDING'
+            }
+        logger.info(f"Ordem executada: {order.order_id} - {decision.action.value} {order.filled_quantity} {decision.symbol} @ ${order.average_price:.2f}")
+        return {
+            'order_id': order.order_id,
             'symbol': decision.symbol,
             'action': decision.action.value,
-            'quantity': decision.quantity,
+            'quantity': order.filled_quantity,
             'requested_price': decision.price,
-            'executed_price': execution_price,
+            'executed_price': order.average_price,
             'timestamp': datetime.now(),
-            'status': 'EXECUTED'
+            'status': 'EXECUTED' if not order.is_active else 'PARTIAL'
         }
-        self.executed_trades.append(executed_trade)
-        logger.info(f"Ordem executada: {order_id} - {decision.action.value} {decision.quantity} {decision.symbol} @ ${execution_price:.2f}")
-        return executed_trade 
\ No newline at end of file
+
+    def place_order(self, symbol: str, side: DecisionType, quantity: int, order_type: OrderType = OrderType.MARKET,
+                    limit_price: Optional[float] = None, stop_price: Optional[float] = None,
+                    requested_price: Optional[float] = None, timestamp: Optional[float] = None) -> Order:
+        """Envia uma ordem ao livro do símbolo; o que cruzar com o último preço é executado na hora"""
+        order = Order(
+            f"ORD_{next(self._order_ids):06d}", symbol, side, quantity, order_type, limit_price, stop_price,
+            requested_price if requested_price is not None else (limit_price if limit_price is not None else stop_price)
+        )
+        with self._lock:
+            fills = self._book(symbol).submit(order, timestamp if timestamp is not None else time.time())
+            if order.is_active:
+                self.orders[order.order_id] = order
+            self._record_fills(fills)
+        return order
+
+    def cancel_order(self, order_id: str) -> bool:
+        with self._lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return False
+            self.books[order.symbol].cancel(order_id)
+        return True
+
+    def on_price(self, symbol: str, price: float, volume: Optional[float] = None,
+                 timestamp: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Aplica um novo preço ao livro do símbolo e retorna as execuções geradas"""
+        with self._lock:
+            fills = self._book(symbol).tick(price, volume, timestamp if timestamp is not None else time.time())
+            trades = self._record_fills(fills)
+            self.ledger.update_prices({symbol: price})
+        return trades
+
+    async def consume_price_stream(self, stream: AsyncIterable[Tuple[str, float, Optional[float], Optional[float]]]) -> int:
+        """Consome ticks (símbolo, preço, volume, instante) até o fim do fluxo; retorna o número de execuções"""
+        executed = 0
+        async for symbol, price, volume, timestamp in stream:
+            executed += len(self.on_price(symbol, price, volume, timestamp))
+        return executed
+
+    def _book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol, self.execution_model)
+        return book
+
+    def _record_fills(self, fills: List[Fill]) -> List[Dict[str, Any]]:
+        trades = []
+        if not fills:
+            return trades
+        for fill in fills:
+            order = fill.order
+            if not order.is_active:
+                self.orders.pop(order.order_id, None)
+            trade = {
+                'order_id': order.order_id,
+                'symbol': order.symbol,
+                'action': order.side.value,
+                'order_type': order.order_type.value,
+                'quantity': fill.quantity,
+                'requested_price': order.requested_price,
+                'executed_price': fill.price,
+                'timestamp': datetime.fromtimestamp(fill.timestamp),
+                'status': 'EXECUTED' if not order.is_active else 'PARTIAL'
+            }
+            trades.append(trade)
+            logger.debug(f"Execução: {order.order_id} - {trade['action']} {fill.quantity} {order.symbol} @ ${fill.price:.2f}")
+        self._record(trades)
+        return trades
+
+    def _record(self, trades: List[Dict[str, Any]]) -> None:
+        self.executed_trades.extend(trades)
+        self.ledger.apply_fills(trades)
+        if self.db is not None:
+            self._unsaved.extend(trades)
+
+    def import_trades(self, trades: Iterable[Dict[str, Any]]) -> None:
+        """Registra execuções feitas em outro processo (sessões particionadas)"""
+        with self._lock:
+            self._record(list(trades))
+
+    def mark_to_market(self) -> Dict[str, Any]:
+        """Avalia as posições pelos preços já em cache, sem buscar dados de mercado"""
+        return self.ledger.mark_to_market(market_data_provider.get_cached_prices(self.ledger.symbols))
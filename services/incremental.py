@@ -0,0 +1,118 @@
+# services/incremental.py
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from config.settings import settings
+
+# Campos de entrada que cada etapa consome diretamente (além das etapas de que depende)
+STAGE_INPUTS: Dict[str, Tuple[str, ...]] = {
+    'analysts': ('price', 'change_percent', 'volume', 'rsi', 'macd', 'moving_avg_20',
+                 'moving_avg_50', 'bollinger_upper', 'bollinger_lower'),
+    'research': (),
+    'discussion': ('price', 'change_percent', 'volume'),
+    'decision': ('price',),
+    'risk': ('price', 'change_percent', 'volume'),
+    'approval': ()
+}
+
+# Como comparar cada campo: variação relativa (%) ou diferença absoluta, e o limite em IncrementalConfig
+_FIELD_RULES: Dict[str, Tuple[str, str]] = {
+    'price': ('relative', 'price_change_pct'),
+    'moving_avg_20': ('relative', 'price_change_pct'),
+    'moving_avg_50': ('relative', 'price_change_pct'),
+    'bollinger_upper': ('relative', 'price_change_pct'),
+    'bollinger_lower': ('relative', 'price_change_pct'),
+    'volume': ('relative', 'volume_change_pct'),
+    'change_percent': ('absolute', 'change_percent_delta'),
+    'rsi': ('absolute', 'rsi_delta'),
+    'macd': ('absolute', 'macd_delta')
+}
+
+def fingerprint(market_data, technical_data) -> Dict[str, float]:
+    """Extrai os campos numéricos que determinam o resultado das etapas"""
+    values = {}
+    for source in (market_data, technical_data):
+        if source is None:
+            continue
+        for key, value in asdict(source).items():
+            if key in _FIELD_RULES and value is not None:
+                values[key] = float(value)
+    return values
+
+def within_tolerance(old: Dict[str, float], new: Dict[str, float], fields: Iterable[str]) -> bool:
+    """Indica se os campos não mudaram além dos limites configurados"""
+    config = settings.incremental
+    for field in fields:
+        if field not in old or field not in new:
+            return False
+        kind, limit_name = _FIELD_RULES[field]
+        limit = getattr(config, limit_name)
+        delta = abs(new[field] - old[field])
+        if kind == 'relative':
+            if old[field] == 0:
+                if delta != 0:
+                    return False
+            elif delta / abs(old[field]) * 100 > limit:
+                return False
+        elif delta > limit:
+            return False
+    return True
+
+class IncrementalAnalysisMemo:
+    """Saídas de etapas por símbolo, guardadas com o fingerprint das entradas que as produziram.
+
+    Uma etapa é reaproveitada quando todas as etapas de que depende também
+    foram reaproveitadas e os seus campos de entrada continuam dentro da
+    tolerância em relação ao fingerprint salvo com ela. Comparar sempre com o
+    fingerprint original evita que pequenas variações se acumulem.
+    """
+
+    def __init__(self, max_symbols: int = 500):
+        self.max_symbols = max_symbols
+        # símbolo -> etapa -> (fingerprint, saída, instante)
+        self._entries: "OrderedDict[str, Dict[str, Tuple[Dict[str, float], Any, float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, symbol: str, stage: str, current: Dict[str, float],
+               upstream_reused: bool) -> Tuple[bool, Any]:
+        """Retorna (True, saída) quando a saída anterior da etapa ainda vale para as entradas atuais"""
+        entry = self._entries.get(symbol, {}).get(stage)
+        if entry is None or not upstream_reused:
+            self.misses += 1
+            return False, None
+        saved, output, stored_at = entry
+        if (time.monotonic() - stored_at > settings.incremental.max_age.total_seconds()
+                or not within_tolerance(saved, current, STAGE_INPUTS.get(stage, ()))):
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._entries.move_to_end(symbol)
+        return True, output
+
+    def store(self, symbol: str, stage: str, current: Dict[str, float], output: Any) -> None:
+        self._entries.setdefault(symbol, {})[stage] = (current, output, time.monotonic())
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_symbols:
+            self._entries.popitem(last=False)
+
+    def discard(self, symbol: str, stage: str) -> None:
+        """Descarta a saída guardada de uma etapa do símbolo"""
+        self._entries.get(symbol, {}).pop(stage, None)
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        """Descarta as saídas de um símbolo (ou de todos)"""
+        if symbol is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(symbol, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'symbols': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
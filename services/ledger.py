@@ -0,0 +1,173 @@
+# services/ledger.py
+import threading
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional
+import numpy as np
+
+class PositionLedger:
+    """Posições, caixa e P&L atualizados incrementalmente a cada execução.
+
+    Cada símbolo ocupa uma linha de arrays numpy (quantidade com sinal, custo
+    médio, P&L realizado e último preço), então uma execução custa O(1) e a
+    marcação a mercado de todas as posições é uma única operação vetorizada.
+    Posições vendidas (quantidade negativa) seguem as mesmas regras das compradas.
+    """
+
+    def __init__(self, initial_cash: float = 100000.0, capacity: int = 64, recent_trades: int = 5):
+        self.initial_cash = initial_cash
+        self.cash = initial_cash
+        self._lock = threading.RLock()
+        self._index: Dict[str, int] = {}
+        self._symbols: List[str] = []
+        self._quantity = np.zeros(capacity, dtype=np.float64)
+        self._avg_cost = np.zeros(capacity, dtype=np.float64)
+        self._realized = np.zeros(capacity, dtype=np.float64)
+        self._last_price = np.zeros(capacity, dtype=np.float64)
+        # Totais mantidos a cada execução
+        self.total_trades = 0
+        self.buy_trades = 0
+        self.sell_trades = 0
+        self.total_volume = 0.0
+        self.realized_pnl = 0.0
+        self.net_exposure = 0.0
+        self.gross_exposure = 0.0
+        self.open_positions = 0
+        self.recent_trades: deque = deque(maxlen=recent_trades)
+
+    def _row(self, symbol: str) -> int:
+        i = self._index.get(symbol)
+        if i is not None:
+            return i
+        i = len(self._symbols)
+        if i == len(self._quantity):
+            size = 2 * len(self._quantity)
+            for name in ('_quantity', '_avg_cost', '_realized', '_last_price'):
+                grown = np.zeros(size, dtype=np.float64)
+                grown[:i] = getattr(self, name)
+                setattr(self, name, grown)
+        self._index[symbol] = i
+        self._symbols.append(symbol)
+        return i
+
+    def _set_price(self, i: int, price: float) -> None:
+        """Troca o último preço da linha ajustando as exposições agregadas"""
+        old = float(self._quantity[i] * self._last_price[i])
+        new = float(self._quantity[i] * price)
+        self.net_exposure += new - old
+        self.gross_exposure += abs(new) - abs(old)
+        self._last_price[i] = price
+
+    def apply_fill(self, trade: Dict[str, Any]) -> None:
+        """Aplica uma execução ('action' buy/sell, 'quantity', 'executed_price')"""
+        action = trade['action']
+        quantity = float(trade['quantity'] or 0)
+        price = float(trade['executed_price'])
+        with self._lock:
+            self.total_trades += 1
+            self.total_volume += price * quantity
+            self.recent_trades.append(trade)
+            if action not in ('buy', 'sell') or quantity <= 0:
+                return
+            if action == 'buy':
+                self.buy_trades += 1
+                delta = quantity
+            else:
+                self.sell_trades += 1
+                delta = -quantity
+
+            i = self._row(trade['symbol'])
+            # Remove a contribuição antiga da linha antes de mudar a quantidade
+            self._set_price(i, 0.0)
+            position = self._quantity[i]
+            if position == 0 or np.sign(position) == np.sign(delta):
+                # Aumenta a posição: custo médio ponderado
+                self._avg_cost[i] = (abs(position) * self._avg_cost[i] + quantity * price) / (abs(position) + quantity)
+            else:
+                # Reduz, zera ou inverte a posição: realiza P&L sobre a parte fechada
+                closed = min(quantity, abs(position))
+                pnl = float(closed * (price - self._avg_cost[i]) * np.sign(position))
+                self._realized[i] += pnl
+                self.realized_pnl += pnl
+                remaining = position + delta
+                if remaining == 0:
+                    self._avg_cost[i] = 0.0
+                elif np.sign(remaining) != np.sign(position):
+                    self._avg_cost[i] = price
+            self._quantity[i] = position + delta
+            self.open_positions += int(self._quantity[i] != 0) - int(position != 0)
+            self.cash -= delta * price
+            self._set_price(i, price)
+
+    def apply_fills(self, trades: List[Dict[str, Any]]) -> None:
+        """Aplica um lote de execuções adquirindo o lock uma só vez"""
+        with self._lock:
+            for trade in trades:
+                self.apply_fill(trade)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def update_prices(self, prices: Mapping[str, float]) -> None:
+        """Atualiza os últimos preços conhecidos (símbolos sem posição são ignorados)"""
+        with self._lock:
+            for symbol, price in prices.items():
+                i = self._index.get(symbol)
+                if i is not None and price is not None:
+                    self._set_price(i, float(price))
+
+    def mark_to_market(self, prices: Optional[Mapping[str, float]] = None) -> Dict[str, Any]:
+        """Avalia todas as posições pelos últimos preços (opcionalmente atualizados antes)"""
+        with self._lock:
+            n = len(self._symbols)
+            if prices:
+                rows = [(self._index[s], p) for s, p in prices.items() if s in self._index and p is not None]
+                if rows:
+                    idx, values = zip(*rows)
+                    self._last_price[list(idx)] = values
+            quantity = self._quantity[:n]
+            market_value = quantity * self._last_price[:n]
+            unrealized = quantity * (self._last_price[:n] - self._avg_cost[:n])
+            # Recalcula os agregados a partir dos arrays, descartando erro acumulado
+            self.net_exposure = float(market_value.sum())
+            self.gross_exposure = float(np.abs(market_value).sum())
+            unrealized_pnl = float(unrealized.sum())
+            return {
+                'cash': self.cash,
+                'market_value': self.net_exposure,
+                'equity': self.cash + self.net_exposure,
+                'net_exposure': self.net_exposure,
+                'gross_exposure': self.gross_exposure,
+                'realized_pnl': self.realized_pnl,
+                'unrealized_pnl': unrealized_pnl,
+                'total_pnl': self.realized_pnl + unrealized_pnl,
+                'positions': [
+                    {
+                        'symbol': symbol,
+                        'quantity': float(quantity[i]),
+                        'average_cost': float(self._avg_cost[i]),
+                        'last_price': float(self._last_price[i]),
+                        'market_value': float(market_value[i]),
+                        'unrealized_pnl': float(unrealized[i]),
+                        'realized_pnl': float(self._realized[i])
+                    }
+                    for i, symbol in enumerate(self._symbols)
+                    if quantity[i] != 0 or self._realized[i] != 0
+                ]
+            }
+
+    def summary(self) -> Dict[str, Any]:
+        """Contadores de execuções e exposição pelos últimos preços, sem percorrer as posições"""
+        with self._lock:
+            return {
+                'total_trades': self.total_trades,
+                'buy_trades': self.buy_trades,
+                'sell_trades': self.sell_trades,
+                'total_volume': self.total_volume,
+                'average_trade_size': self.total_volume / self.total_trades if self.total_trades else 0,
+                'cash': self.cash,
+                'net_exposure': self.net_exposure,
+                'gross_exposure': self.gross_exposure,
+                'realized_pnl': self.realized_pnl,
+                'open_positions': self.open_positions
+            }
@@ -40,8 +40,10 @@ class RealTimeMonitor:
     async def _quick_analysis(self, symbols):
         for symbol in symbols:
             try:
-                market_data = self.system.market_data_provider.get_market_data(symbol)
-                technical_data = self.system.market_data_provider.get_technical_indicators(symbol)
+                market_data, technical_data = await asyncio.gather(
+                    self.system.market_data_provider.get_market_data_async(symbol),
+                    self.system.market_data_provider.get_technical_indicators_async(symbol)
+                )
                 if abs(market_data.change_percent) > 2:
                     logger.info(f"🚨 {symbol}: {market_data.change_percent:+.2f}% - Preço: ${market_data.price:.2f}")
                 if technical_data.rsi < 25 or technical_data.rsi > 75:
@@ -1,12 +1,22 @@
 # services/orchestrator.py 
+import copy
+import multiprocessing
 import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from core.enums import DecisionType
-from core.data_models import TradingDecision
+from core.exceptions import DeadlineExceeded
 from data.llm_interface import LLMInterface
 from data.database import AsyncDatabaseManager
 from data.market_data import market_data_provider
+from llm.context_builder import ContextBuilder
+from llm.streaming import token_sink
+from config.settings import settings
 from services.exchange import SimulatedExchange
+from services.checkpoint import SessionCheckpointStore
+from services.incremental import STAGE_INPUTS, IncrementalAnalysisMemo, fingerprint
+from services.pipeline import Stage, StagePipeline
+from services.sharding import merge_agent_performance, partition_symbols, run_shard
 from agents.analysts import FundamentalAnalyst, SentimentAnalyst, NewsAnalyst, TechnicalAnalyst
 from agents.researchers import Researcher
 from agents.trading_agent import TradingAgent
@@ -15,16 +25,18 @@ from agents.portfolio_manager import PortfolioManager
 import asyncio
 from dataclasses import asdict
 import logging
-from utils.helpers import batcher
+from utils.deadline import budget_below, deadline
+from utils.tracing import traced, tracer
+from utils.work_queue import WorkQueueRunner
 
 logger = logging.getLogger(__name__)
 
 class TradingAgentsSystem:
-    def __init__(self, model_name: str = "llama3.2"):
-        self.llm = LLMInterface(model_name)
+    def __init__(self, model_name: str = "llama3.2", llm_backend=None):
+        self.llm = LLMInterface(model_name, llm_backend)
         self.db = AsyncDatabaseManager()
         self.market_data_provider = market_data_provider
-        self.exchange = SimulatedExchange()
+        self.exchange = SimulatedExchange(db=self.db)
         self.fundamental_analyst = FundamentalAnalyst(self.llm, self.db)
         self.sentiment_analyst = SentimentAnalyst(self.llm, self.db)
         self.news_analyst = NewsAnalyst(self.llm, self.db)
@@ -39,52 +51,309 @@ class TradingAgentsSystem:
             self.technical_analyst, self.bullish_researcher, self.bearish_researcher,
             self.trading_agent, self.risk_manager, self.portfolio_manager
         ]
+        self._event_listeners = []
+        self.pipeline = self._build_pipeline()
+        self._shard_agent_performance = {}
+        self.analysis_memo = IncrementalAnalysisMemo(settings.incremental.max_symbols)
+        self.checkpoints = SessionCheckpointStore(settings.checkpoint.path) if settings.checkpoint.enabled else None
+        self._analysis_flush_lock = asyncio.Lock()
+
+    def add_event_listener(self, listener):
+        """Registra uma corrotina que recebe eventos em tempo real (tokens e mensagens dos agentes)"""
+        self._event_listeners.append(listener)
+
+    def remove_event_listener(self, listener):
+        if listener in self._event_listeners:
+            self._event_listeners.remove(listener)
+
+    async def _emit(self, event):
+        for listener in list(self._event_listeners):
+            try:
+                await listener(event)
+            except Exception as e:
+                logger.error(f"Erro ao publicar evento {event.get('type')}: {e}")
 
     async def connect_db(self):
         await self.db.connect()
+        # Análises e execuções feitas sem conexão (ex.: /api/analyze) são gravadas agora
+        await self.flush_analyses()
+        await self.exchange.flush_trades()
 
     async def close_db(self):
+        await self.flush_analyses()
+        await self.exchange.flush_trades()
         await self.db.close()
 
-    async def conduct_team_discussion(self, session_id: str, topic: str, context: str, rounds: int = 2):
+    async def flush_analyses(self):
+        """Grava no banco, em uma única transação, as análises pendentes de todos os agentes"""
+        async with self._analysis_flush_lock:
+            if self.db.conn is None:
+                # Sem conexão: as análises continuam pendentes até a próxima
+                return
+            pending = [(agent, list(agent.unsaved_analyses)) for agent in self.all_agents]
+            rows = [(agent.name, symbol, result) for agent, analyses in pending for symbol, result in analyses]
+            if not rows:
+                return
+            try:
+                await self.db.save_agent_analyses(rows)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar {len(rows)} análises: {e}")
+                return
+            for agent, analyses in pending:
+                # Análises registradas durante a gravação ficam para a próxima
+                del agent.unsaved_analyses[:len(analyses)]
+
+    async def conduct_team_discussion(self, session_id: str, topic: str, context: str, rounds: int = None,
+                                      symbol: str = None, mode: str = None, fan_out: int = None):
+        rounds = rounds if rounds is not None else settings.discussion.rounds
+        mode = mode or settings.discussion.mode
+        if mode == "parallel":
+            return await self._conduct_parallel_discussion(
+                session_id, topic, context, rounds, symbol, fan_out or settings.discussion.fan_out
+            )
         discussion_messages = []
         for round_num in range(rounds):
             logger.info(f"Rodada de discussão {round_num + 1}/{rounds}")
             round_messages = []
             for agent in self.all_agents:
-                discussion_context = context
-                if discussion_messages:
-                    discussion_context += "\n\nDiscussão anterior:\n"
-                    discussion_context += "\n".join(discussion_messages[-5:])
-                message = await agent.participate_in_discussion(session_id, topic, discussion_context)
+                discussion_context = self._build_discussion_context(context, discussion_messages[-5:])
+                with tracer.span("discussion.turn", symbol=symbol, agent=agent.name, round=round_num + 1):
+                    message = await agent.participate_in_discussion(session_id, topic, discussion_context)
                 formatted_message = f"{agent.name}: {message}"
                 round_messages.append(formatted_message)
                 discussion_messages.append(formatted_message)
+                await self._emit_agent_message(session_id, symbol, agent.name, message, len(discussion_messages) - 1)
                 await asyncio.sleep(0.1)
             logger.info(f"Rodada {round_num + 1} concluída com {len(round_messages)} contribuições")
         return discussion_messages
 
-    async def analyze_symbol(self, symbol: str):
+    async def _conduct_parallel_discussion(self, session_id: str, topic: str, context: str,
+                                           rounds: int, symbol: str, fan_out: int):
+        """Cada rodada gera todas as contribuições ao mesmo tempo a partir da transcrição da rodada anterior"""
+        discussion_messages = []
+        previous_round = []
+        semaphore = asyncio.Semaphore(max(1, fan_out))
+
+        async def reply(agent, discussion_context, round_num):
+            async with semaphore:
+                with tracer.span("discussion.turn", symbol=symbol, agent=agent.name, round=round_num + 1):
+                    return await agent.discussion_reply(topic, discussion_context)
+
+        for round_num in range(rounds):
+            logger.info(f"Rodada de discussão {round_num + 1}/{rounds} (paralela, fan-out {fan_out})")
+            discussion_context = self._build_discussion_context(context, previous_round)
+            replies = await asyncio.gather(*[
+                reply(agent, discussion_context, round_num) for agent in self.all_agents
+            ])
+            # Persiste e publica na ordem fixa dos agentes, não na ordem de conclusão
+            round_messages = []
+            for agent, message in zip(self.all_agents, replies):
+                await self.db.save_discussion(session_id, agent.name, message)
+                formatted_message = f"{agent.name}: {message}"
+                round_messages.append(formatted_message)
+                discussion_messages.append(formatted_message)
+                await self._emit_agent_message(session_id, symbol, agent.name, message, len(discussion_messages) - 1)
+            previous_round = round_messages
+            logger.info(f"Rodada {round_num + 1} concluída com {len(round_messages)} contribuições")
+        return discussion_messages
+
+    async def _emit_agent_message(self, session_id: str, symbol: str, agent_name: str, message: str, index: int):
+        if self._event_listeners:
+            await self._emit({
+                'type': 'agent_message',
+                'session_id': session_id,
+                'symbol': symbol,
+                'agent_name': agent_name,
+                'message': message,
+                'message_index': index,
+                'timestamp': datetime.now().isoformat()
+            })
+
+    @staticmethod
+    def _build_discussion_context(context: str, previous_messages):
+        """Contexto da discussão limitado ao orçamento de tokens: o resumo fixo primeiro, depois as mensagens anteriores"""
+        if not previous_messages:
+            return context
+        builder = ContextBuilder(settings.llm.discussion_context_tokens)
+        builder.add_line(context.strip())
+        builder.add_line("Discussão anterior:")
+        for message in previous_messages:
+            builder.add_text(None, message)
+        return builder.build()
+
+    async def analyze_symbol(self, symbol: str, session_id: str = None):
+        if not self._event_listeners:
+            return await self._analyze_symbol(symbol, session_id)
+
+        # Repassa os tokens de cada agente aos ouvintes enquanto são gerados
+        async def forward_tokens(event):
+            await self._emit({**event, 'symbol': symbol, 'timestamp': datetime.now().isoformat()})
+
+        with token_sink(forward_tokens):
+            return await self._analyze_symbol(symbol, session_id)
+
+    def _build_pipeline(self) -> StagePipeline:
+        """Grafo de etapas da análise de um símbolo; a decisão não espera a discussão"""
+        workers = settings.pipeline.stage_workers
+
+        def stage(name, func, *depends_on):
+            if name in STAGE_INPUTS:
+                func = self._reusable(name, func, depends_on)
+            return Stage(name, self._checkpointed(name, func, depends_on), depends_on, workers.get(name, 1))
+
+        return StagePipeline([
+            stage('fetch', self._stage_fetch),
+            stage('analysts', self._stage_analysts, 'fetch'),
+            stage('research', self._stage_research, 'analysts'),
+            stage('discussion', self._stage_discussion, 'fetch', 'analysts', 'research'),
+            stage('decision', self._stage_decision, 'fetch', 'analysts', 'research'),
+            stage('risk', self._stage_risk, 'fetch', 'decision'),
+            stage('approval', self._stage_approval, 'decision', 'risk'),
+            stage('execution', self._stage_execution, 'decision', 'approval')
+        ])
+
+    def _reusable(self, name: str, func, depends_on):
+        """Reaproveita a saída anterior da etapa quando as suas entradas quase não mudaram"""
+        upstream = [dep for dep in depends_on if dep != 'fetch']
+
+        async def run(state):
+            if not settings.incremental.enabled:
+                return await func(state)
+            symbol = state['symbol']
+            current = fingerprint(state['fetch']['market_data'], state['fetch']['technical_data'])
+            upstream_reused = all(dep in state['reused'] for dep in upstream)
+            reused, output = self.analysis_memo.lookup(symbol, name, current, upstream_reused)
+            if reused:
+                state['reused'].append(name)
+                tracer.current_span().set_attribute('reused', True)
+                return output
+            output = await func(state)
+            # Saídas degradadas (ou calculadas a partir de etapas degradadas) não devem ser
+            # reaproveitadas quando houver tempo; a saída antiga também deixa de valer
+            if self._tainted(state, name, depends_on):
+                self.analysis_memo.discard(symbol, name)
+            else:
+                self.analysis_memo.store(symbol, name, current, output)
+            return output
+
+        return run
+
+    @staticmethod
+    def _tainted(state, name: str, depends_on) -> bool:
+        """Indica (e registra) se a etapa foi degradada ou consumiu a saída de uma etapa degradada"""
+        tainted = state.setdefault('tainted', [])
+        if name in tainted:
+            return True
+        if name in state['degraded'] or any(dep in tainted for dep in depends_on):
+            tainted.append(name)
+            return True
+        return False
+
+    def _checkpointed(self, name: str, func, depends_on=()):
+        """Restaura a saída da etapa do checkpoint da sessão ou grava a saída recém-calculada"""
+        async def run(state):
+            session_id = state.get('checkpoint_session')
+            if session_id is None:
+                return await func(state)
+            if name in state['restored_outputs']:
+                state['restored'].append(name)
+                tracer.current_span().set_attribute('restored', True)
+                return state['restored_outputs'][name]
+            output = await func(state)
+            # Etapas degradadas (ou que usaram uma degradada) ficam registradas sem saída:
+            # contam para concluir o símbolo e são refeitas na retomada, com um orçamento novo
+            # O SQLite pode esperar pelo lock dos outros processos: grava fora do loop
+            if self._tainted(state, name, depends_on):
+                await asyncio.to_thread(self.checkpoints.save, session_id, state['symbol'], name, None, True)
+            else:
+                await asyncio.to_thread(self.checkpoints.save, session_id, state['symbol'], name, output)
+            return output
+
+        return run
+
+    def get_pipeline_stats(self):
+        return self.pipeline.stats()
+
+    def get_incremental_stats(self):
+        return self.analysis_memo.stats()
+
+    async def _analyze_symbol(self, symbol: str, session_id: str = None):
         logger.info(f"Iniciando análise completa de {symbol}")
-        market_data = self.market_data_provider.get_market_data(symbol)
-        technical_data = self.market_data_provider.get_technical_indicators(symbol)
+        state = {'symbol': symbol, 'degraded': [], 'reused': [], 'restored': []}
+        if session_id is not None and self.checkpoints is not None:
+            state['checkpoint_session'] = session_id
+            state['restored_outputs'] = await asyncio.to_thread(self.checkpoints.load_symbol, session_id, symbol)
+        with tracer.span("analyze_symbol", symbol=symbol):
+            if self.pipeline.running:
+                state = await self.pipeline.submit(state)
+            else:
+                state = await self.pipeline.run_inline(state)
+        return self._build_result(state)
+
+    async def _stage_fetch(self, state):
+        symbol = state['symbol']
+        # O provedor faz o I/O no próprio executor, sem travar as demais etapas
+        market_data, technical_data = await asyncio.gather(
+            self.market_data_provider.get_market_data_async(symbol),
+            self.market_data_provider.get_technical_indicators_async(symbol)
+        )
+        return {'market_data': market_data, 'technical_data': technical_data}
+
+    async def _stage_analysts(self, state):
         data_package = {
-            'market_data': market_data,
-            'technical_data': technical_data,
+            'market_data': state['fetch']['market_data'],
+            'technical_data': state['fetch']['technical_data'],
             'news_data': [],
             'sentiment_data': None
         }
-        analyses = await asyncio.gather(
-            self.fundamental_analyst.analyze(data_package),
-            self.sentiment_analyst.analyze(data_package),
-            self.news_analyst.analyze(data_package),
-            self.technical_analyst.analyze(data_package)
-        )
-        analyses = [a for a in analyses if a]
-        research_results = await asyncio.gather(
-            self.bullish_researcher.research_analysis(analyses),
-            self.bearish_researcher.research_analysis(analyses)
-        )
+        analysts = [self.fundamental_analyst, self.sentiment_analyst, self.news_analyst, self.technical_analyst]
+        analyses = await asyncio.gather(*[
+            traced(analyst.analyze(data_package), "agent.analyze", symbol=state['symbol'], agent=analyst.name)
+            for analyst in analysts
+        ])
+        if sum(len(agent.unsaved_analyses) for agent in self.all_agents) >= settings.analysis_flush_size:
+            await self.flush_analyses()
+        return [a for a in analyses if a]
+
+    def _degrade(self, state, step: str, reason: str):
+        """Registra uma etapa executada em modo degradado por falta de tempo"""
+        state['degraded'].append(step)
+        logger.warning(f"{state['symbol']}: etapa {step} degradada ({reason})")
+
+    async def _llm_or_rules(self, state, step: str, call):
+        """Executa call(use_llm=True) ou, sem tempo para o LLM, o caminho baseado em regras"""
+        if budget_below(settings.session.llm_decision_min_budget):
+            self._degrade(state, step, "tempo insuficiente para o LLM")
+        else:
+            try:
+                return await call(True)
+            except DeadlineExceeded:
+                self._degrade(state, step, "prazo esgotado durante o LLM")
+        return await call(False)
+
+    async def _stage_research(self, state):
+        if budget_below(settings.session.research_min_budget):
+            self._degrade(state, 'research', "tempo insuficiente")
+            return []
+        analyses = state['analysts']
+        try:
+            return list(await asyncio.gather(*[
+                traced(researcher.research_analysis(analyses), "agent.research",
+                       symbol=state['symbol'], agent=researcher.name)
+                for researcher in (self.bullish_researcher, self.bearish_researcher)
+            ]))
+        except DeadlineExceeded:
+            self._degrade(state, 'research', "prazo esgotado")
+            return []
+
+    async def _stage_discussion(self, state):
+        if budget_below(settings.session.discussion_min_budget):
+            self._degrade(state, 'discussion', "tempo insuficiente")
+            return []
+        symbol = state['symbol']
+        market_data = state['fetch']['market_data']
+        analyses = state['analysts']
+        research_results = state['research']
         session_id = f"session_{symbol}_{int(time.time())}"
         discussion_context = f"""
         Análise de {symbol}:
@@ -93,66 +362,211 @@ class TradingAgentsSystem:
         Volume: {market_data.volume:,}
         Análises dos especialistas:
         {chr(10).join([f"- {a['agent']}: {a.get('recommendation', 'N/A')}" for a in analyses])}
-        Pesquisa:
+        """
+        if research_results:
+            discussion_context += f"""Pesquisa:
         - Otimista: {research_results[0].get('recommendation', 'N/A')}
         - Pessimista: {research_results[1].get('recommendation', 'N/A')}
         """
-        discussion_messages = await self.conduct_team_discussion(
-            session_id, f"Estratégia de trading para {symbol}", discussion_context
-        )
-        all_analyses = analyses + research_results
-        trading_decision = await self.trading_agent.make_trading_decision(
-            symbol, all_analyses, market_data
-        )
-        risk_assessment = await self.risk_manager.assess_risk(
-            symbol, trading_decision, market_data
-        )
-        approval, approval_reasoning = await self.portfolio_manager.approve_trade(
-            trading_decision, risk_assessment
-        )
-        executed_trade = None
-        if approval:
-            executed_trade = self.exchange.submit_order(trading_decision)
+        try:
+            return await self.conduct_team_discussion(
+                session_id, f"Estratégia de trading para {symbol}", discussion_context, symbol=symbol
+            )
+        except DeadlineExceeded:
+            self._degrade(state, 'discussion', "prazo esgotado")
+            return []
+
+    async def _stage_decision(self, state):
+        return await self._llm_or_rules(state, 'decision', lambda use_llm: self.trading_agent.make_trading_decision(
+            state['symbol'], state['analysts'] + state['research'], state['fetch']['market_data'], use_llm=use_llm
+        ))
+
+    async def _stage_risk(self, state):
+        return await self._llm_or_rules(state, 'risk', lambda use_llm: self.risk_manager.assess_risk(
+            state['symbol'], state['decision'], state['fetch']['market_data'], use_llm=use_llm
+        ))
+
+    async def _stage_approval(self, state):
+        return await self._llm_or_rules(state, 'approval', lambda use_llm: self.portfolio_manager.approve_trade(
+            state['decision'], state['risk'], use_llm=use_llm
+        ))
+
+    async def _stage_execution(self, state):
+        approval, _ = state['approval']
+        # Uma aprovação reaproveitada já foi executada na análise que a produziu
+        if not approval or 'approval' in state['reused']:
+            return None
+        # Execuções de símbolos concorrentes entram no mesmo lote, fora do loop de eventos
+        return await self.exchange.submit_order_async(state['decision'])
+
+    def _build_result(self, state):
+        approval, approval_reasoning = state['approval']
+        execution = state['execution']
+        # Ordem ainda a caminho do livro (latência): não é uma execução
+        pending = execution is not None and execution['status'] == 'PENDING'
         return {
-            'symbol': symbol,
-            'market_data': asdict(market_data),
-            'technical_data': asdict(technical_data),
-            'analyses': analyses,
-            'research': research_results,
-            'discussion_messages': discussion_messages,
-            'trading_decision': asdict(trading_decision),
-            'risk_assessment': asdict(risk_assessment),
+            'symbol': state['symbol'],
+            'market_data': asdict(state['fetch']['market_data']),
+            'technical_data': asdict(state['fetch']['technical_data']),
+            'analyses': state['analysts'],
+            'research': state['research'],
+            'discussion_messages': state['discussion'],
+            'trading_decision': asdict(state['decision']),
+            'risk_assessment': asdict(state['risk']),
             'approval': approval,
             'approval_reasoning': approval_reasoning,
-            'executed_trade': executed_trade,
+            'executed_trade': None if pending else execution,
+            'pending_order': execution if pending else None,
+            'degraded': state.get('degraded', []),
+            'reused_stages': state.get('reused', []),
+            'restored_stages': state.get('restored', []),
             'timestamp': datetime.now()
         }
 
-    async def run_trading_session(self, symbols: list, session_duration: int = 3600, max_parallel: int = 4, batch_size: int = 4):
+    async def iter_symbol_results(self, symbols: list, concurrency: int = None, symbol_timeout: float = None,
+                                  pipelined: bool = None, session_id: str = None):
+        """Analisa os símbolos com um pool fixo de workers e entrega cada WorkResult assim que fica pronto"""
+        concurrency = concurrency or settings.session.concurrency
+        symbol_timeout = symbol_timeout if symbol_timeout is not None else settings.session.symbol_timeout
+        pipelined = pipelined if pipelined is not None else settings.pipeline.enabled
+
+        async def analyze(symbol):
+            # O prazo do símbolo entra no contexto e chega a todas as etapas e chamadas ao LLM
+            with deadline(symbol_timeout):
+                return await self.analyze_symbol(symbol, session_id)
+
+        grace = settings.session.deadline_grace
+        runner = WorkQueueRunner(analyze, concurrency, symbol_timeout + grace if symbol_timeout else None, grace)
+        # Com o pipeline, a concorrência limita os símbolos em andamento e os
+        # pools de cada etapa limitam o trabalho simultâneo de cada etapa
+        owns_pipeline = pipelined and not self.pipeline.running
+        if owns_pipeline:
+            await self.pipeline.start()
+        try:
+            async for work in runner.run(symbols):
+                yield work
+        finally:
+            if owns_pipeline:
+                await self.pipeline.stop()
+
+    async def run_trading_session(self, symbols: list, session_duration: int = 3600, max_parallel: int = None,
+                                  symbol_timeout: float = None, pipelined: bool = None, shards: int = None,
+                                  session_id: str = None, batch_size: int = None):
+        """Executa uma sessão de trading; max_parallel=None usa settings.session.concurrency"""
+        if batch_size is not None:
+            # Os lotes foram substituídos pela fila de trabalho (max_parallel limita os símbolos em andamento)
+            warnings.warn("run_trading_session(batch_size=...) não tem mais efeito e será removido; "
+                          "use max_parallel", DeprecationWarning, stacklevel=2)
+        session_id = session_id or f"session_{int(time.time())}"
+        shards = shards or settings.session.shards
+        if self.checkpoints is not None:
+            await asyncio.to_thread(self.checkpoints.begin_session, session_id, symbols, {
+                'session_duration': session_duration, 'max_parallel': max_parallel,
+                'symbol_timeout': symbol_timeout, 'pipelined': pipelined, 'shards': shards
+            })
+        if shards > 1 and len(symbols) > 1:
+            return await self._run_sharded_session(
+                symbols, shards, session_duration=session_duration, max_parallel=max_parallel,
+                symbol_timeout=symbol_timeout, pipelined=pipelined, session_id=session_id
+            )
         await self.connect_db()
         logger.info(f"Iniciando sessão de trading para {len(symbols)} símbolos")
         session_results = {
-            'session_id': f"session_{int(time.time())}",
+            'session_id': session_id,
             'symbols': symbols,
             'start_time': datetime.now(),
             'results': {},
             'summary': {}
         }
-        for batch in batcher(symbols, batch_size):
-            sem = asyncio.Semaphore(max_parallel)
-            async def analyze_with_limit(symbol):
-                async with sem:
-                    try:
-                        result = await self.analyze_symbol(symbol)
-                        session_results['results'][symbol] = result
-                        logger.info(f"Análise de {symbol} concluída - "
-                                    f"Decisão: {result['trading_decision']['action']}, "
-                                    f"Aprovado: {result['approval']}")
-                    except Exception as e:
-                        logger.error(f"Erro ao analisar {symbol}: {e}")
-                        session_results['results'][symbol] = {'error': str(e)}
-            await asyncio.gather(*(analyze_with_limit(symbol) for symbol in batch))
+        # session_duration é o orçamento de tempo da sessão inteira
+        with deadline(session_duration), tracer.span("trading_session", session_id=session_id, symbols=len(symbols)):
+            if settings.market_data.bulk_prefetch and len(symbols) > 1:
+                await self._prefetch_market_data(symbols)
+            async for work in self.iter_symbol_results(symbols, max_parallel, symbol_timeout, pipelined, session_id):
+                symbol = work.item
+                if work.ok:
+                    session_results['results'][symbol] = work.result
+                    logger.info(f"Análise de {symbol} concluída em {work.elapsed:.1f}s - "
+                                f"Decisão: {work.result['trading_decision']['action']}, "
+                                f"Aprovado: {work.result['approval']}")
+                else:
+                    logger.error(f"Erro ao analisar {symbol}: {work.error}")
+                    session_results['results'][symbol] = {'error': str(work.error)}
 
+        await self._finish_session(session_results)
+        await self.close_db()
+        return session_results
+
+    async def _prefetch_market_data(self, symbols: list):
+        """Aquece o cache de indicadores da sessão com um único download multi-ticker"""
+        try:
+            await self.market_data_provider.get_technical_indicators_bulk_async(symbols)
+        except Exception as e:
+            # Sem o aquecimento, cada símbolo busca os próprios indicadores na etapa fetch
+            logger.warning(f"Falha ao pré-carregar indicadores de {len(symbols)} símbolos: {e}")
+
+    async def resume_trading_session(self, session_id: str = None):
+        """Retoma uma sessão interrompida (a mais recente, se session_id for omitido),
+        executando apenas os símbolos e etapas que não têm checkpoint"""
+        if self.checkpoints is None:
+            raise RuntimeError("Checkpoints desabilitados em settings.checkpoint")
+        if session_id is None:
+            pending = await asyncio.to_thread(self.checkpoints.incomplete_sessions)
+            if not pending:
+                raise ValueError("Nenhuma sessão interrompida para retomar")
+            session_id = pending[0]
+        session = await asyncio.to_thread(self.checkpoints.get_session, session_id)
+        if session is None:
+            raise ValueError(f"Sessão desconhecida: {session_id}")
+        logger.info(f"Retomando a sessão {session_id} ({len(session['symbols'])} símbolos)")
+        return await self.run_trading_session(session['symbols'], session_id=session_id, **session['options'])
+
+    async def _run_sharded_session(self, symbols: list, shards: int, **session_kwargs):
+        """Divide os símbolos entre processos, cada um com o seu TradingAgentsSystem, e combina os resultados"""
+        parts = partition_symbols(symbols, shards)
+        logger.info(f"Iniciando sessão de trading para {len(symbols)} símbolos em {len(parts)} processos")
+        session_results = {
+            'session_id': session_kwargs['session_id'],
+            'symbols': symbols,
+            'start_time': datetime.now(),
+            'shards': len(parts),
+            'results': {},
+            'summary': {}
+        }
+        # Cada processo tem o próprio escalonador: divide as vagas do LLM para
+        # que o total de chamadas simultâneas ao backend não mude
+        snapshot = copy.deepcopy(settings)
+        snapshot.llm.max_in_flight = max(1, settings.llm.max_in_flight // len(parts))
+        snapshot.session.shards = 1
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=len(parts), mp_context=multiprocessing.get_context("spawn")) as pool:
+            shard_results = await asyncio.gather(*(
+                loop.run_in_executor(pool, run_shard, index, part, self.llm.model_name, snapshot, session_kwargs)
+                for index, part in enumerate(parts)
+            ), return_exceptions=True)
+
+        performances = [self._shard_agent_performance]
+        for part, shard in zip(parts, shard_results):
+            if isinstance(shard, BaseException):
+                logger.error(f"Shard com {part} falhou: {shard}")
+                for symbol in part:
+                    session_results['results'][symbol] = {'error': str(shard)}
+                continue
+            session_results['results'].update(shard['session']['results'])
+            self.exchange.import_trades({**trade, 'shard': shard['shard']} for trade in shard['executed_trades'])
+            performances.append(shard['agent_performance'])
+        self._shard_agent_performance = merge_agent_performance(performances)
+
+        await self._finish_session(session_results)
+        return session_results
+
+    async def _finish_session(self, session_results):
+        if self.checkpoints is not None:
+            session_results['completed'] = await asyncio.to_thread(
+                self.checkpoints.complete_if_done,
+                session_results['session_id'], [stage.name for stage in self.pipeline.order],
+                settings.checkpoint.keep_completed
+            )
         session_results['end_time'] = datetime.now()
         session_results['duration'] = (
             session_results['end_time'] - session_results['start_time']
@@ -160,52 +574,41 @@ class TradingAgentsSystem:
         total_analyses = len([r for r in session_results['results'].values() if 'error' not in r])
         approved_trades = len([r for r in session_results['results'].values() if r.get('approval', False)])
         executed_trades = len([r for r in session_results['results'].values() if r.get('executed_trade') is not None])
+        degraded_symbols = {
+            symbol: r['degraded'] for symbol, r in session_results['results'].items() if r.get('degraded')
+        }
+        restored_symbols = [symbol for symbol, r in session_results['results'].items() if r.get('restored_stages')]
         session_results['summary'] = {
-            'total_symbols': len(symbols),
+            'total_symbols': len(session_results['symbols']),
             'successful_analyses': total_analyses,
             'approved_trades': approved_trades,
             'executed_trades': executed_trades,
             'approval_rate': approved_trades / total_analyses if total_analyses > 0 else 0,
-            'execution_rate': executed_trades / approved_trades if approved_trades > 0 else 0
+            'execution_rate': executed_trades / approved_trades if approved_trades > 0 else 0,
+            'degraded_symbols': degraded_symbols,
+            'restored_symbols': restored_symbols
         }
         logger.info(f"Sessão concluída: {total_analyses} análises, "
                    f"{approved_trades} aprovações, {executed_trades} execuções")
-        await self.close_db()
-        return session_results
 
     def get_portfolio_performance(self):
-        executed_trades = self.exchange.executed_trades
-        if not executed_trades:
+        ledger = self.exchange.ledger
+        if not ledger.total_trades:
             return {'message': 'Nenhuma operação executada ainda'}
-        total_trades = len(executed_trades)
-        buy_trades = [t for t in executed_trades if t['action'] == 'buy']
-        sell_trades = [t for t in executed_trades if t['action'] == 'sell']
-        total_volume = sum(t['executed_price'] * t['quantity'] for t in executed_trades)
+        # Contadores mantidos pelo ledger a cada execução; a marcação a mercado é O(posições)
         return {
-            'total_trades': total_trades,
-            'buy_trades': len(buy_trades),
-            'sell_trades': len(sell_trades),
-            'total_volume': total_volume,
-            'average_trade_size': total_volume / total_trades if total_trades > 0 else 0,
-            'recent_trades': executed_trades[-5:] if executed_trades else []
+            **ledger.summary(),
+            **self.exchange.mark_to_market(),
+            'recent_trades': list(ledger.recent_trades)
         }
 
     def get_agent_performance(self):
         performance = {}
         for agent in self.all_agents:
-            if hasattr(agent, 'analysis_history') and agent.analysis_history:
-                analyses = agent.analysis_history
-                avg_confidence = sum(a.get('confidence', 0) for a in analyses) / len(analyses)
-                recommendations = [a.get('recommendation') for a in analyses if a.get('recommendation')]
-                recommendation_counts = {
-                    'buy': sum(1 for r in recommendations if r == DecisionType.BUY),
-                    'sell': sum(1 for r in recommendations if r == DecisionType.SELL),
-                    'hold': sum(1 for r in recommendations if r == DecisionType.HOLD)
-                }
-                performance[agent.name] = {
-                    'total_analyses': len(analyses),
-                    'average_confidence': avg_confidence,
-                    'recommendations': recommendation_counts,
-                    'last_analysis': analyses[-1]['timestamp'].isoformat() if analyses else None
-                }
+            # Agregados mantidos pelo histórico a cada análise, sem percorrer as análises
+            if agent.analysis_history:
+                performance[agent.name] = agent.analysis_history.summary()
+        if self._shard_agent_performance:
+            # Inclui o que foi analisado pelos processos das sessões particionadas
+            return merge_agent_performance([performance, self._shard_agent_performance])
         return performance 
\ No newline at end of file
@@ -0,0 +1,248 @@
+# services/order_book.py
+import heapq
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from core.enums import DecisionType, OrderStatus, OrderType
+
+@dataclass
+class ExecutionModel:
+    """Slippage e latência aplicados às execuções simuladas"""
+    slippage_bps: float = 0.0  # custo fixo de cada execução, em pontos-base
+    impact_bps: float = 0.0    # pontos-base adicionais por unidade executada
+    latency: float = 0.0       # segundos entre o envio e a chegada da ordem ao livro
+
+    def fill_price(self, side: DecisionType, price: float, quantity: int) -> float:
+        bps = self.slippage_bps + self.impact_bps * quantity
+        if not bps:
+            return price
+        sign = 1 if side is DecisionType.BUY else -1
+        return price * (1 + sign * bps / 10000)
+
+@dataclass(eq=False)
+class Order:
+    """Ordem no livro; quantidade executada e preço médio são atualizados a cada execução"""
+    order_id: str
+    symbol: str
+    side: DecisionType
+    quantity: int
+    order_type: OrderType = OrderType.MARKET
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
+    requested_price: Optional[float] = None
+    submitted_at: float = 0.0
+    filled_quantity: int = 0
+    average_price: float = 0.0
+    status: OrderStatus = OrderStatus.NEW
+
+    @property
+    def remaining(self) -> int:
+        return self.quantity - self.filled_quantity
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (OrderStatus.NEW, OrderStatus.PARTIALLY_FILLED)
+
+@dataclass
+class Fill:
+    """Execução (total ou parcial) de uma ordem"""
+    order: Order
+    quantity: int
+    price: float
+    timestamp: float
+
+class OrderBook:
+    """Livro de ordens de um símbolo com prioridade preço-tempo.
+
+    Não há contraparte simulada: as ordens são executadas contra o fluxo de
+    preços recebido em tick(). Compras limitadas ficam em um heap pelo maior
+    preço, vendas pelo menor, e o número de sequência desempata por ordem de
+    chegada. Ordens stop ficam em heaps pelo preço de disparo e viram ordens a
+    mercado quando o preço o atinge. O volume de um tick, quando informado,
+    limita o que cada lado pode executar nele (execuções parciais).
+
+    Cancelamentos só marcam a ordem; as entradas mortas saem dos heaps quando
+    chegam ao topo ou quando passam de metade do heap.
+    """
+
+    def __init__(self, symbol: str, model: Optional[ExecutionModel] = None):
+        self.symbol = symbol
+        self.model = model or ExecutionModel()
+        self.last_price: Optional[float] = None
+        self.last_timestamp = 0.0
+        self._sequence = itertools.count()
+        self._orders: Dict[str, Order] = {}
+        self._bids: List[Tuple[float, int, Order]] = []
+        self._asks: List[Tuple[float, int, Order]] = []
+        self._buy_stops: List[Tuple[float, int, Order]] = []
+        self._sell_stops: List[Tuple[float, int, Order]] = []
+        self._market: Deque[Order] = deque()
+        self._in_flight: Deque[Tuple[float, Order]] = deque()
+        self._available: Dict[DecisionType, Optional[float]] = {DecisionType.BUY: None, DecisionType.SELL: None}
+        self._dead = 0
+
+    def __len__(self) -> int:
+        """Ordens em aberto (inclusive as ainda a caminho do livro)"""
+        return len(self._orders)
+
+    def open_orders(self) -> List[Order]:
+        return list(self._orders.values())
+
+    def best_bid(self) -> Optional[float]:
+        self._discard_dead(self._bids)
+        return -self._bids[0][0] if self._bids else None
+
+    def best_ask(self) -> Optional[float]:
+        self._discard_dead(self._asks)
+        return self._asks[0][0] if self._asks else None
+
+    def submit(self, order: Order, timestamp: float) -> List[Fill]:
+        """Recebe uma ordem; com latência ela só entra no livro em um tick posterior"""
+        if order.quantity <= 0:
+            raise ValueError("A quantidade da ordem deve ser positiva")
+        if order.order_type is OrderType.LIMIT and order.limit_price is None:
+            raise ValueError("Ordem limitada sem limit_price")
+        if order.order_type is OrderType.STOP and order.stop_price is None:
+            raise ValueError("Ordem stop sem stop_price")
+        order.submitted_at = timestamp
+        self._orders[order.order_id] = order
+        if self.model.latency > 0:
+            # Latência constante: a fila de chegada já fica ordenada pelo instante de chegada
+            self._in_flight.append((timestamp + self.model.latency, order))
+            return []
+        self._enter(order)
+        if self.last_price is not None:
+            self._trigger_stops(self.last_price)
+        return self._match(timestamp)
+
+    def cancel(self, order_id: str) -> Optional[Order]:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        order.status = OrderStatus.CANCELLED
+        self._dead += 1
+        if self._dead > 64 and self._dead * 2 > self._queued():
+            self._compact()
+        return order
+
+    def tick(self, price: float, volume: Optional[float] = None, timestamp: float = 0.0) -> List[Fill]:
+        """Novo preço do mercado: entrega ordens a caminho, dispara stops e executa o que cruzar"""
+        self.last_price = price
+        self.last_timestamp = timestamp
+        self._available[DecisionType.BUY] = volume
+        self._available[DecisionType.SELL] = volume
+        while self._in_flight and self._in_flight[0][0] <= timestamp:
+            _, order = self._in_flight.popleft()
+            if order.is_active:
+                self._enter(order)
+            else:
+                self._dead -= 1
+        self._trigger_stops(price)
+        return self._match(timestamp)
+
+    def _enter(self, order: Order) -> None:
+        key = next(self._sequence)
+        if order.order_type is OrderType.MARKET:
+            self._market.append(order)
+        elif order.order_type is OrderType.LIMIT:
+            if order.side is DecisionType.BUY:
+                heapq.heappush(self._bids, (-order.limit_price, key, order))
+            else:
+                heapq.heappush(self._asks, (order.limit_price, key, order))
+        elif order.side is DecisionType.BUY:
+            heapq.heappush(self._buy_stops, (order.stop_price, key, order))
+        else:
+            heapq.heappush(self._sell_stops, (-order.stop_price, key, order))
+
+    def _trigger_stops(self, price: float) -> None:
+        # Stop de compra dispara com o preço no nível do stop ou acima; de venda, no nível ou abaixo
+        while self._buy_stops and self._buy_stops[0][0] <= price:
+            order = heapq.heappop(self._buy_stops)[2]
+            if order.is_active:
+                self._market.append(order)
+            else:
+                self._dead -= 1
+        while self._sell_stops and -self._sell_stops[0][0] >= price:
+            order = heapq.heappop(self._sell_stops)[2]
+            if order.is_active:
+                self._market.append(order)
+            else:
+                self._dead -= 1
+
+    def _match(self, timestamp: float) -> List[Fill]:
+        fills: List[Fill] = []
+        price = self.last_price
+        if price is None:
+            return fills
+        # Ordens a mercado (e stops disparados) têm prioridade, na ordem de chegada
+        while self._market:
+            order = self._market[0]
+            if not order.is_active:
+                self._market.popleft()
+                self._dead -= 1
+                continue
+            if not self._execute(order, price, timestamp, fills):
+                break
+            self._market.popleft()
+        self._match_limits(self._bids, DecisionType.BUY, lambda key: -key >= price, price, timestamp, fills)
+        self._match_limits(self._asks, DecisionType.SELL, lambda key: key <= price, price, timestamp, fills)
+        return fills
+
+    def _match_limits(self, heap, side, crosses, price, timestamp, fills) -> None:
+        while heap and self._available[side] != 0:
+            key, _, order = heap[0]
+            if not order.is_active:
+                heapq.heappop(heap)
+                self._dead -= 1
+                continue
+            if not crosses(key):
+                break
+            if not self._execute(order, price, timestamp, fills):
+                break
+            heapq.heappop(heap)
+
+    def _execute(self, order: Order, price: float, timestamp: float, fills: List[Fill]) -> bool:
+        """Executa o que a liquidez do tick permitir; True quando a ordem foi concluída"""
+        available = self._available[order.side]
+        quantity = order.remaining if available is None else int(min(order.remaining, available))
+        if quantity <= 0:
+            return False
+        fill_price = self.model.fill_price(order.side, price, quantity)
+        if order.limit_price is not None:
+            # O slippage nunca leva a execução além do limite
+            if order.side is DecisionType.BUY:
+                fill_price = min(fill_price, order.limit_price)
+            else:
+                fill_price = max(fill_price, order.limit_price)
+        if available is not None:
+            self._available[order.side] = available - quantity
+        total = order.filled_quantity + quantity
+        order.average_price = (order.average_price * order.filled_quantity + fill_price * quantity) / total
+        order.filled_quantity = total
+        if order.remaining == 0:
+            order.status = OrderStatus.FILLED
+            del self._orders[order.order_id]
+        else:
+            order.status = OrderStatus.PARTIALLY_FILLED
+        fills.append(Fill(order, quantity, fill_price, timestamp))
+        return order.status is OrderStatus.FILLED
+
+    def _discard_dead(self, heap) -> None:
+        while heap and not heap[0][2].is_active:
+            heapq.heappop(heap)
+            self._dead -= 1
+
+    def _queued(self) -> int:
+        return (len(self._bids) + len(self._asks) + len(self._buy_stops) + len(self._sell_stops) +
+                len(self._market) + len(self._in_flight))
+
+    def _compact(self) -> None:
+        """Reconstrói os heaps sem as ordens canceladas"""
+        for name in ('_bids', '_asks', '_buy_stops', '_sell_stops'):
+            heap = [entry for entry in getattr(self, name) if entry[2].is_active]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self._market = deque(order for order in self._market if order.is_active)
+        self._in_flight = deque(entry for entry in self._in_flight if entry[1].is_active)
+        self._dead = 0
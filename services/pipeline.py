@@ -0,0 +1,217 @@
+# services/pipeline.py
+import asyncio
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Set, Tuple
+from utils.histogram import LatencyHistogram
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Uma etapa recebe o estado do item e devolve a sua saída, gravada em state[stage.name]
+StageFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+@dataclass
+class Stage:
+    """Etapa do grafo com suas dependências e o tamanho do seu pool de workers"""
+    name: str
+    func: StageFunc
+    depends_on: Tuple[str, ...] = ()
+    workers: int = 1
+
+@dataclass
+class StageStats:
+    """Métricas de uma etapa: latência de execução, espera na fila e profundidade da fila"""
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    queue_wait: LatencyHistogram = field(default_factory=LatencyHistogram)
+    processed: int = 0
+    errors: int = 0
+    max_queue_depth: int = 0
+
+class _Run:
+    """Estado de um item percorrendo o grafo"""
+    __slots__ = ('state', 'waiting_on', 'completed', 'future', 'context', 'tasks')
+
+    def __init__(self, state: Dict[str, Any], stages: Sequence[Stage], future: asyncio.Future,
+                 context: contextvars.Context):
+        self.state = state
+        self.waiting_on: Dict[str, Set[str]] = {s.name: set(s.depends_on) for s in stages}
+        self.completed: Set[str] = set()
+        self.future = future
+        self.context = context
+        # Etapas em execução; canceladas se o item for abandonado (prazo) ou falhar
+        self.tasks: Set[asyncio.Task] = set()
+
+    def cancel_tasks(self, _future=None):
+        for task in list(self.tasks):
+            task.cancel()
+
+class StagePipeline:
+    """Executor de um grafo de etapas com filas e pools de workers por etapa.
+
+    Cada item submetido avança para uma etapa assim que todas as suas
+    dependências terminam, de modo que etapas diferentes de itens diferentes
+    rodam ao mesmo tempo. As etapas executam no contexto (contextvars) de quem
+    submeteu o item. run_inline() executa o mesmo grafo em sequência, sem filas.
+    Cancelar o future de um item (por exemplo, com asyncio.wait_for) cancela
+    também as etapas dele que já estão em execução.
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.order: List[Stage] = self._topological_order(stages)
+        self._dependents: Dict[str, List[str]] = {
+            s.name: [d.name for d in self.order if s.name in d.depends_on] for s in self.order
+        }
+        self._stats: Dict[str, StageStats] = {s.name: StageStats() for s in self.order}
+        self._busy: Dict[str, int] = {s.name: 0 for s in self.order}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._pending: Set[asyncio.Future] = set()
+
+    @staticmethod
+    def _topological_order(stages: Sequence[Stage]) -> List[Stage]:
+        """Ordena as etapas respeitando as dependências e, entre as independentes, a ordem declarada"""
+        by_name: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in by_name:
+                raise ValueError(f"Etapa duplicada: {stage.name}")
+            by_name[stage.name] = stage
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f"Etapa {stage.name} depende de etapa desconhecida: {dep}")
+        order: List[Stage] = []
+        done: Set[str] = set()
+        while len(order) < len(stages):
+            ready = [s for s in stages if s.name not in done and all(d in done for d in s.depends_on)]
+            if not ready:
+                raise ValueError("O grafo de etapas contém um ciclo")
+            order.append(ready[0])
+            done.add(ready[0].name)
+        return order
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self._workers:
+            return
+        for stage in self.order:
+            self._queues[stage.name] = asyncio.Queue()
+            for i in range(max(1, stage.workers)):
+                self._workers.append(asyncio.create_task(self._worker(stage), name=f"pipeline-{stage.name}-{i}"))
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # Itens ainda em andamento não serão concluídos
+        for future in list(self._pending):
+            future.cancel()
+        self._queues = {}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def submit(self, state: Dict[str, Any]) -> asyncio.Future:
+        """Coloca um item no grafo; o future resolve com o estado completo ou com o erro da etapa que falhou"""
+        if not self._workers:
+            raise RuntimeError("Pipeline não iniciado")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        run = _Run(state, self.order, future, contextvars.copy_context())
+        future.add_done_callback(run.cancel_tasks)
+        for stage in self.order:
+            if not stage.depends_on:
+                self._enqueue(stage.name, run)
+        return future
+
+    async def run_inline(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Executa todas as etapas em ordem topológica na tarefa atual"""
+        for stage in self.order:
+            state[stage.name] = await self._execute(stage, state)
+        return state
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            stage.name: {
+                'workers': max(1, stage.workers),
+                'busy': self._busy[stage.name],
+                'queue_depth': self._queues[stage.name].qsize() if stage.name in self._queues else 0,
+                'max_queue_depth': self._stats[stage.name].max_queue_depth,
+                'processed': self._stats[stage.name].processed,
+                'errors': self._stats[stage.name].errors,
+                'latency': self._stats[stage.name].latency.to_dict(),
+                'queue_wait': self._stats[stage.name].queue_wait.to_dict()
+            }
+            for stage in self.order
+        }
+
+    def _enqueue(self, name: str, run: _Run):
+        queue = self._queues[name]
+        queue.put_nowait((run, time.monotonic()))
+        stats = self._stats[name]
+        stats.max_queue_depth = max(stats.max_queue_depth, queue.qsize())
+
+    async def _worker(self, stage: Stage):
+        queue = self._queues[stage.name]
+        while True:
+            run, enqueued_at = await queue.get()
+            self._stats[stage.name].queue_wait.record(time.monotonic() - enqueued_at)
+            if run.future.done():
+                # Outra etapa do mesmo item já falhou
+                continue
+            self._busy[stage.name] += 1
+            task = asyncio.create_task(self._execute(stage, run.state), context=run.context)
+            run.tasks.add(task)
+            try:
+                output = await task
+            except asyncio.CancelledError:
+                if run.future.done() and asyncio.current_task().cancelling() == 0:
+                    # Só a etapa foi cancelada, junto com o item abandonado: o worker segue
+                    continue
+                raise
+            except Exception as e:
+                logger.error(f"Etapa {stage.name} falhou: {e}")
+                if not run.future.done():
+                    run.future.set_exception(e)
+                continue
+            finally:
+                run.tasks.discard(task)
+                self._busy[stage.name] -= 1
+            run.state[stage.name] = output
+            self._complete(stage.name, run)
+
+    def _complete(self, name: str, run: _Run):
+        run.completed.add(name)
+        if len(run.completed) == len(self.order):
+            if not run.future.done():
+                run.future.set_result(run.state)
+            return
+        for dependent in self._dependents[name]:
+            waiting = run.waiting_on[dependent]
+            waiting.discard(name)
+            if not waiting:
+                self._enqueue(dependent, run)
+
+    async def _execute(self, stage: Stage, state: Dict[str, Any]) -> Any:
+        stats = self._stats[stage.name]
+        start = time.monotonic()
+        try:
+            with tracer.span(f"stage.{stage.name}", symbol=state.get('symbol')):
+                return await stage.func(state)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.processed += 1
+            stats.latency.record(time.monotonic() - start)
@@ -0,0 +1,64 @@
+# services/sharding.py
+import asyncio
+import dataclasses
+from typing import Any, Dict, List, Optional
+from config.settings import AppSettings, settings
+from utils.tracing import configure_tracing, tracer
+
+def partition_symbols(symbols: List[str], shards: int) -> List[List[str]]:
+    """Distribui os símbolos entre os shards em rodízio, descartando shards vazios"""
+    parts = [symbols[i::shards] for i in range(max(1, shards))]
+    return [part for part in parts if part]
+
+def _apply_settings(snapshot: AppSettings):
+    for f in dataclasses.fields(AppSettings):
+        setattr(settings, f.name, getattr(snapshot, f.name))
+
+def run_shard(shard_index: int, symbols: List[str], model_name: str, settings_snapshot: AppSettings,
+              session_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Executa uma sessão em um processo filho com o seu próprio TradingAgentsSystem"""
+    # Processos 'spawn' reimportam os módulos: aplica as configurações do processo pai
+    _apply_settings(settings_snapshot)
+    from services.orchestrator import TradingAgentsSystem
+    # Cada processo grava o próprio arquivo de rastreamento
+    configure_tracing(settings.tracing, suffix=f"shard{shard_index}")
+
+    async def run():
+        system = TradingAgentsSystem(model_name)
+        try:
+            session = await system.run_trading_session(symbols, **session_kwargs)
+            return {
+                'shard': shard_index,
+                'session': session,
+                'executed_trades': system.exchange.executed_trades,
+                'agent_performance': system.get_agent_performance()
+            }
+        finally:
+            await system.llm.close()
+            tracer.close()
+
+    return asyncio.run(run())
+
+def merge_agent_performance(performances: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Combina estatísticas de get_agent_performance() de vários processos"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for performance in performances:
+        for name, stats in (performance or {}).items():
+            current = merged.get(name)
+            if current is None:
+                merged[name] = {**stats, 'recommendations': dict(stats['recommendations'])}
+                continue
+            total = current['total_analyses'] + stats['total_analyses']
+            if total:
+                current['average_confidence'] = (
+                    current['average_confidence'] * current['total_analyses'] +
+                    stats['average_confidence'] * stats['total_analyses']
+                ) / total
+            current['total_analyses'] = total
+            for key, count in stats['recommendations'].items():
+                current['recommendations'][key] = current['recommendations'].get(key, 0) + count
+            # Timestamps ISO 8601 comparam corretamente como texto
+            current['last_analysis'] = max(
+                (t for t in (current['last_analysis'], stats['last_analysis']) if t), default=None
+            )
+    return merged
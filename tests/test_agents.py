@@ -1 +1,25 @@
-# tests/test_agents.py 
\ No newline at end of file
+# tests/test_agents.py
+from datetime import datetime, timedelta
+from core.agent_history import AgentHistory
+from core.enums import DecisionType
+
+def test_agent_history_keeps_running_aggregates_beyond_capacity():
+    history = AgentHistory(capacity=3)
+    start = datetime(2024, 1, 1)
+    recommendations = [DecisionType.BUY, DecisionType.SELL, DecisionType.HOLD, DecisionType.BUY, None]
+    for i, recommendation in enumerate(recommendations):
+        history.append({
+            'confidence': 10.0 * (i + 1),
+            'recommendation': recommendation,
+            'timestamp': start + timedelta(minutes=i)
+        })
+
+    summary = history.summary()
+    assert len(history) == summary['total_analyses'] == 5
+    assert summary['average_confidence'] == 30.0
+    assert summary['recommendations'] == {'buy': 2, 'sell': 1, 'hold': 1}
+    assert summary['last_analysis'] == (start + timedelta(minutes=4)).isoformat()
+    # Só as últimas 3 análises continuam no buffer, em ordem cronológica
+    assert [a['confidence'] for a in history.recent()] == [30.0, 40.0, 50.0]
+    assert history.last()['recommendation'] is None
+    assert list(history.confidences()) == [30.0, 40.0, 50.0]
@@ -1 +1,434 @@
-# tests/test_data.py 
\ No newline at end of file
+import time
+import pytest
+from datetime import timedelta
+from llm.response_cache import LLMResponseCache
+
+def test_llm_response_cache_tiers_and_ttl(tmp_path):
+    disk_path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(timedelta(seconds=60), memory_size=1, disk_path=disk_path)
+    key_a = LLMResponseCache.make_key("llama3.2", "sys", "prompt a", {"temperature": 0.7})
+    key_b = LLMResponseCache.make_key("llama3.2", "sys", "prompt b", {"temperature": 0.7})
+    assert key_a != key_b
+
+    cache.set(key_a, "resposta a")
+    cache.set(key_b, "resposta b")  # expulsa key_a do LRU em memória
+    assert cache.get(key_b) == "resposta b"
+    assert cache.get(key_a) == "resposta a"
+    stats = cache.stats()
+    assert stats['memory_hits'] == 1
+    assert stats['disk_hits'] == 1
+
+    # Persistência entre instâncias
+    cache.close()
+    reopened = LLMResponseCache(timedelta(seconds=60), memory_size=4, disk_path=disk_path)
+    assert reopened.get(key_b) == "resposta b"
+
+    expired = LLMResponseCache(timedelta(seconds=0), memory_size=4)
+    expired.set(key_a, "resposta a")
+    time.sleep(0.01)
+    assert expired.get(key_a) is None
+    assert expired.stats()['misses'] == 1
+
+
+def test_llm_response_cache_async_keeps_sqlite_off_the_loop(tmp_path):
+    import asyncio
+    import threading
+
+    cache = LLMResponseCache(timedelta(seconds=60), memory_size=1, disk_path=str(tmp_path / "llm_cache.db"))
+    disk_threads = []
+    for name in ('_get_disk', '_set_disk'):
+        original = getattr(cache, name)
+
+        def traced(*args, _original=original):
+            disk_threads.append(threading.get_ident())
+            return _original(*args)
+
+        setattr(cache, name, traced)
+
+    async def scenario():
+        await cache.set_async("a", "resposta a")
+        await cache.set_async("b", "resposta b")  # expulsa "a" da memória
+        b = await cache.get_async("b")
+        return await cache.get_async("a"), b, threading.get_ident()
+
+    a, b, loop_thread = asyncio.run(scenario())
+    assert (a, b) == ("resposta a", "resposta b")
+    # Duas gravações e uma leitura do disco; o acerto em memória não toca o SQLite
+    assert len(disk_threads) == 3 and loop_thread not in disk_threads
+    assert cache.stats()['disk_hits'] == 1 and cache.stats()['memory_hits'] == 1
+
+    # Arquivo compartilhado pelos shards: WAL, e um erro do SQLite na leitura vira miss
+    assert cache._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    cache._conn.close()
+    assert asyncio.run(cache.get_async("c")) is None and cache.get("c") is None
+
+
+def test_market_data_provider_retries_off_the_event_loop(monkeypatch):
+    import asyncio
+    from datetime import datetime
+    from config.settings import settings
+    from core.data_models import MarketData
+    from data.market_data import MarketDataProvider
+
+    monkeypatch.setattr(settings.market_data, 'retry_delay', 0.05)
+    monkeypatch.setattr(settings.market_data, 'max_retries', 3)
+    provider = MarketDataProvider()
+    provider._market_cache.invalidate("RETRY")
+    attempts = []
+
+    def flaky_fetch(symbol, attempt=0):
+        attempts.append(attempt)
+        time.sleep(0.05)  # I/O bloqueante simulado
+        if attempt < 2:
+            raise ConnectionError("falha simulada")
+        return MarketData(symbol, 42.0, 1000, 0.0, 0.0, 0.0, datetime.now())
+
+    monkeypatch.setattr(provider, '_fetch_real_market_data', flaky_fetch)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        data = await provider.get_market_data_async("RETRY")
+        task.cancel()
+        return data, ticks
+
+    data, ticks = asyncio.run(scenario())
+    assert data.price == 42.0 and attempts == [0, 1, 2]
+    # O loop continuou atendendo outras tarefas durante o I/O e as esperas
+    assert ticks >= 10
+    # A API síncrona usa o cache preenchido pela assíncrona
+    assert provider.get_market_data("RETRY") is data
+
+    # ...mas não pode ser chamada de dentro do loop, que ficaria bloqueado
+    async def sync_inside_loop():
+        return provider.get_market_data("RETRY")
+
+    with pytest.raises(RuntimeError, match="_async"):
+        asyncio.run(sync_inside_loop())
+    provider.shutdown()
+
+
+def test_bulk_technical_indicators_use_one_download(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    from config.settings import settings
+    from data import market_data as market_data_module
+    from data.market_data import MarketDataProvider
+
+    monkeypatch.setattr(settings.market_data, 'ohlcv_store_path', str(tmp_path / "ohlcv"))
+
+    symbols = ["BULK1", "BULK2", "BULK3"]
+    index = pd.date_range(end=pd.Timestamp.now().normalize(), periods=80, freq="D")
+    columns = pd.MultiIndex.from_product([symbols, ["Open", "High", "Low", "Close", "Volume"]])
+    values = np.tile(np.linspace(100, 180, 80)[:, None], (1, len(columns)))
+    wide = pd.DataFrame(values, index=index, columns=columns)
+    wide.loc[index[::7], ("BULK3", "Close")] = np.nan  # calendário diferente
+    calls = []
+
+    def fake_download(tickers, **kwargs):
+        calls.append((tickers, kwargs.get('group_by')))
+        return wide
+
+    monkeypatch.setattr(market_data_module.yf, 'download', fake_download)
+    provider = MarketDataProvider()
+    for symbol in symbols:
+        provider._technical_cache.invalidate(symbol)
+
+    results = provider.get_technical_indicators_bulk(symbols)
+    assert calls == [(symbols, 'ticker')]
+    assert set(results) == set(symbols)
+    # As linhas vazias de BULK3 são descartadas antes do cálculo
+    assert not np.isnan(results["BULK3"].moving_avg_20) and not np.isnan(results["BULK3"].rsi)
+    # Uma segunda chamada é servida pelo cache
+    assert provider.get_technical_indicators_bulk(symbols) == results and len(calls) == 1
+    provider.shutdown()
+
+
+def test_ohlcv_store_downloads_only_the_tail_after_restart(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    from config.settings import settings
+    from data import market_data as market_data_module
+    from data.market_data import MarketDataProvider
+    from data.ohlcv_store import OHLCVStore
+
+    monkeypatch.setattr(settings.market_data, 'ohlcv_store_path', str(tmp_path / "ohlcv"))
+    now = pd.Timestamp.now(tz='UTC').normalize()
+    index = pd.date_range(end=now, periods=100, freq="D")
+    closes = np.linspace(100, 199, 100)
+    history = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1e6},
+                           index=index)
+    available = {"n": 98}
+    calls = []
+
+    def fake_download(tickers, **kwargs):
+        calls.append(kwargs)
+        frame = history.iloc[:available["n"]]
+        if 'start' in kwargs:
+            frame = frame[frame.index >= pd.Timestamp(kwargs['start'], tz='UTC')]
+        return pd.concat({tickers[0]: frame}, axis=1)
+
+    monkeypatch.setattr(market_data_module.yf, 'download', fake_download)
+    provider = MarketDataProvider()
+    provider._technical_cache.invalidate("TAIL")
+    provider.get_technical_indicators("TAIL")
+    assert 'period' in calls[0]
+    provider.shutdown()
+
+    # Novo processo: o histórico gravado sobrevive e só a cauda é baixada (última barra substituída)
+    available["n"] = 100
+    restarted = MarketDataProvider()
+    restarted._technical_cache.invalidate("TAIL")
+    indicators = restarted.get_technical_indicators("TAIL")
+    assert calls[1] == {**calls[1], 'start': index[97].strftime('%Y-%m-%d')}
+    store = OHLCVStore(settings.market_data.ohlcv_store_path)
+    arrays = store.arrays("TAIL", settings.market_data.historical_interval)
+    assert isinstance(arrays['close'], np.memmap)
+    assert np.array_equal(arrays['close'], closes) and store.last_timestamp("TAIL", "1d") == index[-1]
+    assert indicators.moving_avg_20 == float(np.mean(closes[-20:]))
+    restarted.shutdown()
+
+
+def test_ohlcv_store_append_keeps_open_memmaps_intact(tmp_path):
+    import numpy as np
+    import pandas as pd
+    from data.ohlcv_store import OHLCVStore
+
+    index = pd.date_range("2024-01-01", periods=10, freq="D", tz="UTC")
+    closes = np.arange(10, dtype=float)
+    frame = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1.0},
+                         index=index)
+    store = OHLCVStore(str(tmp_path))
+    store.append("MMAP", "1d", frame)
+    before = store.arrays("MMAP", "1d")['close']
+
+    # Substitui as 3 últimas barras por uma série mais curta
+    store.append("MMAP", "1d", frame.iloc[7:8].assign(Close=-1.0))
+    assert np.array_equal(before, closes)
+    after = store.arrays("MMAP", "1d")['close']
+    assert np.array_equal(after, [*closes[:7], -1.0])
+    # O índice gravado aponta a nova geração mesmo depois de reabrir
+    assert np.array_equal(OHLCVStore(str(tmp_path)).arrays("MMAP", "1d")['close'], after)
+
+
+def test_ohlcv_store_appends_tail_in_place_and_retries_cleanup(tmp_path, monkeypatch):
+    import os
+    import shutil
+    import numpy as np
+    import pandas as pd
+    from data import ohlcv_store as ohlcv_store_module
+    from data.ohlcv_store import OHLCVStore
+
+    index = pd.date_range("2024-01-01", periods=10, freq="D", tz="UTC")
+    closes = np.arange(10, dtype=float)
+    frame = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1.0},
+                         index=index)
+    store = OHLCVStore(str(tmp_path))
+    store.append("TAILS", "1d", frame.iloc[:8])
+    generation = store._index["TAILS__1d"]['generation']
+
+    # A última barra volta igual junto com as novas: só as novas são gravadas, na mesma geração
+    store.append("TAILS", "1d", frame.iloc[7:])
+    assert store._index["TAILS__1d"]['generation'] == generation
+    assert np.array_equal(store.arrays("TAILS", "1d")['close'], closes)
+
+    # Barra regravada com outro valor: geração nova; a remoção da antiga falha uma vez e é refeita
+    failures = []
+    rmtree = shutil.rmtree
+
+    def flaky_rmtree(path, *args, **kwargs):
+        if not kwargs.get('ignore_errors') and not failures:
+            failures.append(path)
+            raise PermissionError("arquivo em uso")
+        return rmtree(path, *args, **kwargs)
+
+    monkeypatch.setattr(ohlcv_store_module.shutil, 'rmtree', flaky_rmtree)
+    store.append("TAILS", "1d", frame.iloc[9:].assign(Close=-1.0))
+    old_directory = os.path.join(str(tmp_path), "TAILS__1d", str(generation))
+    assert failures == [old_directory] and os.path.isdir(old_directory)
+    store.append("TAILS", "1d", frame.iloc[9:].assign(Close=-1.0))
+    assert not os.path.exists(old_directory)
+    assert np.array_equal(store.arrays("TAILS", "1d")['close'], [*closes[:9], -1.0])
+
+
+def test_ohlcv_refresh_groups_by_last_bar_and_flags_stale_history(tmp_path, monkeypatch):
+    import numpy as np
+    import pandas as pd
+    from config.settings import settings
+    from data import market_data as market_data_module
+    from data.market_data import MarketDataProvider
+    from data.ohlcv_store import OHLCVStore
+
+    monkeypatch.setattr(settings.market_data, 'ohlcv_store_path', str(tmp_path / "ohlcv"))
+    monkeypatch.setattr(settings.market_data, 'max_retries', 1)
+    now = pd.Timestamp.now(tz='UTC').normalize()
+    index = pd.date_range(end=now, periods=60, freq="D")
+    closes = np.linspace(100, 159, 60)
+    history = pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1e6},
+                           index=index)
+    store = OHLCVStore(settings.market_data.ohlcv_store_path)
+    store.append("FRESH", "1d", history.iloc[:-1])
+    store.append("LAGGED", "1d", history.iloc[:-30])
+    calls = []
+    broken = set()
+
+    def fake_download(tickers, **kwargs):
+        calls.append((list(tickers), kwargs.get('start')))
+        if broken & set(tickers):
+            raise ConnectionError("falha simulada")
+        frame = history[history.index >= pd.Timestamp(kwargs['start'], tz='UTC')]
+        return pd.concat({ticker: frame for ticker in tickers}, axis=1)
+
+    monkeypatch.setattr(market_data_module.yf, 'download', fake_download)
+    provider = MarketDataProvider()
+    for symbol in ("FRESH", "LAGGED"):
+        provider._technical_cache.invalidate(symbol)
+
+    # Uma requisição por última barra: a série atrasada não alarga a janela da outra
+    broken.add("LAGGED")
+    results = provider.get_technical_indicators_bulk(["FRESH", "LAGGED"])
+    assert sorted(calls) == sorted([(["FRESH"], index[-2].strftime('%Y-%m-%d')),
+                                    (["LAGGED"], index[-31].strftime('%Y-%m-%d'))])
+    assert set(results) == {"FRESH", "LAGGED"}
+    # LAGGED foi calculado com o histórico antigo: entra no cache já vencido
+    assert provider._technical_cache.time_to_stale("FRESH") > timedelta(0)
+    assert provider._technical_cache.time_to_stale("LAGGED") <= timedelta(0)
+    assert results["LAGGED"].moving_avg_20 == float(np.mean(closes[-50:-30]))
+
+    # Sem nenhum símbolo atualizado, a falha sobe para o chamador
+    broken.add("FRESH")
+    with pytest.raises(ValueError):
+        provider._refresh_store(["FRESH", "LAGGED"])
+    provider.shutdown()
+
+
+def test_concurrent_market_data_requests_share_one_fetch(monkeypatch):
+    import asyncio
+    import threading
+    from datetime import datetime
+    from core.data_models import MarketData
+    from data.market_data import MarketDataProvider
+
+    provider = MarketDataProvider()
+    provider._market_cache.invalidate("FLIGHT")
+    fetches = []
+
+    def slow_fetch(symbol, attempt=0):
+        fetches.append(symbol)
+        time.sleep(0.2)
+        return MarketData(symbol, 7.0, 1, 0.0, 0.0, 0.0, datetime.now())
+
+    monkeypatch.setattr(provider, '_fetch_real_market_data', slow_fetch)
+
+    async def async_callers():
+        return await asyncio.gather(*(provider.get_market_data_async("FLIGHT") for _ in range(5)))
+
+    # Chamadas síncronas de outra thread entram no mesmo voo
+    sync_results = []
+    thread = threading.Thread(target=lambda: (time.sleep(0.05), sync_results.append(provider.get_market_data("FLIGHT"))))
+    thread.start()
+    results = asyncio.run(async_callers())
+    thread.join()
+
+    assert fetches == ["FLIGHT"]
+    assert all(r is results[0] for r in results + sync_results)
+    stats = provider.get_coalescing_stats()['market_data']
+    assert stats['executed'] == 1 and stats['coalesced'] == 5
+    provider.shutdown()
+
+
+def test_single_symbol_indicators_join_an_in_flight_bulk_download(monkeypatch):
+    import asyncio
+    from datetime import datetime
+    from core.data_models import TechnicalIndicators
+    from data.market_data import MarketDataProvider
+
+    provider = MarketDataProvider()
+    symbols = ["JOIN1", "JOIN2"]
+    for symbol in symbols:
+        provider._technical_cache.invalidate(symbol)
+    bulk_calls, single_calls = [], []
+
+    def slow_bulk(symbols, attempt=0):
+        bulk_calls.append(list(symbols))
+        time.sleep(0.2)
+        return {symbol: TechnicalIndicators(symbol, 50.0, 0.0, 1.0, 1.0, 1.0, 1.0, 1.0, datetime.now())
+                for symbol in symbols}, set()
+
+    def single(symbol, attempt=0):
+        single_calls.append(symbol)
+
+    monkeypatch.setattr(provider, '_calculate_bulk_technical_indicators', slow_bulk)
+    monkeypatch.setattr(provider, '_calculate_real_technical_indicators', single)
+
+    async def scenario():
+        bulk = asyncio.create_task(provider.get_technical_indicators_bulk_async(symbols))
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(bulk, provider.get_technical_indicators_async("JOIN2"))
+
+    bulk, joined = asyncio.run(scenario())
+    # A busca individual aguardou o download em lote em vez de iniciar outro
+    assert bulk_calls == [symbols] and single_calls == []
+    assert joined is bulk["JOIN2"]
+    assert provider.get_coalescing_stats()['technical_indicators']['coalesced'] == 1
+    provider.shutdown()
+
+
+def test_stale_market_data_is_served_while_refreshing(monkeypatch):
+    import asyncio
+    from datetime import datetime
+    from core.data_models import MarketData
+    from data.market_data import MarketDataProvider
+    from utils.cache_manager import ThreadSafeCache
+
+    cache = ThreadSafeCache(timedelta(milliseconds=50), hard_ttl=timedelta(milliseconds=150))
+    cache.set("K", 1)
+    assert cache.lookup("K") == (1, False)
+    time.sleep(0.08)
+    # get() só devolve entradas dentro do TTL; as velhas ficam para lookup()
+    assert cache.lookup("K") == (1, True) and cache.get("K") is None
+    time.sleep(0.1)
+    assert cache.lookup("K") == (None, False)
+
+    provider = MarketDataProvider()
+    old = MarketData("SWR", 10.0, 1, 0.0, 0.0, 0.0, datetime.now())
+    provider._market_cache.set("SWR", old, ttl=timedelta(milliseconds=10))
+    time.sleep(0.02)
+    fetches = []
+
+    def slow_fetch(symbol, attempt=0):
+        fetches.append(symbol)
+        time.sleep(0.2)
+        return MarketData(symbol, 11.0, 1, 0.0, 0.0, 0.0, datetime.now())
+
+    monkeypatch.setattr(provider, '_fetch_real_market_data', slow_fetch)
+
+    async def callers():
+        return await asyncio.gather(*(provider.get_market_data_async("SWR") for _ in range(3)))
+
+    start = time.perf_counter()
+    results = asyncio.run(callers())
+    # O valor velho volta na hora; uma única atualização roda em segundo plano
+    assert all(r is old for r in results) and time.perf_counter() - start < 0.1
+    deadline = time.time() + 2
+    while provider._market_cache.lookup("SWR")[0].price != 11.0:
+        assert time.time() < deadline
+        time.sleep(0.02)
+    data, stale = provider._market_cache.lookup("SWR")
+    assert not stale and fetches == ["SWR"]
+
+    # Preços de execução não usam a entrada velha: ela é baixada de novo
+    provider._market_cache.set("SWR", old, ttl=timedelta(milliseconds=10))
+    time.sleep(0.02)
+    monkeypatch.setattr(provider, '_refresh_in_background', lambda *args: None)
+    monkeypatch.setattr(provider, '_fetch_latest_prices', lambda symbols: {symbol: 12.0 for symbol in symbols})
+    assert provider.get_cached_prices(["SWR"]) == {"SWR": 10.0}
+    assert provider.get_latest_prices(["SWR"]) == {"SWR": 12.0}
+    provider.shutdown()
@@ -0,0 +1,277 @@
+import pytest
+import asyncio
+from core.enums import LLMPriority
+from llm.scheduler import LLMScheduler
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_critical_before_queued_discussion():
+    scheduler = LLMScheduler(
+        capacity=1,
+        quotas={LLMPriority.CRITICAL: 1, LLMPriority.ANALYSIS: 1, LLMPriority.DISCUSSION: 1},
+        aging_interval=60.0
+    )
+    order = []
+
+    async def call(priority, tag):
+        async with scheduler.slot(priority):
+            order.append(tag)
+            await asyncio.sleep(0.01)
+
+    blocker = asyncio.create_task(call(LLMPriority.DISCUSSION, "d0"))
+    await asyncio.sleep(0)
+    queued = [asyncio.create_task(call(LLMPriority.DISCUSSION, f"d{i}")) for i in range(1, 4)]
+    await asyncio.sleep(0)
+    critical = asyncio.create_task(call(LLMPriority.CRITICAL, "decision"))
+    await asyncio.gather(blocker, critical, *queued)
+
+    assert order[:2] == ["d0", "decision"]
+    assert scheduler.stats()['critical']['dispatched'] == 1
+
+@pytest.mark.asyncio
+async def test_fake_ollama_is_deterministic_in_process_and_over_http(monkeypatch):
+    import ollama
+    from config.settings import settings
+    from data.llm_interface import LLMInterface
+    from llm.backends import AsyncOllamaBackend
+    from llm.fake_ollama import FakeModelProfile, FakeOllamaBackend, FakeOllamaServer
+    from llm.streaming import token_sink
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+
+    llm = LLMInterface("fake-model", FakeOllamaBackend(profile))
+    first = await llm.generate_response("Analise AAPL", "sistema")
+    second = await llm.generate_response("Analise AAPL", "sistema")
+    assert first == second
+    assert first.split()[-2:][0] == "Recomendação:"
+
+    server = FakeOllamaServer(profile, port=0)
+    server.start_in_thread()
+    try:
+        http_llm = LLMInterface("fake-model", AsyncOllamaBackend(server.url))
+        assert await http_llm.generate_response("Analise AAPL", "sistema") == first
+
+        events = []
+
+        async def collect(event):
+            events.append(event)
+
+        with token_sink(collect):
+            streamed = await http_llm.generate_response("Analise AAPL", "sistema", agent_name="Analista")
+        assert streamed == first
+        assert events[-1]['type'] == 'agent_stream_end'
+        assert sum(1 for e in events if e['type'] == 'agent_token') == llm.options['num_predict']
+        # Cada token leva só o trecho novo; o fim do streaming leva o texto inteiro
+        tokens = [e for e in events if e['type'] == 'agent_token']
+        assert all('text' not in e for e in tokens)
+        assert ''.join(e['token'] for e in tokens) == events[-1]['text'] == streamed
+
+        failing = FakeOllamaServer(FakeModelProfile(latency_mean=0.0, failure_rate=1.0), port=0)
+        await failing.start()
+        try:
+            with pytest.raises(ollama.ResponseError):
+                await ollama.AsyncClient(host=failing.url).generate(model="fake-model", prompt="x")
+        finally:
+            await failing.stop()
+        await http_llm.close()
+    finally:
+        server.stop_thread()
+
+@pytest.mark.asyncio
+async def test_llm_metrics_record_latency_and_tokens_per_agent(monkeypatch):
+    from config.settings import settings
+    from data.llm_interface import LLMInterface
+    from llm.fake_ollama import FakeModelProfile, FakeOllamaBackend
+    from utils.histogram import LatencyHistogram
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.01, tokens_per_second=0)
+    llm = LLMInterface("fake-model", FakeOllamaBackend(profile))
+    await llm.generate_response("a", agent_name="Analista Técnico", call_type="analysis")
+    await llm.generate_response("b", agent_name="Analista Técnico", call_type="analysis")
+    await llm.generate_response("c", agent_name="Gestor de Risco", call_type="risk")
+
+    snapshot = llm.get_metrics()
+    technical = snapshot['by_call']['Analista Técnico/analysis']
+    assert technical['calls'] == 2
+    assert technical['completion_tokens'] == 2 * llm.options['num_predict']
+    assert technical['latency']['p50'] >= 0.01
+    assert snapshot['overall']['calls'] == 3
+
+    merged = LatencyHistogram()
+    for value in (0.1, 0.2, 0.4):
+        merged.record(value)
+    other = LatencyHistogram()
+    other.record(10.0)
+    merged.merge(other)
+    assert merged.count == 4
+    assert merged.percentile(100) == 10.0
+    assert 0.19 <= merged.percentile(50) <= 0.25
+
+def test_context_builder_respects_budget_and_keeps_structured_fields():
+    from llm.context_builder import ContextBuilder, estimate_tokens
+
+    long_text = " ".join(f"Frase {i} sobre o mercado sem grande relevância." for i in range(200))
+    builder = ContextBuilder(120)
+    builder.add_fields("Analista Técnico", {'recomendação': 'BUY', 'confiança': '80%', 'rsi': 'oversold'})
+    builder.add_text("Analista Técnico", long_text + " Recomendo compra com alvo em 150.")
+    builder.add_text("Analista de Notícias", long_text)
+    context = builder.build()
+
+    assert estimate_tokens(context) <= 120
+    assert "Analista Técnico: recomendação=BUY, confiança=80%, rsi=oversold" in context
+    assert "Analista de Notícias:" in context
+
+@pytest.mark.asyncio
+async def test_llm_interface_limits_in_flight_requests_and_times_out(monkeypatch):
+    from config.settings import settings
+    from data.llm_interface import LLMInterface
+    from llm.fake_ollama import FakeModelProfile, FakeOllamaBackend
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    monkeypatch.setattr(settings.llm, 'max_in_flight', 2)
+    backend = FakeOllamaBackend(FakeModelProfile(latency_distribution="fixed", latency_mean=0.05, tokens_per_second=0))
+    running = peak = 0
+    generate = backend.generate
+
+    async def counting_generate(*args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            return await generate(*args)
+        finally:
+            running -= 1
+
+    backend.generate = counting_generate
+    llm = LLMInterface("fake-model", backend)
+    responses = await asyncio.gather(*(llm.generate_response(f"prompt {i}") for i in range(6)))
+    assert all(r != "Erro na análise" for r in responses)
+    assert peak == 2
+
+    # Modelo lento: a chamada desiste após request_timeout e registra o erro
+    monkeypatch.setattr(settings.llm, 'request_timeout', 0.05)
+    slow = LLMInterface("fake-model", FakeOllamaBackend(
+        FakeModelProfile(latency_distribution="fixed", latency_mean=1.0, tokens_per_second=0)
+    ))
+    assert await slow.generate_response("lento", agent_name="Analista", call_type="analysis") == "Erro na análise"
+    assert slow.get_metrics()['by_call']['Analista/analysis']['errors'] == 1
+
+def test_async_ollama_backend_passes_pool_limits_and_timeouts():
+    from llm.backends import AsyncOllamaBackend
+
+    backend = AsyncOllamaBackend("http://127.0.0.1:11434", max_connections=3, request_timeout=7.0, connect_timeout=2.0)
+    client = backend.async_client._client
+    assert client.timeout.connect == 2.0 and client.timeout.read == 7.0
+    pool = client._transport._pool
+    assert pool._max_connections == 3 and pool._max_keepalive_connections == 3
+
+@pytest.mark.asyncio
+async def test_streaming_publishes_tokens_in_order_and_whole_answers_once(monkeypatch):
+    from config.settings import settings
+    from data.llm_interface import LLMInterface
+    from llm.fake_ollama import FakeModelProfile, FakeOllamaBackend
+    from llm.streaming import token_sink
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+    llm = LLMInterface("fake-model", FakeOllamaBackend(profile))
+    reference = FakeOllamaBackend(profile).model.plan("fake-model", "Analise MSFT", "sistema", llm.options)
+    tokens = [token async for token in llm.generate_stream("Analise MSFT", "sistema")]
+    assert tokens == reference.tokens
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', True)
+    monkeypatch.setattr(settings.llm, 'cache_disk_path', None)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.05, tokens_per_second=500)
+    llm = LLMInterface("fake-model", FakeOllamaBackend(profile))
+    events = []
+
+    async def collect(event):
+        events.append(event)
+
+    with token_sink(collect):
+        leader, follower = await asyncio.gather(
+            llm.generate_response("Analise MSFT", "sistema", agent_name="Líder"),
+            llm.generate_response("Analise MSFT", "sistema", agent_name="Seguidor")
+        )
+        cached = await llm.generate_response("Analise MSFT", "sistema", agent_name="Cache")
+    assert leader == follower == cached == ''.join(tokens)
+
+    def events_of(agent):
+        return [e for e in events if e['agent_name'] == agent]
+
+    led = events_of("Líder")
+    assert [e['token'] for e in led[:-1]] == tokens
+    assert led[-1] == {'type': 'agent_stream_end', 'stream_id': led[0]['stream_id'],
+                       'agent_name': "Líder", 'text': leader}
+    # Geração compartilhada e acerto de cache chegam como um único token
+    for agent in ("Seguidor", "Cache"):
+        token, end = events_of(agent)
+        assert (token['type'], token['token']) == ('agent_token', leader)
+        assert end['type'] == 'agent_stream_end' and end['stream_id'] == token['stream_id']
+
+@pytest.mark.asyncio
+async def test_stream_interrupted_mid_answer_is_not_returned_as_complete(monkeypatch):
+    from config.settings import settings
+    from core.exceptions import LLMStreamInterrupted
+    from data.llm_interface import LLMInterface
+    from llm.fake_ollama import FakeOllamaBackend
+    from llm.streaming import token_sink
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', True)
+    monkeypatch.setattr(settings.llm, 'cache_disk_path', None)
+
+    class BrokenBackend(FakeOllamaBackend):
+        async def stream(self, model, prompt, system, options):
+            for token in ("Recomendo", " comprar"):
+                yield {'response': token, 'done': False}
+            raise ConnectionError("conexão perdida")
+
+    llm = LLMInterface("fake-model", BrokenBackend())
+    events = []
+
+    async def collect(event):
+        events.append(event)
+
+    with token_sink(collect):
+        response = await llm.generate_response("Analise TSLA", agent_name="Analista", call_type="analysis")
+    assert response == "Erro na análise"
+    assert [e['type'] for e in events] == ['agent_token', 'agent_token', 'agent_stream_end']
+    assert events[-1]['text'] == "Recomendo comprar" and "conexão perdida" in events[-1]['error']
+    assert llm.get_metrics()['by_call']['Analista/analysis']['errors'] == 1
+    # O texto cortado não vai para o cache
+    assert llm.cache.stats()['memory_size'] == 0
+
+    with pytest.raises(LLMStreamInterrupted) as excinfo:
+        async for _ in llm.generate_stream("Analise TSLA"):
+            pass
+    assert excinfo.value.partial_text == "Recomendo comprar"
+
+@pytest.mark.asyncio
+async def test_threaded_ollama_stream_stops_producer_when_consumer_gives_up():
+    import threading
+    import time
+    from llm.backends import OllamaBackend
+
+    produced = []
+    closed = threading.Event()
+
+    class SlowClient:
+        def generate(self, **kwargs):
+            def chunks():
+                try:
+                    for i in range(1000):
+                        time.sleep(0.005)
+                        produced.append(i)
+                        yield {'response': str(i), 'done': False}
+                finally:
+                    closed.set()
+            return chunks()
+
+    backend = OllamaBackend.__new__(OllamaBackend)
+    backend.client = SlowClient()
+    stream = backend.stream("m", "p", "", {})
+    assert (await stream.__anext__())['response'] == "0"
+    await stream.aclose()
+    assert await asyncio.to_thread(closed.wait, 2)
+    assert len(produced) < 10
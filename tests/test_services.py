@@ -1 +1,535 @@
-# tests/test_services.py 
\ No newline at end of file
+# tests/test_services.py
+import pytest
+from datetime import datetime
+from core.data_models import MarketData, TechnicalIndicators
+from config.settings import settings
+from llm.fake_ollama import FakeModelProfile, FakeOllamaBackend
+from services.orchestrator import TradingAgentsSystem
+
+class StaticProvider:
+    """Provedor de dados fixo para os testes do orquestrador"""
+
+    def __init__(self, price=100.0):
+        self.price = price
+
+    def get_market_data(self, symbol):
+        return MarketData(symbol, self.price, 2_000_000, 1.0, 1e9, 15.0, datetime.now())
+
+    def get_technical_indicators(self, symbol):
+        return TechnicalIndicators(symbol, 45.0, 0.1, 99.0, 97.0, 105.0, 95.0, 1e6, datetime.now())
+
+    async def get_market_data_async(self, symbol):
+        return self.get_market_data(symbol)
+
+    async def get_technical_indicators_async(self, symbol):
+        return self.get_technical_indicators(symbol)
+
+    async def get_technical_indicators_bulk_async(self, symbols):
+        return {symbol: self.get_technical_indicators(symbol) for symbol in symbols}
+
+@pytest.mark.asyncio
+async def test_parallel_discussion_persists_messages_in_agent_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="uniform", latency_mean=0.02, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    system.db.db_path = str(tmp_path / "discussion.db")
+    await system.connect_db()
+    try:
+        messages = await system.conduct_team_discussion(
+            "s1", "Estratégia para AAPL", "Contexto", rounds=2, mode="parallel", fan_out=9
+        )
+        agent_order = [agent.name for agent in system.all_agents] * 2
+        assert [m.split(":", 1)[0] for m in messages] == agent_order
+
+        async with system.db.conn.execute(
+            "SELECT agent_name FROM agent_discussions WHERE session_id = ? ORDER BY id", ("s1",)
+        ) as cursor:
+            rows = [row[0] async for row in cursor]
+        assert rows == agent_order
+    finally:
+        await system.close_db()
+        await system.llm.close()
+
+@pytest.mark.asyncio
+async def test_stage_pipeline_overlaps_stages_across_items():
+    import asyncio
+    from services.pipeline import Stage, StagePipeline
+
+    active = {'fetch': 0, 'decide': 0}
+    overlapped = []
+
+    def make(name, delay):
+        async def run(state):
+            active[name] += 1
+            if all(active.values()):
+                overlapped.append(state['symbol'])
+            await asyncio.sleep(delay)
+            active[name] -= 1
+            return f"{name}:{state['symbol']}"
+        return run
+
+    pipeline = StagePipeline([
+        Stage('decide', make('decide', 0.02), ('fetch',)),
+        Stage('fetch', make('fetch', 0.02))
+    ])
+    assert [s.name for s in pipeline.order] == ['fetch', 'decide']
+    async with pipeline:
+        states = await asyncio.gather(*(pipeline.submit({'symbol': s}) for s in ("A", "B", "C")))
+
+    assert [s['decide'] for s in states] == ["decide:A", "decide:B", "decide:C"]
+    assert overlapped
+    stats = pipeline.stats()
+    assert stats['fetch']['processed'] == 3 and stats['fetch']['max_queue_depth'] >= 2
+
+    with pytest.raises(ValueError):
+        StagePipeline([Stage('a', make('fetch', 0), ('b',)), Stage('b', make('fetch', 0), ('a',))])
+
+@pytest.mark.asyncio
+async def test_abandoned_item_cancels_its_running_stages_and_pending_order(monkeypatch):
+    import asyncio
+    from core.data_models import TradingDecision
+    from core.enums import DecisionType, RiskLevel
+    from services import exchange as exchange_module
+    from services.exchange import SimulatedExchange
+    from services.pipeline import Stage, StagePipeline
+
+    executed = []
+    cancelled = []
+
+    async def fetch(state):
+        return state['symbol']
+
+    async def execute(state):
+        try:
+            await asyncio.sleep(0.3 if state['slow'] else 0)
+        except asyncio.CancelledError:
+            cancelled.append(state['symbol'])
+            raise
+        executed.append(state['symbol'])
+
+    pipeline = StagePipeline([Stage('fetch', fetch), Stage('execution', execute, ('fetch',))])
+    async with pipeline:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pipeline.submit({'symbol': 'LATE', 'slow': True}), 0.05)
+        await asyncio.sleep(0)
+        assert cancelled == ['LATE']
+        # O worker da etapa continua atendendo os próximos itens
+        await pipeline.submit({'symbol': 'NEXT', 'slow': False})
+    assert executed == ['NEXT']
+
+    # Uma decisão abandonada antes de o lote ser enviado não vira ordem
+    monkeypatch.setattr(exchange_module.market_data_provider, 'get_latest_prices',
+                        lambda symbols: {symbol: 10.0 for symbol in symbols})
+    exchange = SimulatedExchange()
+    decision = TradingDecision('AAA', DecisionType.BUY, 5, 1.0, 80.0, "", RiskLevel.LOW, datetime.now())
+    task = asyncio.create_task(exchange.submit_order_async(decision))
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.sleep(0.05)
+    assert exchange.executed_trades == [] and exchange.ledger.summary()['total_trades'] == 0
+
+def test_sharding_partitions_symbols_and_merges_agent_performance():
+    from services.sharding import merge_agent_performance, partition_symbols
+
+    assert partition_symbols(["A", "B", "C"], 4) == [["A"], ["B"], ["C"]]
+    assert partition_symbols(["A", "B", "C", "D", "E"], 2) == [["A", "C", "E"], ["B", "D"]]
+
+    first = {'Analista Técnico': {'total_analyses': 1, 'average_confidence': 90.0,
+                                  'recommendations': {'buy': 1, 'sell': 0, 'hold': 0},
+                                  'last_analysis': '2024-01-01T10:00:00'}}
+    second = {'Analista Técnico': {'total_analyses': 3, 'average_confidence': 50.0,
+                                   'recommendations': {'buy': 0, 'sell': 1, 'hold': 2},
+                                   'last_analysis': '2024-01-02T10:00:00'}}
+    merged = merge_agent_performance([first, None, second])['Analista Técnico']
+    assert merged['total_analyses'] == 4
+    assert merged['average_confidence'] == 60.0
+    assert merged['recommendations'] == {'buy': 1, 'sell': 1, 'hold': 2}
+    assert merged['last_analysis'] == '2024-01-02T10:00:00'
+    assert first['Analista Técnico']['total_analyses'] == 1
+
+@pytest.mark.asyncio
+async def test_session_deadline_degrades_to_rule_based_decisions(tmp_path, monkeypatch):
+    from utils.deadline import deadline, remaining
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    monkeypatch.setattr(settings.session, 'research_min_budget', 5.0)
+    monkeypatch.setattr(settings.session, 'discussion_min_budget', 5.0)
+    monkeypatch.setattr(settings.session, 'llm_decision_min_budget', 5.0)
+    monkeypatch.setattr(settings.checkpoint, 'path', str(tmp_path / "checkpoints.db"))
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.01, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    system.market_data_provider = StaticProvider()
+    system.db.db_path = str(tmp_path / "deadline.db")
+
+    with deadline(60):
+        with deadline(120):
+            assert remaining() <= 60
+
+    # batch_size ainda é aceito (e ignorado) por compatibilidade
+    with pytest.warns(DeprecationWarning):
+        session = await system.run_trading_session(["AAPL"], session_duration=2, pipelined=False, batch_size=4)
+    await system.llm.close()
+
+    result = session['results']['AAPL']
+    assert result['degraded'] == ['research', 'discussion', 'decision', 'risk', 'approval']
+    assert result['research'] == [] and result['discussion_messages'] == []
+    assert "sem LLM" in result['trading_decision']['reasoning']
+    assert session['summary']['degraded_symbols'] == {'AAPL': result['degraded']}
+
+@pytest.mark.asyncio
+async def test_incremental_reanalysis_reuses_stages_within_tolerance(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    monkeypatch.setattr(settings.discussion, 'mode', 'parallel')
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    provider = StaticProvider(price=100.0)
+    system.market_data_provider = provider
+    system.db.db_path = str(tmp_path / "incremental.db")
+    await system.connect_db()
+    try:
+        first = await system.analyze_symbol("AAPL")
+        calls = system.llm.get_metrics()['overall']['calls']
+
+        provider.price = 100.2
+        second = await system.analyze_symbol("AAPL")
+        assert second['reused_stages'] == ['analysts', 'research', 'discussion', 'decision', 'risk', 'approval']
+        assert second['trading_decision'] == first['trading_decision']
+        assert second['executed_trade'] is None
+        assert system.llm.get_metrics()['overall']['calls'] == calls
+
+        provider.price = 103.0
+        third = await system.analyze_symbol("AAPL")
+        assert third['reused_stages'] == []
+        assert system.get_incremental_stats()['hits'] == 6
+    finally:
+        await system.close_db()
+        await system.llm.close()
+
+@pytest.mark.asyncio
+async def test_outputs_built_on_degraded_stages_are_not_reused(tmp_path, monkeypatch):
+    from utils.deadline import deadline
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    provider = StaticProvider(price=100.0)
+    system.market_data_provider = provider
+    system.db.db_path = str(tmp_path / "degraded.db")
+    await system.connect_db()
+    try:
+        await system.analyze_symbol("AAPL")
+
+        # Preço fora da tolerância e pouco tempo: a pesquisa é pulada e a decisão sai sem ela
+        provider.price = 103.0
+        monkeypatch.setattr(settings.session, 'research_min_budget', 1000.0)
+        with deadline(60):
+            rushed = await system.analyze_symbol("AAPL")
+        assert 'research' in rushed['degraded'] and rushed['research'] == []
+
+        # Com tempo de novo, nada que dependa da pesquisa degradada é reaproveitado
+        monkeypatch.setattr(settings.session, 'research_min_budget', 0.0)
+        provider.price = 103.1
+        full = await system.analyze_symbol("AAPL")
+        assert full['reused_stages'] == ['analysts']
+        assert len(full['research']) == 2 and full['degraded'] == []
+    finally:
+        await system.close_db()
+        await system.llm.close()
+
+def test_checkpoint_session_completes_only_when_every_stage_is_recorded(tmp_path):
+    from services.checkpoint import SessionCheckpointStore
+
+    stages = ['fetch', 'decision', 'discussion', 'execution']
+    store = SessionCheckpointStore(str(tmp_path / "checkpoints.db"))
+    store.begin_session("s1", ["AAPL"], {})
+    for stage in ('fetch', 'decision', 'execution'):
+        store.save("s1", "AAPL", stage, {'stage': stage})
+    # A execução terminou, mas a discussão (que não a bloqueia) ainda não
+    assert not store.complete_if_done("s1", stages, keep_checkpoints=True)
+
+    store.save("s1", "AAPL", 'discussion', None, degraded=True)
+    assert set(store.load_symbol("s1", "AAPL")) == {'fetch', 'decision', 'execution'}
+    assert store.complete_if_done("s1", stages)
+    assert store.incomplete_sessions() == []
+    # O processo pai chega depois do último shard, que já apagou os checkpoints
+    assert store.complete_if_done("s1", stages)
+    store.close()
+
+@pytest.mark.asyncio
+async def test_resume_runs_only_missing_symbols_and_stages(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    monkeypatch.setattr(settings.incremental, 'enabled', False)
+    monkeypatch.setattr(settings.discussion, 'mode', 'parallel')
+    monkeypatch.setattr(settings.checkpoint, 'path', str(tmp_path / "checkpoints.db"))
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+
+    class FlakyProvider(StaticProvider):
+        def __init__(self):
+            super().__init__()
+            self.broken = {"MSFT"}
+
+        def get_technical_indicators(self, symbol):
+            if symbol in self.broken:
+                raise ConnectionError("falha simulada")
+            return super().get_technical_indicators(symbol)
+
+    provider = FlakyProvider()
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    system.market_data_provider = provider
+    system.db.db_path = str(tmp_path / "resume.db")
+    first = await system.run_trading_session(["AAPL", "MSFT"], session_id="s-resume", pipelined=False)
+    assert 'error' in first['results']['MSFT'] and not first['completed']
+    assert system.checkpoints.incomplete_sessions() == ["s-resume"]
+    await system.llm.close()
+
+    # Novo processo: outro sistema lendo o mesmo arquivo de checkpoints
+    provider.broken.clear()
+    resumed_system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    resumed_system.market_data_provider = provider
+    resumed_system.db.db_path = str(tmp_path / "resume.db")
+    resumed = await resumed_system.resume_trading_session()
+    await resumed_system.llm.close()
+
+    assert resumed['session_id'] == "s-resume" and resumed['completed']
+    assert len(resumed['results']['AAPL']['restored_stages']) == 8
+    assert resumed['results']['MSFT']['restored_stages'] == []
+    assert resumed['results']['AAPL']['trading_decision'] == first['results']['AAPL']['trading_decision']
+    assert resumed['summary']['restored_symbols'] == ['AAPL']
+    assert resumed_system.checkpoints.incomplete_sessions() == []
+
+@pytest.mark.asyncio
+async def test_tracing_links_stage_agent_and_llm_spans(tmp_path, monkeypatch):
+    import json
+    from utils.tracing import ChromeTraceExporter, MemoryExporter, tracer
+
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    monkeypatch.setattr(settings.discussion, 'mode', 'parallel')
+    monkeypatch.setattr(tracer, 'enabled', True)
+    memory = MemoryExporter()
+    chrome = ChromeTraceExporter(str(tmp_path / "trace.json"))
+    tracer.add_exporter(memory)
+    tracer.add_exporter(chrome)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    system.market_data_provider = StaticProvider()
+    system.db.db_path = str(tmp_path / "trace.db")
+    await system.connect_db()
+    try:
+        await system.analyze_symbol("AAPL")
+    finally:
+        tracer.remove_exporter(memory)
+        tracer.remove_exporter(chrome)
+        chrome.close()
+        await system.close_db()
+        await system.llm.close()
+
+    spans = {span.span_id: span for span in memory.spans}
+    root = next(span for span in spans.values() if span.name == "analyze_symbol")
+    stages = {span.name for span in spans.values() if span.parent_id == root.span_id}
+    assert stages >= {"stage.fetch", "stage.analysts", "stage.decision", "stage.execution"}
+
+    llm_span = next(span for span in spans.values()
+                    if span.name == "llm.generate" and span.attributes['call_type'] == "analysis")
+    analyst_span = spans[llm_span.parent_id]
+    assert analyst_span.name == "agent.analyze"
+    assert spans[analyst_span.parent_id].name == "stage.analysts"
+    assert llm_span.attributes['cache_hit'] is False
+    assert all(span.trace_id == root.trace_id for span in spans.values())
+
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)['traceEvents']
+    assert sum(1 for e in events if e['ph'] == 'X') == len(spans)
+
+
+def test_chrome_trace_exporter_writes_events_incrementally(tmp_path):
+    import json
+    from utils.tracing import ChromeTraceExporter, Tracer
+
+    tracer = Tracer()
+    tracer.enabled = True
+    path = tmp_path / "trace.json"
+    chrome = ChromeTraceExporter(str(path), flush_every=4)
+    tracer.add_exporter(chrome)
+    for i in range(10):
+        with tracer.span("unit.work", index=i):
+            pass
+    # Os eventos já gravados saem da memória; só o último bloco incompleto fica pendente
+    assert len(chrome._events) < 4 and path.stat().st_size > 0
+    tracer.close()
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert [e['args']['index'] for e in events if e['ph'] == 'X'] == list(range(10))
+
+
+def test_position_ledger_tracks_average_cost_and_pnl():
+    from services.ledger import PositionLedger
+
+    ledger = PositionLedger(initial_cash=1000.0, capacity=1)
+    fills = [
+        ('AAA', 'buy', 10, 10.0),
+        ('AAA', 'buy', 10, 20.0),   # custo médio 15
+        ('AAA', 'sell', 5, 25.0),   # realiza 5 * 10
+        ('BBB', 'sell', 2, 50.0),   # posição vendida
+        ('AAA', 'sell', 20, 10.0),  # fecha 15 (-75) e inverte para -5 @ 10
+    ]
+    for symbol, action, quantity, price in fills:
+        ledger.apply_fill({'symbol': symbol, 'action': action, 'quantity': quantity, 'executed_price': price})
+
+    assert ledger.realized_pnl == 50.0 - 75.0
+    assert ledger.cash == 1000.0 - 100 - 200 + 125 + 100 + 200
+    summary = ledger.summary()
+    assert (summary['total_trades'], summary['buy_trades'], summary['sell_trades']) == (5, 2, 3)
+    assert summary['open_positions'] == 2
+
+    valuation = ledger.mark_to_market({'AAA': 8.0, 'BBB': 40.0})
+    positions = {p['symbol']: p for p in valuation['positions']}
+    assert positions['AAA']['quantity'] == -5 and positions['AAA']['average_cost'] == 10.0
+    assert valuation['unrealized_pnl'] == -5 * (8.0 - 10.0) + -2 * (40.0 - 50.0)
+    assert valuation['net_exposure'] == -5 * 8.0 - 2 * 40.0
+    assert valuation['equity'] == ledger.cash + valuation['net_exposure']
+
+
+def test_order_book_price_time_priority_partial_fills_and_stops():
+    from core.enums import DecisionType, OrderStatus, OrderType
+    from services.order_book import ExecutionModel, Order, OrderBook
+
+    book = OrderBook('AAA', ExecutionModel(latency=1.0))
+    first = Order('1', 'AAA', DecisionType.BUY, 10, OrderType.LIMIT, limit_price=99.0)
+    better = Order('2', 'AAA', DecisionType.BUY, 10, OrderType.LIMIT, limit_price=100.0)
+    second = Order('3', 'AAA', DecisionType.BUY, 10, OrderType.LIMIT, limit_price=99.0)
+    cancelled = Order('4', 'AAA', DecisionType.BUY, 10, OrderType.LIMIT, limit_price=101.0)
+    stop = Order('5', 'AAA', DecisionType.SELL, 5, OrderType.STOP, stop_price=97.0)
+    for order in (first, better, second, cancelled, stop):
+        assert book.submit(order, timestamp=0.0) == []
+    book.cancel('4')
+
+    # Ainda a caminho do livro por causa da latência
+    assert book.tick(98.0, timestamp=0.5) == []
+    assert book.best_bid() is None
+
+    fills = book.tick(98.5, volume=25, timestamp=1.0)
+    assert [(f.order.order_id, f.quantity) for f in fills] == [('2', 10), ('1', 10), ('3', 5)]
+    assert second.status is OrderStatus.PARTIALLY_FILLED and cancelled.filled_quantity == 0
+
+    fills = book.tick(96.0, timestamp=2.0)
+    assert [(f.order.order_id, f.quantity, f.price) for f in fills] == [('5', 5, 96.0), ('3', 5, 96.0)]
+    assert len(book) == 0 and second.average_price == 97.25
+
+
+@pytest.mark.asyncio
+async def test_concurrent_executions_share_one_price_lookup_and_db_write(tmp_path, monkeypatch):
+    import asyncio
+    from core.data_models import TradingDecision
+    from core.enums import DecisionType, RiskLevel
+    from data.database import AsyncDatabaseManager
+    from services import exchange as exchange_module
+    from services.exchange import SimulatedExchange
+
+    lookups = []
+
+    def get_latest_prices(symbols):
+        symbols = list(symbols)
+        lookups.append(symbols)
+        return {symbol: 10.0 + i for i, symbol in enumerate(symbols)}
+
+    monkeypatch.setattr(exchange_module.market_data_provider, 'get_latest_prices', get_latest_prices)
+    db = AsyncDatabaseManager(str(tmp_path / "trades.db"))
+    await db.connect()
+    try:
+        exchange = SimulatedExchange(db=db)
+        decisions = [
+            TradingDecision(symbol, action, 5, 1.0, 80.0, "", RiskLevel.LOW, datetime.now())
+            for symbol, action in (('AAA', DecisionType.BUY), ('BBB', DecisionType.SELL), ('AAA', DecisionType.SELL))
+        ]
+        trades = await asyncio.gather(*(exchange.submit_order_async(d) for d in decisions))
+
+        assert lookups == [['AAA', 'BBB']]
+        assert [t['executed_price'] for t in trades] == [10.0, 11.0, 10.0]
+        assert exchange.ledger.summary()['open_positions'] == 1
+        async with db.conn.execute("SELECT symbol, action, executed_price FROM trades ORDER BY id") as cursor:
+            rows = [tuple(row) async for row in cursor]
+        assert rows == [('AAA', 'buy', 10.0), ('BBB', 'sell', 11.0), ('AAA', 'sell', 10.0)]
+    finally:
+        await db.close()
+
+@pytest.mark.asyncio
+async def test_analyses_without_db_connection_are_kept_and_written_in_one_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.llm, 'cache_enabled', False)
+    profile = FakeModelProfile(latency_distribution="fixed", latency_mean=0.0, tokens_per_second=0)
+    system = TradingAgentsSystem("fake-model", FakeOllamaBackend(profile))
+    provider = StaticProvider()
+    system.db.db_path = str(tmp_path / "analyses.db")
+
+    def state(symbol):
+        return {'symbol': symbol, 'fetch': {'market_data': provider.get_market_data(symbol),
+                                            'technical_data': provider.get_technical_indicators(symbol)}}
+
+    # Sem conexão aberta (como em /api/analyze) as análises ficam pendentes, com o texto no histórico
+    await system._stage_analysts(state("AAPL"))
+    latest = system.technical_analyst.analysis_history.last()
+    assert latest['symbol'] == "AAPL" and latest['analysis']
+    assert len(system.technical_analyst.unsaved_analyses) == 1
+
+    await system.connect_db()
+    try:
+        await system._stage_analysts(state("MSFT"))
+        commits = []
+        commit = system.db.conn.commit
+
+        async def counting_commit():
+            commits.append(1)
+            await commit()
+
+        monkeypatch.setattr(system.db.conn, 'commit', counting_commit)
+        save = system.db.save_agent_analyses
+        late = {'symbol': "NVDA", 'analysis': "registrada durante a gravação"}
+
+        async def save_while_recording(rows):
+            system.technical_analyst.record_analysis(late, "NVDA")
+            await save(rows)
+
+        monkeypatch.setattr(system.db, 'save_agent_analyses', save_while_recording)
+        await system.flush_analyses()
+        assert commits == [1]
+        async with system.db.conn.execute("SELECT symbol, COUNT(*) FROM agent_analyses GROUP BY symbol") as cursor:
+            counts = dict([tuple(row) async for row in cursor])
+        assert counts == {'AAPL': 4, 'MSFT': 4}
+        # Só as análises gravadas saem da fila; a registrada durante a gravação fica para a próxima
+        assert system.technical_analyst.unsaved_analyses == [("NVDA", late)]
+        assert all(not agent.unsaved_analyses for agent in system.all_agents if agent is not system.technical_analyst)
+    finally:
+        await system.close_db()
+        await system.llm.close()
+
+@pytest.mark.asyncio
+async def test_pending_orders_are_reported_and_trades_wait_for_a_connection(tmp_path, monkeypatch):
+    import time
+    from core.data_models import TradingDecision
+    from core.enums import DecisionType, RiskLevel
+    from data.database import AsyncDatabaseManager
+    from services import exchange as exchange_module
+    from services.exchange import SimulatedExchange
+    from services.order_book import ExecutionModel
+
+    monkeypatch.setattr(exchange_module.market_data_provider, 'get_latest_prices',
+                        lambda symbols: {symbol: 10.0 for symbol in symbols})
+    db = AsyncDatabaseManager(str(tmp_path / "pending.db"))
+    exchange = SimulatedExchange(ExecutionModel(latency=0.5), db=db)
+    decision = TradingDecision('AAA', DecisionType.BUY, 5, 10.0, 80.0, "", RiskLevel.LOW, datetime.now())
+
+    pending = await exchange.submit_order_async(decision)
+    assert pending['status'] == 'PENDING' and pending['quantity'] == 0 and pending['requested_quantity'] == 5
+
+    # A ordem chega ao livro com o preço seguinte; sem conexão, a execução fica pendente de gravação
+    exchange.on_price('AAA', 10.5, timestamp=time.time() + 1)
+    await exchange.flush_trades()
+    assert len(exchange.executed_trades) == 1 and len(exchange._unsaved) == 1
+
+    await db.connect()
+    try:
+        await exchange.flush_trades()
+        async with db.conn.execute("SELECT order_id, executed_price FROM trades") as cursor:
+            rows = [tuple(row) async for row in cursor]
+        assert rows == [(pending['order_id'], 10.5)] and exchange._unsaved == []
+    finally:
+        await db.close()
@@ -0,0 +1,37 @@
+import pytest
+import asyncio
+from utils.single_flight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def slow_generation():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "resposta"
+
+    results = await asyncio.gather(*(flight.do_async("prompt", slow_generation) for _ in range(5)))
+
+    assert results == ["resposta"] * 5
+    assert calls == 1
+    assert flight.stats() == {'executed': 1, 'coalesced': 4, 'in_flight': 0}
+
+@pytest.mark.asyncio
+async def test_work_queue_runner_streams_results_without_batch_barriers():
+    import asyncio
+    from utils.work_queue import WorkQueueRunner
+
+    async def work(item):
+        await asyncio.sleep(item)
+        return f"ok:{item}"
+
+    runner = WorkQueueRunner(work, concurrency=2, item_timeout=0.2)
+    results = [r async for r in runner.run([0.5, 0.01, 0.02, 0.03])]
+
+    # O item lento não bloqueia os demais e estoura o prazo por último
+    assert [r.item for r in results] == [0.01, 0.02, 0.03, 0.5]
+    assert [r.result for r in results[:3]] == ["ok:0.01", "ok:0.02", "ok:0.03"]
+    assert isinstance(results[-1].error, asyncio.TimeoutError)
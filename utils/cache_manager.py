@@ -13,33 +13,57 @@ class CacheEntry(Generic[T]):
     data: T
     timestamp: datetime
     ttl: timedelta
+    hard_ttl: Optional[timedelta] = None  # prazo máximo servindo o valor velho
     
     @property
-    def is_expired(self) -> bool:
+    def is_stale(self) -> bool:
         return datetime.now() - self.timestamp > self.ttl
+    
+    @property
+    def is_expired(self) -> bool:
+        return datetime.now() - self.timestamp > max(self.ttl, self.hard_ttl or self.ttl)
 
 class ThreadSafeCache(Generic[T]):
-    """Cache thread-safe com TTL automático e limpeza periódica"""
+    """Cache thread-safe com TTL automático e limpeza periódica.
+
+    Com hard_ttl, uma entrada passa do TTL (soft) para o estado "velho": get()
+    deixa de retorná-la, mas lookup() ainda a serve até o hard_ttl, indicando
+    que ela deve ser atualizada (stale-while-revalidate).
+    """
     
-    def __init__(self, default_ttl: timedelta, max_size: int = 1000):
+    def __init__(self, default_ttl: timedelta, max_size: int = 1000, hard_ttl: Optional[timedelta] = None):
         self._cache: Dict[str, CacheEntry[T]] = {}
         self._lock = threading.RLock()
         self._default_ttl = default_ttl
+        self._hard_ttl = hard_ttl
         self._max_size = max_size
         self._last_cleanup = datetime.now()
         self._cleanup_interval = timedelta(minutes=30)
     
     def get(self, key: str) -> Optional[T]:
-        """Obtém item do cache se não estiver expirado"""
+        """Obtém item do cache se ainda estiver dentro do TTL (entradas velhas só via lookup)"""
+        data, stale = self.lookup(key)
+        return None if stale else data
+    
+    def lookup(self, key: str) -> Tuple[Optional[T], bool]:
+        """Retorna (valor, velho); valor é None quando ausente ou expirado"""
         with self._lock:
             self._maybe_cleanup()
             entry = self._cache.get(key)
             if entry and not entry.is_expired:
-                return entry.data
+                return entry.data, entry.is_stale
             elif entry:
                 # Remove entrada expirada
                 del self._cache[key]
-            return None
+            return None, False
+    
+    def time_to_stale(self, key: str) -> Optional[timedelta]:
+        """Tempo até a entrada passar do TTL (negativo se já está velha; None se ausente)"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry.is_expired:
+                return None
+            return entry.ttl - (datetime.now() - entry.timestamp)
     
     def set(self, key: str, value: T, ttl: Optional[timedelta] = None) -> None:
         """Adiciona item ao cache"""
@@ -53,7 +77,8 @@ class ThreadSafeCache(Generic[T]):
             entry = CacheEntry(
                 data=value,
                 timestamp=datetime.now(),
-                ttl=ttl or self._default_ttl
+                ttl=ttl or self._default_ttl,
+                hard_ttl=self._hard_ttl
             )
             self._cache[key] = entry
     
@@ -106,11 +131,12 @@ class CacheManager:
         self._caches: Dict[str, ThreadSafeCache] = {}
         self._lock = threading.Lock()
     
-    def get_cache(self, name: str, default_ttl: timedelta, max_size: int = 1000) -> ThreadSafeCache:
+    def get_cache(self, name: str, default_ttl: timedelta, max_size: int = 1000,
+                  hard_ttl: Optional[timedelta] = None) -> ThreadSafeCache:
         """Obtém ou cria um cache específico"""
         with self._lock:
             if name not in self._caches:
-                self._caches[name] = ThreadSafeCache(default_ttl, max_size)
+                self._caches[name] = ThreadSafeCache(default_ttl, max_size, hard_ttl)
             return self._caches[name]
     
     def clear_all(self) -> None:
@@ -0,0 +1,39 @@
+# utils/deadline.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from core.exceptions import DeadlineExceeded
+
+# Instante (time.monotonic) em que o trabalho do contexto atual deve terminar.
+# Propaga para tarefas criadas a partir daqui, inclusive as etapas do pipeline
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Define um prazo para o bloco; um prazo interno nunca estende o externo"""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Segundos até o prazo atual (negativo se já passou) ou None sem prazo"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+def budget_below(seconds: float) -> bool:
+    """Indica se há prazo e se restam menos que `seconds` segundos"""
+    left = remaining()
+    return left is not None and left < seconds
+
+def check_deadline(operation: str = "operação") -> None:
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Prazo esgotado antes de {operation}")
@@ -0,0 +1,87 @@
+# utils/histogram.py
+import math
+from typing import Dict, List, Optional
+
+class LatencyHistogram:
+    """Histograma de latências com buckets logarítmicos fixos.
+
+    Memória constante independentemente do número de amostras; o erro relativo
+    dos percentis é limitado pela razão entre buckets (2^(1/buckets_per_doubling)).
+    Histogramas com a mesma configuração podem ser somados com merge().
+    """
+
+    def __init__(self, min_value: float = 1e-4, max_value: float = 1e4, buckets_per_doubling: int = 4):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.buckets_per_doubling = buckets_per_doubling
+        self._num_buckets = int(math.ceil(math.log2(max_value / min_value) * buckets_per_doubling)) + 1
+        # Índice 0 acumula valores abaixo de min_value; o último, acima de max_value
+        self._counts: List[int] = [0] * (self._num_buckets + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float) -> None:
+        """Registra uma amostra (em segundos)"""
+        self._counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Soma as amostras de outro histograma com a mesma configuração"""
+        if (other.min_value, other.max_value, other.buckets_per_doubling) != \
+                (self.min_value, self.max_value, self.buckets_per_doubling):
+            raise ValueError("Histogramas com configurações diferentes não podem ser combinados")
+        for i, c in enumerate(other._counts):
+            self._counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def copy(self) -> "LatencyHistogram":
+        return LatencyHistogram(self.min_value, self.max_value, self.buckets_per_doubling).merge(self)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Percentil aproximado (q entre 0 e 100), limitado ao mínimo/máximo observados"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(math.ceil(q / 100.0 * self.count)))
+        seen = 0
+        for i, c in enumerate(self._counts):
+            seen += c
+            if seen >= rank:
+                return min(max(self._bucket_upper_bound(i), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min or 0.0,
+            'max': self.max or 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99)
+        }
+
+    def _bucket_index(self, value: float) -> int:
+        if value < self.min_value:
+            return 0
+        if value >= self.max_value:
+            return self._num_buckets
+        return 1 + int(math.log2(value / self.min_value) * self.buckets_per_doubling)
+
+    def _bucket_upper_bound(self, index: int) -> float:
+        if index >= self._num_buckets:
+            return self.max_value
+        return self.min_value * 2 ** (index / self.buckets_per_doubling)
@@ -0,0 +1,139 @@
+# utils/single_flight.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+class _LeaderCancelled(Exception):
+    """Sinaliza aos seguidores que a chamada líder foi cancelada"""
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes com a mesma chave em uma única execução.
+
+    A primeira chamada (líder) executa a função; as demais aguardam o mesmo
+    resultado. É thread-safe e funciona entre event loops diferentes, pois o
+    resultado é publicado em um concurrent.futures.Future.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do_async(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa func uma única vez por chave entre chamadas assíncronas concorrentes"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # shield: cancelar um seguidor não pode cancelar o resultado compartilhado
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                # O líder foi cancelado; tenta assumir a chamada
+                continue
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self._finish(key, future, exception=_LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_many_async(self, keys: Iterable[Hashable],
+                            func: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]) -> Dict[Hashable, Any]:
+        """Como do_async para várias chaves: func recebe as chaves que não estão em
+        andamento e retorna {chave: resultado} (ausente vale None); as chaves já em
+        andamento aguardam a chamada em curso, e chamadas individuais concorrentes
+        aguardam esta"""
+        led: Dict[Hashable, Future] = {}
+        followed: Dict[Hashable, Future] = {}
+        for key in dict.fromkeys(keys):
+            future, leader = self._join(key)
+            (led if leader else followed)[key] = future
+
+        results: Dict[Hashable, Any] = {}
+        if led:
+            try:
+                computed = await func(list(led))
+            except asyncio.CancelledError:
+                for key, future in led.items():
+                    self._finish(key, future, exception=_LeaderCancelled())
+                raise
+            except BaseException as e:
+                for key, future in led.items():
+                    self._finish(key, future, exception=e)
+                raise
+            for key, future in led.items():
+                results[key] = computed.get(key)
+                self._finish(key, future, result=results[key])
+
+        for key, future in followed.items():
+            try:
+                results[key] = await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                # O líder foi cancelado; busca a chave por conta própria
+                results.update(await self.do_many_async([key], func))
+        return results
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Executa func uma única vez por chave entre threads concorrentes"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except _LeaderCancelled:
+                continue
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def in_flight(self) -> int:
+        """Retorna quantidade de chaves em execução"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna contadores de execuções e chamadas economizadas"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls)
+            }
+
+    def _join(self, key: Hashable):
+        """Registra a chamada; retorna o future compartilhado e se ela é a líder"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None, exception: BaseException = None) -> None:
+        """Publica o resultado para os seguidores e libera a chave"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
@@ -16,7 +16,7 @@ class TechnicalIndicatorCalculator:
             return 50.0
         
         # Converte para numpy para melhor performance
-        prices_array = np.array(prices)
+        prices_array = np.asarray(prices)
         deltas = np.diff(prices_array)
         
         # Separa ganhos e perdas
@@ -41,7 +41,7 @@ class TechnicalIndicatorCalculator:
         if len(prices) < period:
             return float(np.mean(prices))
         
-        prices_array = np.array(prices)
+        prices_array = np.asarray(prices)
         alpha = 2.0 / (period + 1)
         
         # Inicializa com SMA
@@ -126,8 +126,13 @@ class TechnicalIndicatorCalculator:
         if df.empty:
             return {}
         
-        closes = df['Close'].tolist()
-        volumes = df['Volume'].tolist()
+        return TechnicalIndicatorCalculator.calculate_from_arrays(df['Close'].to_numpy(), df['Volume'].to_numpy())
+    
+    @staticmethod
+    def calculate_from_arrays(closes: np.ndarray, volumes: np.ndarray) -> dict:
+        """Calcula todos os indicadores direto de arrays (ex.: memmaps do OHLCVStore), sem copiá-los"""
+        if len(closes) == 0:
+            return {}
         
         # Calcula todos os indicadores
         rsi = TechnicalIndicatorCalculator.calculate_rsi(closes)
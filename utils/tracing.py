@@ -0,0 +1,241 @@
+# utils/tracing.py
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional
+
+class Span:
+    """Intervalo de trabalho com vínculo ao span pai e atributos livres"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_time', 'duration',
+                 'attributes', 'status', 'lane', '_start')
+
+    def __init__(self, name: str, trace_id: int, span_id: int, parent_id: Optional[int],
+                 attributes: Dict[str, Any], lane: str):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.lane = lane
+        self.status = 'ok'
+        self.start_time = time.time()
+        self.duration = 0.0
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_time': self.start_time,
+            'duration': self.duration,
+            'status': self.status,
+            'lane': self.lane,
+            'attributes': self.attributes
+        }
+
+class _NoopSpan:
+    """Span usado com o rastreamento desligado"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+def _lane() -> str:
+    """Faixa do span no visualizador: a tarefa asyncio atual ou, fora do loop, a thread"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return task.get_name()
+    return threading.current_thread().name
+
+class JsonlExporter:
+    """Grava um span por linha (JSON) assim que ele termina"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+class ChromeTraceExporter:
+    """Grava eventos no formato Chrome trace-event (chrome://tracing, Perfetto).
+
+    Os eventos vão para o arquivo em blocos de flush_every, então a memória
+    não cresce com a duração do processo; close() fecha o JSON.
+    """
+
+    def __init__(self, path: str, flush_every: int = 256):
+        self.path = path
+        self._flush_every = flush_every
+        self._events: List[Dict[str, Any]] = []
+        self._written = 0
+        self._lanes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            tid = self._lanes.get(span.lane)
+            if tid is None:
+                tid = self._lanes[span.lane] = len(self._lanes) + 1
+                self._events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': tid,
+                    'args': {'name': span.lane}
+                })
+            self._events.append({
+                'name': span.name,
+                'cat': span.name.split('.', 1)[0],
+                'ph': 'X',
+                'ts': span.start_time * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': self._pid,
+                'tid': tid,
+                'args': {**span.attributes, 'span_id': span.span_id, 'parent_id': span.parent_id,
+                         'status': span.status}
+            })
+            if len(self._events) >= self._flush_every:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self._file.closed:
+            self._events.clear()
+            return
+        for event in self._events:
+            self._file.write((',\n' if self._written else '') + json.dumps(event, default=str))
+            self._written += 1
+        self._events.clear()
+        self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.write('\n]}\n')
+            self._file.close()
+
+class MemoryExporter:
+    """Mantém os últimos spans em memória (testes e inspeção)"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def close(self) -> None:
+        pass
+
+class Tracer:
+    """Rastreamento em processo com spans hierárquicos.
+
+    O span atual fica em uma contextvar, então spans abertos dentro de tarefas
+    criadas a partir de outro span (gather, pipeline, to_thread) viram filhos
+    dele. Desligado, span() só devolve um objeto vazio.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._exporters: List[Any] = []
+        self._ids = itertools.count(1)
+
+    def configure(self, enabled: bool, exporter: Optional[str] = None, path: Optional[str] = None) -> None:
+        """Liga/desliga o rastreamento e troca o exportador ('jsonl' ou 'chrome')"""
+        self.close()
+        self.enabled = enabled
+        if not enabled or not exporter:
+            return
+        if exporter == 'jsonl':
+            self.add_exporter(JsonlExporter(path))
+        elif exporter == 'chrome':
+            self.add_exporter(ChromeTraceExporter(path))
+        else:
+            raise ValueError(f"Exportador de rastreamento desconhecido: {exporter}")
+
+    def add_exporter(self, exporter) -> None:
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter) -> None:
+        if exporter in self._exporters:
+            self._exporters.remove(exporter)
+
+    def current_span(self):
+        return _current_span.get() or _NOOP_SPAN
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        parent = _current_span.get()
+        span_id = next(self._ids)
+        span = Span(
+            name,
+            parent.trace_id if parent is not None else span_id,
+            span_id,
+            parent.span_id if parent is not None else None,
+            attributes,
+            _lane()
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = 'cancelled'
+            raise
+        except BaseException as e:
+            span.status = 'error'
+            span.attributes['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._start
+            _current_span.reset(token)
+            for exporter in self._exporters:
+                exporter.export(span)
+
+    def close(self) -> None:
+        """Finaliza os exportadores (o formato Chrome só é gravado aqui)"""
+        exporters, self._exporters = self._exporters, []
+        for exporter in exporters:
+            exporter.close()
+
+async def traced(awaitable: Awaitable[Any], name: str, **attributes: Any) -> Any:
+    """Aguarda awaitable dentro de um span; útil para cada corrotina de um gather"""
+    with tracer.span(name, **attributes):
+        return await awaitable
+
+def configure_tracing(config, suffix: Optional[str] = None) -> None:
+    """Configura o tracer global a partir de settings.tracing"""
+    path = config.path
+    if suffix and path:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{suffix}{ext}"
+    tracer.configure(config.enabled, config.exporter, path)
+
+# Instância global do tracer
+tracer = Tracer()
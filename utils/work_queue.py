@@ -0,0 +1,91 @@
+# utils/work_queue.py
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+from core.exceptions import DeadlineExceeded
+from utils.deadline import remaining
+
+@dataclass
+class WorkResult:
+    """Resultado (ou erro) do processamento de um item"""
+    item: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+class WorkQueueRunner:
+    """Pool fixo de workers que consome itens de uma fila assíncrona.
+
+    Cada worker pega o próximo item assim que termina o anterior, então um item
+    lento ocupa apenas um worker em vez de segurar um lote inteiro. Os
+    resultados são entregues na ordem em que ficam prontos. Com um prazo ativo
+    (utils.deadline), itens não iniciados antes dele falham com DeadlineExceeded
+    e os em andamento são cancelados após deadline_grace segundos.
+    """
+
+    def __init__(self, func: Callable[[Any], Awaitable[Any]], concurrency: int,
+                 item_timeout: Optional[float] = None, deadline_grace: float = 0.0):
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.item_timeout = item_timeout
+        self.deadline_grace = deadline_grace
+
+    async def run(self, items: Iterable[Any]) -> AsyncIterator[WorkResult]:
+        pending: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            pending.put_nowait(item)
+        total = pending.qsize()
+        done: asyncio.Queue = asyncio.Queue()
+        workers = [
+            asyncio.create_task(self._worker(pending, done))
+            for _ in range(min(self.concurrency, total))
+        ]
+        try:
+            for _ in range(total):
+                yield await done.get()
+        finally:
+            # Consumidor saiu antes do fim (ou terminou): encerra os workers
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, pending: asyncio.Queue, done: asyncio.Queue):
+        while not pending.empty():
+            item = pending.get_nowait()
+            start = time.monotonic()
+            left = remaining()
+            if left is not None and left <= 0:
+                done.put_nowait(WorkResult(item, error=DeadlineExceeded("Prazo esgotado antes do início")))
+                continue
+            timeout = self._timeout()
+            try:
+                if timeout:
+                    result = await asyncio.wait_for(self.func(item), timeout)
+                else:
+                    result = await self.func(item)
+                work = WorkResult(item, result=result)
+            except asyncio.TimeoutError:
+                left = remaining()
+                if left is not None and left <= 0:
+                    work = WorkResult(item, error=DeadlineExceeded("Prazo esgotado durante o processamento"))
+                else:
+                    work = WorkResult(item, error=asyncio.TimeoutError(
+                        f"Tempo limite de {self.item_timeout:.0f}s excedido"
+                    ))
+            except Exception as e:
+                work = WorkResult(item, error=e)
+            work.elapsed = time.monotonic() - start
+            done.put_nowait(work)
+
+    def _timeout(self) -> Optional[float]:
+        timeout = self.item_timeout
+        left = remaining()
+        if left is not None:
+            left += self.deadline_grace
+            timeout = left if timeout is None else min(timeout, left)
+        return timeout